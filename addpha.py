@@ -5,7 +5,9 @@ import numpy as np
 from datetime import datetime
 import os
 import subprocess
-import tools
+from multiprocessing.pool import ThreadPool
+
+from hash_tools import file_hash
 
 __author__ = "Abigail Stevens"
 __author_email__ = "A.L.Stevens at uva.nl"
@@ -23,156 +25,527 @@ Example call: python addpha.py tmp_phas.txt ./tmp_out.pha tmp_all.gti
 		  tmp_out.pha is the name of the output spectrum
 		  tmp_all.gti is the gti used on the individual pha files
 
+Can also be used as a library: sum_phas sums a list of pha files, and add_phas
+sums them and writes the output spectrum. With a state file (--state), only new
+or changed spectra are read on later runs (sum_phas_incremental).
+
 """
 
 ################################################################################
-if __name__ == "__main__":
-	
-	###############################
-	## Parsing the input arguments
-	###############################
-	
-    parser = argparse.ArgumentParser(usage='addpha.py file_list outfile.pha \
-gti_file.gti', description='Adds together multiple pha spectra. Sums the \
-exposure time and counts, error is summed in quadrature.', epilog='All \
-arguments are required.')
-    	
-    parser.add_argument('file_list', help="The full path of the (ASCII/txt/\
-dat) input file listing the spectra to be summed. One file per line.")
-        
-    parser.add_argument('out_file', help="The full path of the (.pha) \
-output file to write the summed spectra and exposure time to.")
-    
-    parser.add_argument('gti_file', help="The GTI file for all files being \
-added.")
+def read_pha(fits_file):
+    """
+    Reads the values to be summed from one pha file.
+
+    Parameters
+    ----------
+    fits_file : str
+        The full path of the pha file.
+
+    Returns
+    -------
+    dict or None
+        The partial sum for this file: 'exposure', 'spectrum', 'sq_error'
+        (STAT_ERR squared), and the 'tstop', 'dateend', 'timeend', 'tstopi'
+        and 'tstopf' keywords. None if the file couldn't be opened.
+
+    """
+    try:
+        file_hdu = fits.open(fits_file)
+    except IOError:
+        return None
+
+    partial = {'exposure': float(file_hdu[1].header['EXPOSURE']),
+            'spectrum': np.asarray(file_hdu[1].data.field('COUNTS'),
+                    dtype=np.float64),
+            'sq_error': np.square(file_hdu[1].data.field('STAT_ERR')).astype(
+                    np.float64),
+            'tstop': float(file_hdu[0].header['TSTOP']),
+            'dateend': file_hdu[0].header['DATE-END'],
+            'timeend': file_hdu[0].header['TIME-END'],
+            'tstopi': file_hdu[2].header['TSTOPI'],
+            'tstopf': file_hdu[2].header['TSTOPF']}
+    file_hdu.close()
+
+    return partial
+
+
+################################################################################
+def combine(first, second):
+    """
+    Combines two partial sums. The end-time keywords are taken from whichever
+    has the later TSTOP; on a tie, from 'first'.
+
+    Parameters
+    ----------
+    first : dict
+        Partial sum of the earlier files in the list, from read_pha or combine.
+
+    second : dict
+        Partial sum of the later files in the list.
+
+    Returns
+    -------
+    dict
+        The combined partial sum.
+
+    """
+    if second['tstop'] > first['tstop']:
+        latest = second
+    else:
+        latest = first
+
+    return {'exposure': first['exposure'] + second['exposure'],
+            'spectrum': first['spectrum'] + second['spectrum'],
+            'sq_error': first['sq_error'] + second['sq_error'],
+            'tstop': latest['tstop'],
+            'dateend': latest['dateend'],
+            'timeend': latest['timeend'],
+            'tstopi': latest['tstopi'],
+            'tstopf': latest['tstopf']}
+
+
+################################################################################
+def tree_sum(partials):
+    """
+    Reduces partial sums as a binary tree, in list order, as they come in. Only
+    O(log N) partial sums are held at once, and the same list of files always
+    gives the same result, bit for bit.
+
+    Parameters
+    ----------
+    partials : iterable of dicts
+        Partial sums from read_pha, in list order.
+
+    Returns
+    -------
+    dict or None
+        The total, as from combine. None if there were no partial sums.
+
+    """
+    ## Stack of (tree level, partial sum); the bottom is the earliest files
+    stack = []
+
+    for partial in partials:
+        level = 0
+        while stack and stack[-1][0] == level:
+            partial = combine(stack.pop()[1], partial)
+            level += 1
+        stack.append((level, partial))
+
+    if not stack:
+        return None
+
+    ## Folding the rest of the tree together, latest first
+    total = stack.pop()[1]
+    while stack:
+        total = combine(stack.pop()[1], total)
+
+    return total
+
+
+################################################################################
+def sum_phas(infiles, n_threads=8):
+    """
+    Sums the exposure time, counts and squared errors of many pha files. The
+    files are read in a thread pool (FITS I/O is the slow part), and the partial
+    sums are reduced as a binary tree (tree_sum) as they come in.
+
+    Parameters
+    ----------
+    infiles : list of str
+        The full paths of the pha files to sum.
+
+    n_threads : int, default=8
+        Number of threads reading the pha files.
+
+    Returns
+    -------
+    dict or None
+        The total, as from combine. None if none of the files could be read.
+
+    list of str
+        The files that were skipped because they couldn't be opened.
+
+    """
+    skipped = []
+
+    def good_partials(pool):
+        for (fits_file, partial) in zip(infiles, pool.imap(read_pha, infiles,
+                chunksize=1)):
+            if partial is None:
+                print "\tERROR: File does not exist: %s" % fits_file
+                skipped.append(fits_file)
+            else:
+                yield partial
+
+    pool = ThreadPool(processes=max(1, n_threads))
+    try:
+        total = tree_sum(good_partials(pool))
+    finally:
+        pool.close()
+        pool.join()
+
+    return total, skipped
+
+
+################################################################################
+def read_pha_hashed(fits_file):
+    """
+    Reads a pha file with read_pha, and gets its size, mtime and content hash.
+
+    Parameters
+    ----------
+    fits_file : str
+        The full path of the pha file.
+
+    Returns
+    -------
+    tuple
+        (partial sum or None, size, mtime, hash).
+
+    """
+    if not os.path.isfile(fits_file):
+        return None, 0, 0.0, ""
+    stat = os.stat(fits_file)
+
+    return read_pha(fits_file), stat.st_size, stat.st_mtime, \
+            file_hash(fits_file)
+
+
+################################################################################
+def load_state(state_file):
+    """
+    Loads the saved per-file partial sums of an incremental sum.
+
+    Parameters
+    ----------
+    state_file : str
+        The full path of the state (.npz) file.
+
+    Returns
+    -------
+    dict
+        File name -> (size, mtime, hash, partial sum). Empty if the state file
+        doesn't exist.
+
+    """
+    if not os.path.isfile(state_file):
+        return {}
+
+    state = {}
+    with np.load(state_file) as saved:
+        for (i, fits_file) in enumerate(saved['files']):
+            partial = {'exposure': float(saved['exposures'][i]),
+                    'spectrum': saved['spectra'][i],
+                    'sq_error': saved['sq_errors'][i],
+                    'tstop': float(saved['tstops'][i]),
+                    'dateend': str(saved['dateends'][i]),
+                    'timeend': str(saved['timeends'][i]),
+                    'tstopi': int(saved['tstopis'][i]),
+                    'tstopf': float(saved['tstopfs'][i])}
+            state[str(fits_file)] = (int(saved['sizes'][i]),
+                    float(saved['mtimes'][i]), str(saved['hashes'][i]),
+                    partial)
+
+    return state
+
+
+################################################################################
+def save_state(state_file, files, entries):
+    """
+    Saves the per-file partial sums of an incremental sum to a state (.npz)
+    file. The total isn't saved: it's rebuilt from the partial sums with
+    tree_sum, so it's the same, bit for bit, as sum_phas gives.
+
+    Parameters
+    ----------
+    state_file : str
+        The full path of the state (.npz) file.
+
+    files : list of str
+        The files summed, in list order.
+
+    entries : list of tuples
+        (size, mtime, hash, partial sum) for each file.
+
+    Returns
+    -------
+    nothing
+
+    """
+    partials = [entry[3] for entry in entries]
+    ## Writing to a temporary file first, so a crash can't leave half a state
+    tmp_file = state_file + ".tmp.npz"
+    np.savez(tmp_file, files=np.array(files, dtype=str),
+            sizes=np.array([entry[0] for entry in entries], dtype=np.int64),
+            mtimes=np.array([entry[1] for entry in entries], dtype=np.float64),
+            hashes=np.array([entry[2] for entry in entries], dtype=str),
+            exposures=np.array([p['exposure'] for p in partials]),
+            spectra=np.array([p['spectrum'] for p in partials]),
+            sq_errors=np.array([p['sq_error'] for p in partials]),
+            tstops=np.array([p['tstop'] for p in partials]),
+            dateends=np.array([p['dateend'] for p in partials], dtype=str),
+            timeends=np.array([p['timeend'] for p in partials], dtype=str),
+            tstopis=np.array([p['tstopi'] for p in partials], dtype=np.int64),
+            tstopfs=np.array([p['tstopf'] for p in partials]))
+    os.rename(tmp_file, state_file)
+
+
+################################################################################
+def sum_phas_incremental(infiles, state_file, n_threads=8):
+    """
+    Sums pha files like sum_phas, but keeps each file's partial sum (with its
+    size, mtime and content hash) in a state file, so later runs only read the
+    files that are new or have changed. A file whose size or mtime changed is
+    re-hashed, and only re-read if its contents changed. The total is the same
+    as sum_phas gives for the same list.
+
+    Parameters
+    ----------
+    infiles : list of str
+        The full paths of the pha files to sum.
+
+    state_file : str
+        The full path of the state (.npz) file. Made if it doesn't exist.
+
+    n_threads : int, default=8
+        Number of threads reading the pha files.
+
+    Returns
+    -------
+    dict or None
+        The total, as from combine. None if none of the files could be read.
+
+    list of str
+        The files that were skipped because they couldn't be opened.
+
+    int
+        The number of files that were read (i.e., not taken from the state).
+
+    """
+    state = load_state(state_file)
+    entries = {}
+    to_read = []
+    seen = set()
+
+    for fits_file in infiles:
+        if fits_file in seen:
+            continue
+        seen.add(fits_file)
+        if fits_file in state and os.path.isfile(fits_file):
+            (size, mtime, saved_hash, partial) = state[fits_file]
+            stat = os.stat(fits_file)
+            if stat.st_size == size and stat.st_mtime == mtime:
+                entries[fits_file] = state[fits_file]
+                continue
+            if stat.st_size == size and file_hash(fits_file) == saved_hash:
+                entries[fits_file] = (size, stat.st_mtime, saved_hash, partial)
+                continue
+        to_read.append(fits_file)
+
+    n_read = 0
+    pool = ThreadPool(processes=max(1, n_threads))
+    try:
+        for (fits_file, (partial, size, mtime, new_hash)) in zip(to_read,
+                pool.imap(read_pha_hashed, to_read, chunksize=1)):
+            if partial is not None:
+                entries[fits_file] = (size, mtime, new_hash, partial)
+                n_read += 1
+    finally:
+        pool.close()
+        pool.join()
+
+    skipped = []
+    good_files = []
+    for fits_file in infiles:
+        if fits_file in entries:
+            good_files.append(fits_file)
+        else:
+            print "\tERROR: File does not exist: %s" % fits_file
+            skipped.append(fits_file)
+
+    total = tree_sum([entries[fits_file][3] for fits_file in good_files])
+
+    if total is not None:
+        save_state(state_file, good_files, [entries[fits_file] for fits_file
+                in good_files])
+
+    return total, skipped, n_read
+
+
+################################################################################
+def add_phas(infiles, out_file, gti_file, file_list="", n_threads=8,
+        state_file=None):
+    """
+    Adds pha spectra together and writes the summed spectrum. The first file
+    that exists is copied to out_file (so it has all the header information
+    needed by other FTOOLS), and the summed counts, errors (in quadrature),
+    exposure and end-time keywords are written over it.
+
+    Parameters
+    ----------
+    infiles : list of str
+        The full paths of the pha files to sum.
+
+    out_file : str
+        The full path of the (.pha) output file.
+
+    gti_file : str
+        The GTI file for all files being added.
+
+    file_list : str, default=""
+        The file the list of pha files came from, for the FILEN1 keyword.
+
+    n_threads : int, default=8
+        Number of threads reading the pha files.
+
+    state_file : str, optional
+        If given, sums incrementally with sum_phas_incremental, keeping the
+        partial sums in this state file.
+
+    Returns
+    -------
+    list of str
+        The files that were skipped because they couldn't be opened.
+
+    """
 
-    args = parser.parse_args()
-    
     #####################
     ## Setting things up
     #####################
-    
-    if not os.path.isfile(args.file_list):
-    	raise Exception("ERROR: File list does not exist.")
-    	
-    ## Make list of file names from the list
-    infiles = [line.strip() for line in open(args.file_list)]
-    
+
     ## Finding the first fits file that exists
-    i=0
+    i = 0
     try:
-		while not os.path.isfile(infiles[i]): 
-			i += 1
+        while not os.path.isfile(infiles[i]):
+            i += 1
     except IndexError:
-		print "\tERROR: No input .pha files exist in %s. Exiting." % args.file_list
-		exit()
-    	
-#     print " i = ", i
-    
+        print "\tERROR: No input .pha files exist in %s. Exiting." % file_list
+        exit()
+
     ## Need to copy the first file and write over it -- this way it has all the
-    ## header information needed by other FTOOLS. Relevant keywords are also 
+    ## header information needed by other FTOOLS. Relevant keywords are also
     ## overwritten below.
-    subprocess.call(["cp", infiles[i], args.out_file])
-    
-    ## Get number of detector energy channels
-    detchans = tools.get_key_val(infiles[i], 1, "DETCHANS")  
-    
-    ##########################
-    ## Initializing variables
-    ##########################
-    
-    exposure = 0.0
-    spectrum = np.zeros(detchans)
-    sq_error = np.zeros(detchans)
-    channels = np.arange(detchans)
-    tstop = 0
-    dateend = " "
-    timeend = " "
-    tstopi = 0
-    tstopf = 0
-    
+    subprocess.call(["cp", infiles[i], out_file])
+
     ###########################################################################
-    ## Looping through the spectra to sum the exposure time, counts, and error
+    ## Summing the exposure time, counts, and error of the spectra
     ###########################################################################
-    
-    for fits_file in infiles:
-    	try:
-    		file_hdu = fits.open(fits_file)
-    	except IOError:
-			print "\tERROR: File does not exist: %s" % fits_file
-			continue
-    	
-    	exposure += float(file_hdu[1].header['EXPOSURE'])
-    	spectrum += file_hdu[1].data.field('COUNTS')
-    	sq_error += np.square(file_hdu[1].data.field('STAT_ERR'))
-    	
-    	if float(file_hdu[0].header['TSTOP']) > tstop:
-			tstop = float(file_hdu[0].header['TSTOP'])
-			dateend = file_hdu[0].header['DATE-END']
-			timeend = file_hdu[0].header['TIME-END']
-			tstopi = file_hdu[2].header['TSTOPI']
-			tstopf = file_hdu[2].header['TSTOPF']
-    	
-    	file_hdu.close()
-		
-	## Done looping through fits files
-	
-    error = np.sqrt(sq_error)  ## because adding in quadrature
-	
-	##########################################
-	## Getting the GTI data from the gti file 
-	## (to save to ext 2 of the output)
-	##########################################
-	
+
+    if state_file:
+        (total, skipped, n_read) = sum_phas_incremental(infiles, state_file,
+                n_threads=n_threads)
+        print "\tRead %d new or changed .pha files; %d from %s." % (n_read,
+                len(infiles) - len(skipped) - n_read, state_file)
+    else:
+        (total, skipped) = sum_phas(infiles, n_threads=n_threads)
+
+    if total is None:
+        print "\tERROR: No input .pha files could be read in %s. Exiting." % \
+                file_list
+        exit()
+
+    if skipped:
+        print "\tSkipped %d of %d .pha files." % (len(skipped), len(infiles))
+
+    error = np.sqrt(total['sq_error'])  ## because adding in quadrature
+
+    ##########################################
+    ## Getting the GTI data from the gti file
+    ## (to save to ext 2 of the output)
+    ##########################################
+
     try:
-    	gti_hdu = fits.open(args.gti_file)
+        gti_hdu = fits.open(gti_file)
     except IOError:
-    	print "\tERROR: File does not exist: %s" % args.gti_file
-    	exit()
-    	
+        print "\tERROR: File does not exist: %s" % gti_file
+        exit()
+
     all_gti_data = gti_hdu[1].data
     gti_hdu.close()
-	
-	#########################################
+
+    #########################################
     ## Making FITS output (header and table)
     #########################################
-    
-    out_hdu = fits.open(args.out_file, mode='update')
-	
-	## Saving extension 1 table data
+
+    out_hdu = fits.open(out_file, mode='update')
+
+    ## Saving extension 1 table data
     tbdata = out_hdu[1].data
-    tbdata['COUNTS'] = spectrum
+    tbdata['COUNTS'] = total['spectrum']
     tbdata['STAT_ERR'] = error
-    
+
     ## Saving extension 2 table data
     gtidata = out_hdu[2].data
     gtidata = all_gti_data
-	
-	## Updating header values for all three extensions
+
+    ## Updating header values for all three extensions
     hdr0 = out_hdu[0].header
-    hdr0.set('TSTOP', tstop)
-    hdr0.set('DATE-END', dateend)
-    hdr0.set('TIME-END', timeend)
+    hdr0.set('TSTOP', total['tstop'])
+    hdr0.set('DATE-END', total['dateend'])
+    hdr0.set('TIME-END', total['timeend'])
     hdr0.set('CREATOR', "addpha.py")
     hdr1 = out_hdu[1].header
-    hdr1.set('TSTOP', tstop)
-    hdr1.set('DATE-END', dateend)
-    hdr1.set('TIME-END', timeend)
-    hdr1.set('EXPOSURE', exposure)
-    hdr1.set('FILEN1', args.file_list)
+    hdr1.set('TSTOP', total['tstop'])
+    hdr1.set('DATE-END', total['dateend'])
+    hdr1.set('TIME-END', total['timeend'])
+    hdr1.set('EXPOSURE', total['exposure'])
+    hdr1.set('FILEN1', file_list)
     hdr1.set('CREATOR', "addpha.py")
     hdr2 = out_hdu[2].header
-    hdr2.set('TSTOPI', tstopi)
-    hdr2.set('TSTOPF', tstopf)
-    hdr2.set('DATE-END', dateend)
-    hdr2.set('TIME-END', timeend)
-    hdr2.set('ONTIME', exposure)
+    hdr2.set('TSTOPI', total['tstopi'])
+    hdr2.set('TSTOPF', total['tstopf'])
+    hdr2.set('DATE-END', total['dateend'])
+    hdr2.set('TIME-END', total['timeend'])
+    hdr2.set('ONTIME', total['exposure'])
     hdr2.set('CREATOR', "addpha.py")
-	
-	## Saving the changes
+
+    ## Saving the changes
     out_hdu.flush()
     out_hdu.close()
 
+    return skipped
+
+
+################################################################################
+if __name__ == "__main__":
+
+    ###############################
+    ## Parsing the input arguments
+    ###############################
+
+    parser = argparse.ArgumentParser(usage='addpha.py file_list outfile.pha \
+gti_file.gti [--threads N] [--state STATE_FILE]', description='Adds together \
+multiple pha spectra. Sums the exposure time and counts, error is summed in \
+quadrature.', epilog='All positional arguments are required.')
+
+    parser.add_argument('file_list', help="The full path of the (ASCII/txt/\
+dat) input file listing the spectra to be summed. One file per line.")
+
+    parser.add_argument('out_file', help="The full path of the (.pha) \
+output file to write the summed spectra and exposure time to.")
+
+    parser.add_argument('gti_file', help="The GTI file for all files being \
+added.")
+
+    parser.add_argument('--threads', type=int, default=8, dest='n_threads',
+            help="Number of threads reading the spectra. [8]")
+
+    parser.add_argument('--state', default=None, dest='state_file',
+            help="State (.npz) file of the running sum. Only new or changed "\
+            "spectra are read; the rest come from here. [None]")
+
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.file_list):
+        raise Exception("ERROR: File list does not exist.")
+
+    ## Make list of file names from the list
+    infiles = [line.strip() for line in open(args.file_list) if line.strip()]
+
+    add_phas(infiles, args.out_file, args.gti_file, file_list=args.file_list,
+            n_threads=args.n_threads, state_file=args.state_file)
+
 ## End of program 'addpha.py'
 
 ################################################################################
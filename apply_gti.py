@@ -4,7 +4,8 @@
 Applies a GTI to an RXTE decoded event list, to filter out events in bad times.
 This code assumes that the GTI times have not been previously corrected with
 TIMEZERO, but does assume the start time is at the front of the first time bin
-and the end time is at the end of the last time bin. Does not select on PCU.
+and the end time is at the end of the last time bin. Can optionally also
+select on PCU, energy channel and a time window, in the same pass as the GTI.
 
 """
 
@@ -13,12 +14,27 @@ import numpy as np
 from astropy.io import fits
 import itertools
 import os
+import sys
+import glob
+import multiprocessing
+import shutil
 from astropy.table import Table, Column
 
+from hash_tools import hash_inputs, stage_key, load_record, save_record, \
+        outputs_unchanged
+
 __author__ = "Abigail Stevens <A.L.Stevens at uva.nl>"
-__version__ = "0.2 2015-06-17"
+__version__ = "0.3 2026-10-18"
 __year__ = "2014-2016"
 
+## First bytes of a compact binary GTI'd event list, and its file extension
+COMPACT_MAGIC = "RXTEEVT1"
+COMPACT_EXT = ".evtc"
+
+## Record of how each GTI'd event list of a batch was made, in its directory
+## (%s is the GTI'd event list's name), like reduce_scheduler.py's stage records
+BATCH_RECORD = "stage_apply_gti_%s.npz"
+
 
 ################################################################################
 def dat_out(out_file, gti_file, event_list, detchans, good_time, good_chan, \
@@ -157,7 +173,242 @@ def dat_out(out_file, gti_file, event_list, detchans, good_time, good_chan, \
 
 
 ################################################################################
-def main(event_list, gti_file, out_file):
+def gti_index(time, gti_start, gti_stop):
+    """
+    Finds the indices of the events that fall inside a set of GTIs, with a
+    binary search of the GTI edges in the time-sorted event list. An event is
+    good if gti_start <= time <= gti_stop for some GTI (edges inclusive).
+
+    Parameters
+    ----------
+    time : np.array of floats
+        Event times, sorted in increasing order (as written by decodeevt).
+
+    gti_start : np.array of floats
+        Start times of the GTIs, in the same time system as 'time'.
+
+    gti_stop : np.array of floats
+        Stop times of the GTIs, in the same time system as 'time'.
+
+    Returns
+    -------
+    np.array of ints
+        Indices into 'time' of the good events, GTI by GTI in the order the
+        GTIs are given.
+
+    """
+    time = np.asarray(time)
+    gti_start = np.atleast_1d(np.asarray(gti_start, dtype=np.float64))
+    gti_stop = np.atleast_1d(np.asarray(gti_stop, dtype=np.float64))
+
+    assert np.shape(gti_start) == np.shape(gti_stop), "ERROR: GTI start and "\
+            "stop times must have the same length."
+
+    if len(time) > 1 and np.any(time[1:] < time[:-1]):
+        ## Only happens if the event list isn't time-ordered
+        order = np.argsort(time, kind='mergesort')
+        return order[gti_index(time[order], gti_start, gti_stop)]
+
+    first = np.searchsorted(time, gti_start, side='left')
+    last = np.searchsorted(time, gti_stop, side='right')
+    n_good = np.clip(last - first, 0, None)
+
+    ## One arange per GTI, built all at once: each GTI's run of indices starts
+    ## at its 'first' and counts up for 'n_good' events
+    offsets = np.cumsum(n_good) - n_good
+    index = np.arange(np.sum(n_good), dtype=np.intp)
+    index += np.repeat(first - offsets, n_good)
+
+    return index
+
+
+################################################################################
+def select_index(time, chan, pcu, gti, pcus=None, chan_ranges=None,
+        time_range=None):
+    """
+    Finds the indices of the good events, applying the GTI and any PCU,
+    energy channel and time window selections together. The time window is
+    folded into the GTI edges, and the PCU and channel cuts are only evaluated
+    on the events that are inside a GTI.
+
+    Parameters
+    ----------
+    time : np.array of floats
+        Event times, sorted in increasing order.
+
+    chan : np.array of ints
+        Detector mode energy channels of the events.
+
+    pcu : np.array of ints
+        PCUs of the events.
+
+    gti : np.array of floats
+        2-D array of the GTI start (column 0) and stop (column 1) times, in the
+        same time system as 'time'.
+
+    pcus : list of ints, optional
+        The PCUs to keep. If None, keeps all PCUs.
+
+    chan_ranges : list of (int, int), optional
+        The (lowest, highest) detector mode energy channels to keep, inclusive.
+        An event is kept if it's in any of the ranges. If None, keeps all
+        channels.
+
+    time_range : (float, float), optional
+        The (start, stop) times to keep, inclusive. If None, keeps all times.
+
+    Returns
+    -------
+    np.array of ints
+        Indices into 'time' of the good events.
+
+    """
+    gti_start = gti[:, 0]
+    gti_stop = gti[:, 1]
+    if time_range is not None:
+        gti_start = np.maximum(gti_start, time_range[0])
+        gti_stop = np.minimum(gti_stop, time_range[1])
+
+    index = gti_index(time, gti_start, gti_stop)
+
+    if pcus is None and chan_ranges is None:
+        return index
+
+    keep = np.ones(len(index), dtype=bool)
+    if pcus is not None:
+        keep &= np.in1d(pcu[index], pcus)
+    if chan_ranges is not None:
+        good_chan = chan[index]
+        in_range = np.zeros(len(index), dtype=bool)
+        for (low_chan, high_chan) in chan_ranges:
+            in_range |= (good_chan >= low_chan) & (good_chan <= high_chan)
+        keep &= in_range
+
+    return index[keep]
+
+
+################################################################################
+def get_detchans(datamode):
+    """
+    Gets the number of detector energy channels from the data mode.
+
+    Parameters
+    ----------
+    datamode : str
+        The DATAMODE header keyword of the event list.
+
+    Returns
+    -------
+    int
+        Number of energy channels for the detector mode.
+
+    """
+    if '64M' in datamode and 'E_' in datamode:
+        detchans = 64
+    elif '32M' in datamode and 'E_' in datamode:
+        detchans = 32
+    elif '16B' in datamode and 'E_' in datamode:
+        detchans = 16
+    elif 'Standard' in datamode:
+        detchans = 129
+    else:
+        detchans = 256
+
+    return detchans
+
+
+################################################################################
+def read_gti(gti_file):
+    """
+    Reads the start and stop times of a GTI file.
+
+    Parameters
+    ----------
+    gti_file : str
+        Filename of the GTI (good times interval) file, in FITS or txt format.
+        A FITS-format GTI file must have the extension '.gti'.
+
+    Returns
+    -------
+    np.array of floats
+        2-D array of the GTIs, with the start times in column 0 and the stop
+        times in column 1. Not corrected with TIMEZERO.
+
+    """
+    if gti_file[-4:].lower() == ".gti":
+        try:
+            gti_hdu = fits.open(gti_file)
+        except IOError:
+            print "\tERROR: File does not exist: %s" % gti_file
+            exit()
+
+        gti = np.column_stack((gti_hdu[1].data.field(0),
+                gti_hdu[1].data.field(1)))
+        gti_hdu.close()
+    else:
+        gti = np.atleast_2d(np.loadtxt(gti_file))
+
+    return gti
+
+
+################################################################################
+def out_header(data_header, event_list, gti_file, pcus=None, chan_ranges=None,
+        time_range=None):
+    """
+    Adds the GTI'd event list keywords to the header of the input event list.
+    Any PCU, channel or time selection is recorded as PCU_SEL, CHAN_SEL or
+    TIME_SEL.
+
+    Parameters
+    ----------
+    data_header : astropy.io.fits header object
+        FITS header of extension 1 of the input event list. Modified in place.
+
+    event_list : str
+        Filename of the unfiltered event list.
+
+    gti_file : str
+        Filename of the GTI (good times interval) file.
+
+    pcus : list of ints, optional
+        The PCUs selected.
+
+    chan_ranges : list of (int, int), optional
+        The detector mode energy channel ranges selected, inclusive.
+
+    time_range : (float, float), optional
+        The time window selected, inclusive.
+
+    Returns
+    -------
+    astropy.io.fits header object
+        The header, with TYPE, RAW_EVT, GTI_FILE, NOTES and DETCHANS set.
+
+    """
+    data_header['TYPE'] = "GTI`d event list"
+    data_header['RAW_EVT'] = event_list
+    data_header['GTI_FILE'] = gti_file
+    data_header['NOTES'] = "TIMEZERO applied to TIME in Column 1."
+    data_header['DETCHANS'] = get_detchans(data_header['DATAMODE'])
+
+    if pcus is not None:
+        data_header['PCU_SEL'] = (",".join([str(x) for x in sorted(pcus)]),
+                "PCUs selected")
+    if chan_ranges is not None:
+        data_header['CHAN_SEL'] = (",".join(["%d-%d" % (int(low), int(high))
+                for (low, high) in chan_ranges]),
+                "Detector channels selected, inclusive")
+    if time_range is not None:
+        data_header['TIME_SEL'] = ("%.9f-%.9f" % tuple(time_range),
+                "Time window selected (with TIMEZERO), inclusive")
+
+    return data_header
+
+
+################################################################################
+def main(event_list, gti_file, out_file, chunk_rows=None, pcus=None,
+        chan_ranges=None, time_range=None, out_format="fits",
+        time_encoding="float64"):
     """
     Applies a GTI to an event list, to filter out events from bad times.
 
@@ -172,9 +423,33 @@ def main(event_list, gti_file, out_file):
     out_file : str
         Filename of the FITS file to save the good events to.
 
+    chunk_rows : int, optional
+        If given, the event list is streamed through in chunks of this many
+        rows with stream_gti, instead of being read into memory all at once.
+
+    pcus : list of ints, optional
+        The PCUs to keep. If None, keeps all PCUs.
+
+    chan_ranges : list of (int, int), optional
+        The (lowest, highest) detector mode energy channels to keep, inclusive.
+        If None, keeps all channels.
+
+    time_range : (float, float), optional
+        The (start, stop) times to keep, inclusive, in the TIMEZERO-corrected
+        time of the output. If None, keeps all times.
+
+    out_format : str, default="fits"
+        "fits" for an astropy table FITS file, or "compact" for the compact
+        binary format of compact_out (read back with load_compact).
+
+    time_encoding : str, default="float64"
+        How TIME is stored in the compact format: "float64" or "delta". If the
+        times can't be delta-encoded losslessly, they're stored as float64.
+
     Returns
     -------
-    nothing
+    int
+        Number of good events written to out_file.
 
     Raises
     ------
@@ -184,6 +459,13 @@ def main(event_list, gti_file, out_file):
 
     """
 
+    if chunk_rows:
+        assert time_encoding == "float64", "ERROR: Can't delta-encode TIME "\
+                "when streaming in chunks."
+        return stream_gti(event_list, gti_file, out_file,
+                chunk_rows=chunk_rows, pcus=pcus, chan_ranges=chan_ranges,
+                time_range=time_range, out_format=out_format)
+
     #########################
     ## Opening the eventlist
     #########################
@@ -195,131 +477,940 @@ def main(event_list, gti_file, out_file):
         exit()
 
     out_table = Table()
-    out_table.meta = data_hdu[1].header
+    header = out_header(data_hdu[1].header, event_list, gti_file, pcus=pcus,
+            chan_ranges=chan_ranges, time_range=time_range)
+    out_table.meta = header
     data = data_hdu[1].data
-    orig_cols = data_hdu[1].columns
     data_hdu.close()
 
-    out_table.meta['TYPE'] = "GTI`d event list"
-    out_table.meta['RAW_EVT'] = event_list
-    out_table.meta['GTI_FILE'] = gti_file
-    out_table.meta['NOTES'] = "TIMEZERO applied to TIME in Column 1."
+    ########################
+    ## Opening the GTI file
+    ########################
+
+    gti = read_gti(gti_file)
+
+    ## OLD VERSION - Filtering based on PCU with boolean masks
+# 	PCU2 = data.field('PCUID') == 2
+# 	PCU0 = data.field('PCUID') == 0   
+# 	data = data[np.ma.mask_or(PCU2,PCU0)]
+
+    data_time = np.add(data.field('TIME'), out_table.meta['TIMEZERO'])
+
+    #############################################################
+    ## Filtering on GTI time, and on PCU, channel and time window
+    #############################################################
+
+    ## GTI start is the front of the start-time-bin, GTI stop is the back of
+    ## the end-time-bin
+    good_index = select_index(data_time, data.field('CHANNEL'),
+            data.field('PCUID'), gti + out_table.meta['TIMEZERO'], pcus=pcus,
+            chan_ranges=chan_ranges, time_range=time_range)
+
+    ## CHANNEL and PCUID stay float64, as they were when the good events were
+    ## concatenated onto empty float arrays
+    good_time = data_time[good_index]
+    good_chan = data.field('CHANNEL')[good_index].astype(np.float64)
+    good_pcu = data.field('PCUID')[good_index].astype(np.float64)
+
+    assert np.shape(good_time) == np.shape(good_chan)
+    assert np.shape(good_chan) == np.shape(good_pcu)
+
+    if out_format == "compact":
+        written = compact_out(out_file, header, good_time, good_chan, good_pcu,
+                time_encoding=time_encoding, fallback=True)
+        if written != time_encoding:
+            print "\tWARNING: TIME of %s can't be delta-encoded losslessly, "\
+                    "so it's written as float64." % event_list
+        return len(good_time)
+
+    out_table.add_column(Column(data=good_time, name='TIME'))
+    out_table.add_column(Column(data=good_chan, name='CHANNEL'))
+    out_table.add_column(Column(data=good_pcu, name='PCUID'))
+
+    ##########
+    ## Output
+    ##########
+
+    assert out_file[-4:].lower() == "fits", "ERROR: Output file must be FITS."
+    out_table.write(out_file, overwrite=True)
+
+    # fits_out(out_file, out_table, good_time, good_chan, good_pcu)
 
+    return len(good_time)
+
+
+################################################################################
+def stream_gti(event_list, gti_file, out_file, chunk_rows=1000000, pcus=None,
+        chan_ranges=None, time_range=None, out_format="fits"):
+    """
+    Applies a GTI to an event list in chunks of rows, for event lists too big
+    to read into memory. The event list is memory-mapped, and each chunk of
+    good events is appended to the output FITS table as it's filtered, so peak
+    memory is set by chunk_rows and not by the length of the observation. The
+    output has the same columns and header keywords as main's.
+
+    Assumes the GTIs are time-ordered and don't overlap (as from maketime).
+
+    Parameters
+    ----------
+    event_list : str
+        Filename of the FITS file containing an unfiltered event list.
+
+    gti_file : str
+        Filename of the GTI (good times interval) file, in FITS or txt format.
+
+    out_file : str
+        Filename of the FITS file to save the good events to.
+
+    chunk_rows : int, default=1000000
+        Number of event list rows to read and filter at a time.
+
+    pcus, chan_ranges, time_range : optional
+        PCU, channel and time window selections, as in main.
+
+    out_format : str, default="fits"
+        "fits" or "compact" (with float64 TIME), as in main.
+
+    Returns
+    -------
+    int
+        Number of good events written to out_file.
+
+    """
+    if out_format == "compact":
+        assert out_file.lower().endswith(COMPACT_EXT), "ERROR: Compact output "\
+                "file must have extension '%s'." % COMPACT_EXT
+    else:
+        assert out_file[-4:].lower() == "fits", "ERROR: Output file must be "\
+                "FITS."
+    assert chunk_rows > 0, "ERROR: chunk_rows must be a positive int."
+
+    try:
+        data_hdu = fits.open(event_list, memmap=True)
+    except IOError:
+        print "\tERROR: File does not exist: %s" % event_list
+        exit()
+
+    header = out_header(data_hdu[1].header.copy(), event_list, gti_file,
+            pcus=pcus, chan_ranges=chan_ranges, time_range=time_range)
+    timezero = header['TIMEZERO']
+    gti = read_gti(gti_file) + timezero
+    data = data_hdu[1].data
+    n_rows = len(data)
+
+    ###############################################
+    ## Writing the output header with no rows yet
+    ###############################################
+
+    out_dtype = np.dtype([('TIME', '>f8'), ('CHANNEL', '>f8'),
+            ('PCUID', '>f8')])
+    if out_format == "compact":
+        tb_header = compact_header(header, 0)
+        with open(out_file, 'wb') as out:
+            out.write(COMPACT_MAGIC + tb_header.tostring())
+        header_start = len(COMPACT_MAGIC)
+        ## CHANNEL and PCUID go after all of TIME, so they're streamed to
+        ## temporary files and appended at the end
+        chan_tmp = open(out_file + ".chan.tmp", 'w+b')
+        pcu_tmp = open(out_file + ".pcu.tmp", 'w+b')
+    else:
+        empty_cols = [fits.Column(name=name, format='D',
+                array=np.zeros(0, dtype=np.float64)) for name in
+                out_dtype.names]
+        tbhdu = fits.BinTableHDU.from_columns(empty_cols, header=header)
+        tb_header = tbhdu.header
+        fits.HDUList([fits.PrimaryHDU(), tbhdu]).writeto(out_file,
+                overwrite=True)
+        header_start = os.path.getsize(out_file) - len(tb_header.tostring())
 
     ###########################################################
-    ## Getting TIMEZERO the number of detector energy channels
+    ## Filtering each chunk and appending the rows to the file
     ###########################################################
 
-    if '64M' in out_table.meta['DATAMODE'] and 'E_' in out_table.meta['DATAMODE']:
-        detchans = 64
-    elif '32M' in out_table.meta['DATAMODE'] and 'E_' in out_table.meta['DATAMODE']:
-        detchans = 32
-    elif '16B' in out_table.meta['DATAMODE'] and 'E_' in out_table.meta['DATAMODE']:
-        detchans = 16
-    elif 'Standard' in out_table.meta['DATAMODE']:
-        detchans = 129
-    else:
-        detchans = 256
+    ## A failed run removes its temporary files and its partial output, so it
+    ## isn't mistaken for an event list with no good events
+    n_good = 0
+    done = False
+    try:
+        with open(out_file, 'r+b') as out:
+            out.seek(0, os.SEEK_END)
+
+            for first_row in xrange(0, n_rows, chunk_rows):
+                chunk = data[first_row:first_row + chunk_rows]
+                chunk_time = np.add(chunk.field('TIME'), timezero)
+                good_index = select_index(chunk_time, chunk.field('CHANNEL'),
+                        chunk.field('PCUID'), gti, pcus=pcus,
+                        chan_ranges=chan_ranges, time_range=time_range)
+
+                if out_format == "compact":
+                    out.write(chunk_time[good_index].astype('<f8').tostring())
+                    chan_tmp.write(to_uint8(chunk.field('CHANNEL')[good_index],
+                            'CHANNEL').tostring())
+                    pcu_tmp.write(to_uint8(chunk.field('PCUID')[good_index],
+                            'PCUID').tostring())
+                else:
+                    good = np.empty(len(good_index), dtype=out_dtype)
+                    good['TIME'] = chunk_time[good_index]
+                    good['CHANNEL'] = chunk.field('CHANNEL')[good_index]
+                    good['PCUID'] = chunk.field('PCUID')[good_index]
+                    out.write(good.tostring())
+                n_good += len(good_index)
+
+            if out_format == "compact":
+                for tmp in (chan_tmp, pcu_tmp):
+                    tmp.seek(0)
+                    shutil.copyfileobj(tmp, out)
+            else:
+                ## Padding the data to a whole FITS block
+                n_bytes = n_good * out_dtype.itemsize
+                out.write('\0' * (-n_bytes % 2880))
+
+            ## Now that the number of rows is known, updating NAXIS2 in place
+            tb_header['NAXIS2'] = n_good
+            out.seek(header_start)
+            out.write(tb_header.tostring())
+        done = True
+
+    finally:
+        if out_format == "compact":
+            for tmp in (chan_tmp, pcu_tmp):
+                tmp.close()
+                if os.path.isfile(tmp.name):
+                    os.remove(tmp.name)
+        if not done and os.path.isfile(out_file):
+            os.remove(out_file)
+        data_hdu.close()
+
+    return n_good
 
-    out_table.meta['DETCHANS'] = detchans
 
-    ########################
-    ## Opening the GTI file
-    ########################
+################################################################################
+def to_uint8(values, name):
+    """
+    Casts CHANNEL or PCUID values to uint8 for the compact format, checking
+    that they fit.
 
-    if gti_file[-4:].lower() == ".gti":
+    Parameters
+    ----------
+    values : np.array of ints or floats
+        The values to cast.
+
+    name : str
+        The column name, for the error message.
+
+    Returns
+    -------
+    np.array of uint8
+
+    Raises
+    ------
+    ValueError if any value isn't a whole number from 0 to 255.
+
+    """
+    values = np.asarray(values)
+    if len(values) > 0 and (np.min(values) < 0 or np.max(values) > 255 or \
+            np.any(values != np.round(values))):
+        raise ValueError("ERROR: %s values don't fit in uint8." % name)
+
+    return values.astype(np.uint8)
+
+
+################################################################################
+def compact_header(header, n_events, time_encoding="float64"):
+    """
+    Makes the header of a compact binary GTI'd event list. It's the header
+    that the FITS table of the same events would have (so the file converts
+    back to FITS exactly), plus the CMPTIME, CMPCHAN and CMPPCU keywords giving
+    the binary encoding of each column.
+
+    Parameters
+    ----------
+    header : astropy.io.fits header object
+        Header of the GTI'd event list, from out_header.
+
+    n_events : int
+        Number of events in the file.
+
+    time_encoding : str, default="float64"
+        "float64" or "delta".
+
+    Returns
+    -------
+    astropy.io.fits header object
+
+    """
+    empty_cols = [fits.Column(name=name, format='D',
+            array=np.zeros(0, dtype=np.float64)) for name in
+            ('TIME', 'CHANNEL', 'PCUID')]
+    tb_header = fits.BinTableHDU.from_columns(empty_cols,
+            header=header).header
+    tb_header['NAXIS2'] = n_events
+    tb_header['CMPTIME'] = (time_encoding, "Compact encoding of TIME")
+    tb_header['CMPCHAN'] = ("uint8", "Compact encoding of CHANNEL")
+    tb_header['CMPPCU'] = ("uint8", "Compact encoding of PCUID")
+
+    return tb_header
+
+
+################################################################################
+def compact_out(out_file, header, good_time, good_chan, good_pcu,
+        time_encoding="float64", fallback=False):
+    """
+    Writes good events to a compact binary file, which can be memory-mapped
+    straight back with load_compact. The file is COMPACT_MAGIC, then the FITS
+    header from compact_header (a whole number of 2880-byte blocks), then the
+    raw little-endian column blocks: TIME, CHANNEL (uint8), PCUID (uint8).
+
+    With time_encoding="float64", TIME is n float64s. With "delta", it's the
+    first time (float64) and the time step (float64, TIMEDEL) followed by n
+    uint32 differences between consecutive times, in units of the time step.
+    Only lossless delta encodings are written: TIMEZERO-shifted times often
+    aren't whole multiples of TIMEDEL from the first time, and then TIME is
+    either written as float64 (with fallback=True) or not written at all.
+
+    Parameters
+    ----------
+    out_file : str
+        Filename of the compact output file, with extension COMPACT_EXT.
+
+    header : astropy.io.fits header object
+        Header of the GTI'd event list, from out_header.
+
+    good_time : np.array of floats
+        Times for good events.
+
+    good_chan : np.array of ints
+        Detector mode energy channels for good events.
+
+    good_pcu : np.array of ints
+        PCUs for good events.
+
+    time_encoding : str, default="float64"
+        "float64" or "delta".
+
+    fallback : bool, default=False
+        If True, times that can't be delta-encoded losslessly are written as
+        float64 instead of raising ValueError.
+
+    Returns
+    -------
+    str
+        The time encoding written, "float64" or "delta".
+
+    Raises
+    ------
+    ValueError if the times can't be delta-encoded losslessly (and fallback
+    is False), or if CHANNEL or PCUID don't fit in uint8.
+
+    """
+    assert out_file.lower().endswith(COMPACT_EXT), "ERROR: Compact output "\
+            "file must have extension '%s'." % COMPACT_EXT
+    assert time_encoding in ("float64", "delta"), "ERROR: time_encoding must "\
+            "be 'float64' or 'delta'."
+
+    good_time = np.asarray(good_time, dtype=np.float64)
+    n_events = len(good_time)
+
+    if time_encoding == "delta":
+        time_del = header['TIMEDEL']
         try:
-            gti_hdu = fits.open(gti_file)
-        except IOError:
-            print "\tERROR: File does not exist: %s" % gti_file
-            exit()
+            time_del = float(time_del)
+        except ValueError:
+            time_del = float(time_del.split('/')[0])
+        time_0 = good_time[0] if n_events > 0 else 0.0
+        ticks = np.round((good_time - time_0) / time_del).astype(np.int64)
+        delta = np.diff(np.concatenate(([0], ticks)))
+        if not np.array_equal(time_0 + ticks * time_del, good_time) or \
+                (n_events > 0 and (np.min(delta) < 0 or \
+                np.max(delta) >= 2**32)):
+            if not fallback:
+                raise ValueError("ERROR: TIME can't be delta-encoded "\
+                        "losslessly. Use time_encoding='float64'.")
+            time_encoding = "float64"
+        else:
+            time_block = np.array([time_0, time_del], dtype='<f8').tostring()\
+                    + delta.astype('<u4').tostring()
+
+    if time_encoding == "float64":
+        time_block = good_time.astype('<f8').tostring()
+
+    tb_header = compact_header(header, n_events, time_encoding)
+    ## Checked before opening out_file, so a bad column leaves no partial file
+    chan_block = to_uint8(good_chan, 'CHANNEL').tostring()
+    pcu_block = to_uint8(good_pcu, 'PCUID').tostring()
+
+    with open(out_file, 'wb') as out:
+        out.write(COMPACT_MAGIC)
+        out.write(tb_header.tostring())
+        out.write(time_block)
+        out.write(chan_block)
+        out.write(pcu_block)
+
+    return time_encoding
 
-        gti_header = gti_hdu[1].header
-        gti = gti_hdu[1].data
-        gti_hdu.close()
+
+################################################################################
+def read_compact_header(in_file):
+    """
+    Reads the header of a compact binary GTI'd event list, without reading
+    the events.
+
+    Parameters
+    ----------
+    in_file : str
+        Filename of the compact GTI'd event list.
+
+    Returns
+    -------
+    astropy.io.fits header object
+        The header (as in the FITS version of the event list, plus CMPTIME,
+        CMPCHAN and CMPPCU).
+
+    int
+        Byte offset of the column blocks in the file.
+
+    Raises
+    ------
+    IOError if the file isn't a compact GTI'd event list.
+
+    """
+    with open(in_file, 'rb') as in_f:
+        if in_f.read(len(COMPACT_MAGIC)) != COMPACT_MAGIC:
+            raise IOError("ERROR: Not a compact GTI'd event list: %s" % \
+                    in_file)
+        header_str = ""
+        while True:
+            block = in_f.read(2880)
+            if len(block) < 2880:
+                raise IOError("ERROR: Header missing END card: %s" % in_file)
+            header_str += block
+            ## END is the first card-aligned 'END' followed by blanks
+            cards = [header_str[i:i + 80] for i in xrange(0,
+                    len(header_str), 80)]
+            if any(card.rstrip() == "END" for card in cards):
+                break
+
+    return fits.Header.fromstring(header_str), len(COMPACT_MAGIC) + \
+            len(header_str)
+
+
+################################################################################
+def compact_blocks(in_file):
+    """
+    Memory-maps the column blocks of a compact binary GTI'd event list,
+    without decoding them.
+
+    Parameters
+    ----------
+    in_file : str
+        Filename of the compact GTI'd event list.
+
+    Returns
+    -------
+    astropy.io.fits header object
+        The header, as from read_compact_header.
+
+    np.array of floats, or tuple
+        TIME (read-only memory map) for float64 encoding; for delta encoding,
+        (first time, time step, read-only memory map of the uint32
+        differences).
+
+    np.array of uint8
+        CHANNEL (read-only memory map).
+
+    np.array of uint8
+        PCUID (read-only memory map).
+
+    """
+    (header, offset) = read_compact_header(in_file)
+    n_events = header['NAXIS2']
+
+    ## Zero-length memory maps can't be made
+    if n_events == 0:
+        empty_time = np.zeros(0, dtype=np.float64)
+        if header['CMPTIME'] == "delta":
+            empty_time = (0.0, 1.0, np.zeros(0, dtype=np.uint32))
+        return header, empty_time, np.zeros(0, dtype=np.uint8), \
+                np.zeros(0, dtype=np.uint8)
+
+    if header['CMPTIME'] == "delta":
+        (time_0, time_del) = np.memmap(in_file, dtype='<f8', mode='r',
+                offset=offset, shape=(2,))
+        delta = np.memmap(in_file, dtype='<u4', mode='r', offset=offset + 16,
+                shape=(n_events,))
+        time = (time_0, time_del, delta)
+        offset += 16 + 4 * n_events
     else:
-        gti = np.loadtxt(gti_file)
+        time = np.memmap(in_file, dtype='<f8', mode='r', offset=offset,
+                shape=(n_events,))
+        offset += 8 * n_events
 
-    ## OLD VERSION - Filtering based on PCU with boolean masks
-# 	PCU2 = data.field('PCUID') == 2
-# 	PCU0 = data.field('PCUID') == 0   
-# 	data = data[np.ma.mask_or(PCU2,PCU0)]
+    chan = np.memmap(in_file, dtype=np.uint8, mode='r', offset=offset,
+            shape=(n_events,))
+    pcu = np.memmap(in_file, dtype=np.uint8, mode='r',
+            offset=offset + n_events, shape=(n_events,))
 
-    data_time = np.add(data.field('TIME'), out_table.meta['TIMEZERO'])
-    data_chan = data.field('CHANNEL')
-    data_pcu = data.field('PCUID')
-    good_time = np.asarray([])
-    good_chan = np.asarray([])
-    good_pcu = np.asarray([])
-    data_starttime = data_time[0]
-    data_stoptime = data_time[-1]
+    return header, time, chan, pcu
 
-    #########################
-    ## Filtering on GTI time
-    #########################
 
-    for t in gti:
+################################################################################
+def load_compact(in_file):
+    """
+    Loads a compact binary GTI'd event list written by compact_out or
+    stream_gti. CHANNEL, PCUID and float64 TIME are memory-mapped straight from
+    the file without copying; delta-encoded TIME is decoded into a new array
+    (compact_chunks decodes it a chunk at a time instead).
 
-        gti_start = t[0] + out_table.meta['TIMEZERO']  # Front of the start-time-bin
-        gti_stop = t[1] + out_table.meta['TIMEZERO']  # Back of the end-time-bin
+    Parameters
+    ----------
+    in_file : str
+        Filename of the compact GTI'd event list.
 
-        if data_starttime < gti_start and \
-                data_starttime < gti_stop and \
-                data_stoptime < gti_start and \
-                data_stoptime < gti_stop:
+    Returns
+    -------
+    astropy.io.fits header object
+        The header (as in the FITS version of the event list, plus CMPTIME,
+        CMPCHAN and CMPPCU).
 
-# 			print "Data stop before GTI starts."
-            pass
+    np.array of floats
+        TIME (read-only memory map for float64 encoding).
 
-        elif not (data_starttime > gti_start and \
-                data_starttime > gti_stop and \
-                data_stoptime > gti_start and \
-                data_stoptime > gti_stop):
+    np.array of uint8
+        CHANNEL (read-only memory map).
 
-# 			print "GTI start and stop: %.21f, %.21f" % (gti_start, gti_stop)
-            GTImask_start = data_time >= gti_start
-            temp_a = data_time[GTImask_start]
-            temp_b = data_chan[GTImask_start]
-            temp_c = data_pcu[GTImask_start]
-            GTImask_stop = temp_a <= gti_stop
-            temp_time = temp_a[GTImask_stop]
-            temp_chan = temp_b[GTImask_stop]
-            temp_pcu = temp_c[GTImask_stop]
+    np.array of uint8
+        PCUID (read-only memory map).
 
-            assert np.shape(temp_time) == np.shape(temp_chan)
-            assert np.shape(temp_chan) == np.shape(temp_pcu)
+    Raises
+    ------
+    IOError if the file isn't a compact GTI'd event list.
 
-            good_time = np.concatenate((good_time, temp_time))
-            good_chan = np.concatenate((good_chan, temp_chan))
-            good_pcu = np.concatenate((good_pcu, temp_pcu))
+    """
+    (header, time, chan, pcu) = compact_blocks(in_file)
 
-# 			print "Len good_time =", len(good_time)
+    if header['CMPTIME'] == "delta":
+        (time_0, time_del, delta) = time
+        time = time_0 + np.cumsum(delta, dtype=np.int64) * time_del
 
-# 		if t.field(1) > endtimeoflist: 
-# 			break
+    return header, time, chan, pcu
 
-    ## End of for-loop through GTI time blocks
 
-    assert np.shape(good_time) == np.shape(good_chan)
-    assert np.shape(good_chan) == np.shape(good_pcu)
+################################################################################
+def compact_chunks(in_file, chunk_rows=1000000):
+    """
+    Reads a compact binary GTI'd event list in chunks of events, from memory
+    maps of its column blocks. Delta-encoded TIME is decoded one chunk at a
+    time (giving the same times as load_compact), so memory use is set by
+    chunk_rows and not by the length of the file.
 
-    out_table.add_column(Column(data=good_time, name='TIME'))
-    out_table.add_column(Column(data=good_chan, name='CHANNEL'))
-    out_table.add_column(Column(data=good_pcu, name='PCUID'))
+    Parameters
+    ----------
+    in_file : str
+        Filename of the compact GTI'd event list.
 
-    ##########
-    ## Output
-    ##########
+    chunk_rows : int, default=1000000
+        Number of events per chunk.
+
+    Yields
+    ------
+    np.array of floats, np.array of uint8, np.array of uint8
+        TIME, CHANNEL and PCUID of a chunk of events. CHANNEL, PCUID and
+        float64 TIME are read-only memory map slices.
+
+    """
+    assert chunk_rows > 0, "ERROR: chunk_rows must be a positive int."
+
+    (header, time, chan, pcu) = compact_blocks(in_file)
+    n_events = len(chan)
+    delta_encoded = header['CMPTIME'] == "delta"
+    if delta_encoded:
+        (time_0, time_del, delta) = time
+        ## Time steps since time_0 at the end of the previous chunk
+        ticks = 0
+
+    for start in xrange(0, n_events, chunk_rows):
+        stop = start + chunk_rows
+        if delta_encoded:
+            chunk_ticks = ticks + np.cumsum(delta[start:stop], dtype=np.int64)
+            ticks = chunk_ticks[-1]
+            chunk_time = time_0 + chunk_ticks * time_del
+        else:
+            chunk_time = time[start:stop]
+        yield chunk_time, chan[start:stop], pcu[start:stop]
+
+
+################################################################################
+def compact_to_fits(in_file, out_file):
+    """
+    Converts a compact binary GTI'd event list to the FITS table format that
+    main writes, with float64 TIME, CHANNEL and PCUID columns.
+
+    Parameters
+    ----------
+    in_file : str
+        Filename of the compact GTI'd event list.
+
+    out_file : str
+        Filename of the FITS file to write.
+
+    Returns
+    -------
+    nothing
 
+    """
     assert out_file[-4:].lower() == "fits", "ERROR: Output file must be FITS."
-    out_table.write(out_file, overwrite=True)
 
-    # fits_out(out_file, out_table, good_time, good_chan, good_pcu)
+    (header, time, chan, pcu) = load_compact(in_file)
+    for key in ('CMPTIME', 'CMPCHAN', 'CMPPCU'):
+        del header[key]
+
+    cols = [fits.Column(name='TIME', format='D', array=np.asarray(time)),
+            fits.Column(name='CHANNEL', format='D',
+                    array=chan.astype(np.float64)),
+            fits.Column(name='PCUID', format='D',
+                    array=pcu.astype(np.float64))]
+    tbhdu = fits.BinTableHDU.from_columns(cols, header=header)
+    fits.HDUList([fits.PrimaryHDU(), tbhdu]).writeto(out_file, overwrite=True)
+
+
+################################################################################
+def obsid_jobs(obsID_list, red_dir, out_ext=".fits"):
+    """
+    Makes the list of files to apply GTIs to, for the decoded event lists of
+    every obsID in an obsID list. Expects the reduced data layout of
+    rxte_reduce_data.sh and good_events.sh: red_dir/obsID/eventlist_N.fits,
+    decoded from red_dir/obsID/evt_N.pca, with the GTI in
+    red_dir/obsID/gti_file.gti. Like good_events.sh's decoding loop, only
+    orbits N = 1 to the number of evt_*.pca files whose binary event file is
+    there are used, so stale event lists left over from earlier runs aren't
+    picked up.
+
+    Parameters
+    ----------
+    obsID_list : str
+        Filename of the list of obsIDs, one per line.
+
+    red_dir : str
+        The reduced data directory for this data set (with one directory per
+        obsID).
+
+    out_ext : str, default=".fits"
+        Extension of the GTI'd event lists (COMPACT_EXT for compact output).
+
+    Returns
+    -------
+    list of tuples
+        (obsID, eventlist, gti_file, out_file, binary_file) for each decoded
+        event list, in order of obsID then orbit number.
+
+    """
+    obsIDs = [line.strip() for line in open(obsID_list) if line.strip()]
+    jobs = []
+
+    for obsID in obsIDs:
+        data_dir = os.path.join(red_dir, obsID)
+        gti_file = os.path.join(data_dir, "gti_file.gti")
+        num_files = len(glob.glob(os.path.join(data_dir, "evt_*.pca")))
+
+        for num in xrange(1, num_files + 1):
+            binary_file = os.path.join(data_dir, "evt_%d.pca" % num)
+            if not os.path.isfile(binary_file):
+                continue
+            eventlist = os.path.join(data_dir, "eventlist_%d.fits" % num)
+            out_file = os.path.join(data_dir, "GTId_eventlist_%d%s" % (num,
+                    out_ext))
+            jobs.append((obsID, eventlist, gti_file, out_file, binary_file))
+
+    return jobs
+
+
+################################################################################
+def manifest_jobs(manifest, out_ext=".fits"):
+    """
+    Makes the list of files to apply GTIs to from a manifest file. Each line
+    of the manifest has a decoded event list, its GTI file, and optionally the
+    output file and the binary event file it was decoded from, separated by
+    whitespace. If no output file is given (or it's '-'), it's GTId_<eventlist
+    name>, with extension out_ext, in the event list's directory. The obsID is
+    taken to be the name of the directory the event list is in. good_events.sh
+    writes one of these for the event lists it decoded.
+
+    Parameters
+    ----------
+    manifest : str
+        Filename of the manifest.
+
+    out_ext : str, default=".fits"
+        Extension of the GTI'd event lists not named in the manifest
+        (COMPACT_EXT for compact output).
+
+    Returns
+    -------
+    list of tuples
+        (obsID, eventlist, gti_file, out_file, binary_file) for each line of
+        the manifest. binary_file is None if not given.
+
+    """
+    jobs = []
+
+    for line in open(manifest):
+        if not line.strip() or line.strip()[0] == "#":
+            continue
+        files = line.split()
+        eventlist = files[0]
+        gti_file = files[1]
+        if len(files) > 2 and files[2] != "-":
+            out_file = files[2]
+        else:
+            out_file = os.path.join(os.path.dirname(eventlist), "GTId_" + \
+                    os.path.splitext(os.path.basename(eventlist))[0] + out_ext)
+        binary_file = files[3] if len(files) > 3 else None
+        obsID = os.path.basename(os.path.dirname(os.path.abspath(eventlist)))
+        jobs.append((obsID, eventlist, gti_file, out_file, binary_file))
+
+    return jobs
+
+
+################################################################################
+def batch_worker(job):
+    """
+    Applies the GTI to one event list of a batch. Called in the worker
+    processes of batch_main. Unless use_cache is False, the GTI isn't applied
+    again if the event list, GTI file, binary event file, this script, the
+    selections and the output file are the same as the last time it worked
+    (as recorded in BATCH_RECORD next to the output file).
+
+    Parameters
+    ----------
+    job : tuple
+        (obsID, eventlist, gti_file, out_file, binary_file, kwargs,
+        use_cache), where kwargs is a dict of keyword arguments for main.
+
+    Returns
+    -------
+    int
+        Number of good events, or -1 if the GTI could not be applied.
+
+    """
+    (obsID, eventlist, gti_file, out_file, binary_file, kwargs, use_cache) = \
+            job
+
+    if not os.path.isfile(eventlist) or not os.path.isfile(gti_file):
+        print "\tERROR: Event list or GTI file does not exist for %s: %s, "\
+                "%s" % (obsID, eventlist, gti_file)
+        return -1
+
+    out_file = os.path.abspath(out_file)
+    record_file = os.path.join(os.path.dirname(out_file), BATCH_RECORD % \
+            os.path.basename(out_file))
+    record = load_record(record_file)
+
+    inputs = [os.path.abspath(eventlist), os.path.abspath(gti_file),
+            os.path.splitext(os.path.abspath(__file__))[0] + ".py"]
+    if binary_file is not None:
+        inputs.append(os.path.abspath(binary_file))
+    hashes = hash_inputs(inputs, record['inputs'] if record else {})
+    params = dict(kwargs, out_file=out_file, version=__version__)
+    key = stage_key("apply_gti", hashes, params)
+
+    if record is not None:
+        if use_cache and record['key'] == key and outputs_unchanged(record):
+            return int(record['result'][1][0])
+        os.remove(record_file)
+
+    ## main exits on bad input files, which would take down the worker
+    try:
+        n_events = main(eventlist, gti_file, out_file, **kwargs)
+    except (Exception, SystemExit) as err:
+        print "\tERROR: apply_gti.py did not work on %s: %s" % (eventlist,
+                err)
+        return -1
+
+    save_record(record_file, key, hashes, ([out_file], [str(n_events)]))
+
+    return n_events
+
+
+################################################################################
+def batch_main(jobs, gtid_list, bad_orbits, processes=None, chunk_rows=None,
+        pcus=None, chan_ranges=None, time_range=None, out_format="fits",
+        time_encoding="float64", use_cache=True):
+    """
+    Applies GTIs to many event lists in one process pool, instead of one
+    python call per event list. Writes the list of GTI'd event lists that have
+    good events in them, and the list of obsIDs with at least one orbit with
+    no good events (the binary event file of that orbit is deleted, as
+    good_events.sh did).
+
+    Parameters
+    ----------
+    jobs : list of tuples
+        (obsID, eventlist, gti_file, out_file, binary_file) for each event
+        list, from obsid_jobs or manifest_jobs.
+
+    gtid_list : str
+        Filename of the list of GTI'd event lists to write.
+
+    bad_orbits : str
+        Filename of the list of obsIDs with an orbit with no good events.
+
+    processes : int, optional
+        Number of worker processes. If None, uses the number of CPUs.
+
+    chunk_rows, pcus, chan_ranges, time_range, out_format, time_encoding :
+            optional
+        Passed on to main for each event list.
+
+    use_cache : bool, default=True
+        If True, event lists whose GTI'd event list is up to date (see
+        batch_worker) aren't done again.
+
+    Returns
+    -------
+    list of tuples
+        (eventlist, number of good events) for each job, in the order given.
+        The number is -1 if the GTI could not be applied.
+
+    """
+    kwargs = {'chunk_rows': chunk_rows, 'pcus': pcus,
+            'chan_ranges': chan_ranges, 'time_range': time_range,
+            'out_format': out_format, 'time_encoding': time_encoding}
+    worker_jobs = [job + (kwargs, use_cache) for job in jobs]
+
+    if processes == 1 or len(jobs) <= 1:
+        n_events = [batch_worker(job) for job in worker_jobs]
+    else:
+        pool = multiprocessing.Pool(processes=processes)
+        try:
+            n_events = pool.map(batch_worker, worker_jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    ###################################################
+    ## Writing the GTI'd event list and bad orbit lists
+    ###################################################
+
+    bad_obsIDs = []
+    failed = []
+    with open(gtid_list, 'w') as out:
+        for ((obsID, eventlist, gti_file, out_file, binary_file), n) in \
+                zip(jobs, n_events):
+            if n > 0:
+                out.write(out_file + "\n")
+            elif n == 0:
+                print "\tNo good events in eventlist %s for %s." % \
+                        (eventlist, obsID)
+                if binary_file is not None and os.path.isfile(binary_file):
+                    os.remove(binary_file)
+                if obsID not in bad_obsIDs:
+                    bad_obsIDs.append(obsID)
+            else:
+                failed.append(eventlist)
+
+    with open(bad_orbits, 'w') as out:
+        for obsID in bad_obsIDs:
+            out.write(obsID + "\n")
+
+    ## Event lists the GTI couldn't be applied to are in neither list
+    if len(failed) > 0:
+        print "\tERROR: GTI not applied to %d event list(s), which are not in "\
+                "%s or %s:" % (len(failed), gtid_list, bad_orbits)
+        for eventlist in failed:
+            print "\t\t%s" % eventlist
+
+    return [(job[1], n) for (job, n) in zip(jobs, n_events)]
 
 
 ################################################################################
 if __name__ == "__main__":
 
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+
+        ###########################################################
+        ## Parsing command line arguments and calling 'batch_main'
+        ###########################################################
+
+        parser = argparse.ArgumentParser(usage="apply_gti.py batch in_list "\
+                "gtid_list bad_orbits [--red_dir DIR | --manifest] [options]",
+                description="Applies GTIs to all the decoded event lists of "\
+                "a data set in one process pool.")
+
+        parser.add_argument('in_list', help="List of obsIDs (with --red_dir)"\
+                " or manifest of 'eventlist gtifile [outfile|- [binaryfile]]' "\
+                "lines (with --manifest).")
+
+        parser.add_argument('gtid_list', help="List of GTI'd event lists with"\
+                " good events in them, to write to.")
+
+        parser.add_argument('bad_orbits', help="List of obsIDs with an orbit"\
+                " with no good events, to write to.")
+
+        parser.add_argument('--red_dir', default=None, help="Reduced data "\
+                "directory, with a sub-directory per obsID.")
+
+        parser.add_argument('--manifest', action='store_true', default=False,
+                help="in_list is a manifest of event list and GTI files.")
+
+        parser.add_argument('--procs', type=int, default=None,
+                dest='processes', help="Number of worker processes. [number "\
+                "of CPUs]")
+
+        parser.add_argument('--chunk', type=int, default=None,
+                dest='chunk_rows', help="Stream the event lists through in "\
+                "chunks of this many rows. [None]")
+
+        parser.add_argument('--pcu', type=int, nargs='+', default=None,
+                dest='pcus', help="Only keep events from these PCUs. [all]")
+
+        parser.add_argument('--chan', type=int, nargs=2, action='append',
+                default=None, dest='chan_ranges', metavar=('LOW', 'HIGH'),
+                help="Only keep events with channel in LOW-HIGH. [all]")
+
+        parser.add_argument('--time', type=float, nargs=2, default=None,
+                dest='time_range', metavar=('START', 'STOP'), help="Only keep"\
+                " events between START and STOP. [all]")
+
+        parser.add_argument('--compact', action='store_true', default=False,
+                help="Write compact binary event lists (%s) instead of FITS."\
+                % COMPACT_EXT)
+
+        parser.add_argument('--delta_time', action='store_true',
+                default=False, help="Delta-encode TIME in the compact event "\
+                "lists.")
+
+        parser.add_argument('--no_cache', action='store_false', default=True,
+                dest='use_cache', help="Apply the GTIs to all the event "\
+                "lists, even those whose GTI'd event list is up to date.")
+
+        args = parser.parse_args(sys.argv[2:])
+
+        if args.compact:
+            out_format = "compact"
+            out_ext = COMPACT_EXT
+        else:
+            out_format = "fits"
+            out_ext = ".fits"
+
+        if args.manifest:
+            jobs = manifest_jobs(args.in_list, out_ext=out_ext)
+        else:
+            assert args.red_dir is not None, "ERROR: Need --red_dir with an "\
+                    "obsID list, or --manifest."
+            jobs = obsid_jobs(args.in_list, args.red_dir, out_ext=out_ext)
+
+        counts = batch_main(jobs, args.gtid_list, args.bad_orbits,
+                processes=args.processes, chunk_rows=args.chunk_rows,
+                pcus=args.pcus, chan_ranges=args.chan_ranges,
+                time_range=args.time_range, out_format=out_format,
+                time_encoding="delta" if args.delta_time else "float64",
+                use_cache=args.use_cache)
+
+        for (eventlist, n) in counts:
+            print "%s\t%d" % (eventlist, n)
+
+        sys.exit()
+
     #####################################################
     ## Parsing command line arguments and calling 'main'
     #####################################################
@@ -334,11 +1425,41 @@ if __name__ == "__main__":
             " made in HEASoft's 'maketime' script. This program assumes that a"\
             " FITS-format GTI file will have the extension '.gti'.")
 
-    parser.add_argument('outfile', help="Name of the .fits output file, to "\
-            "write the GTI'd event list to.")
+    parser.add_argument('outfile', help="Name of the .fits output file (or "\
+            "%s with --compact), to write the GTI'd event list to." % \
+            COMPACT_EXT)
+
+    parser.add_argument('--chunk', type=int, default=None, dest='chunk_rows',
+            help="Stream the event list through in chunks of this many rows, "\
+            "for event lists too big to fit in memory. [None]")
+
+    parser.add_argument('--pcu', type=int, nargs='+', default=None,
+            dest='pcus', help="Only keep events from these PCUs (0-4). [all]")
+
+    parser.add_argument('--chan', type=int, nargs=2, action='append',
+            default=None, dest='chan_ranges', metavar=('LOW', 'HIGH'),
+            help="Only keep events with detector mode energy channel in "\
+            "LOW-HIGH, inclusive. Can be given more than once. [all]")
+
+    parser.add_argument('--time', type=float, nargs=2, default=None,
+            dest='time_range', metavar=('START', 'STOP'), help="Only keep "\
+            "events between START and STOP, inclusive, in TIMEZERO-corrected "\
+            "time. [all]")
+
+    parser.add_argument('--compact', action='store_true', default=False,
+            help="Write a compact binary event list instead of FITS, to be "\
+            "read with load_compact.")
+
+    parser.add_argument('--delta_time', action='store_true', default=False,
+            help="Delta-encode TIME in the compact event list (not with "\
+            "--chunk).")
 
     args = parser.parse_args()
 
-    main(args.eventlist, args.gtifile, args.outfile)
+    main(args.eventlist, args.gtifile, args.outfile,
+            chunk_rows=args.chunk_rows, pcus=args.pcus,
+            chan_ranges=args.chan_ranges, time_range=args.time_range,
+            out_format="compact" if args.compact else "fits",
+            time_encoding="delta" if args.delta_time else "float64")
 
 ################################################################################
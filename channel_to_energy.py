@@ -5,7 +5,7 @@ import os.path
 import tools  # in https://github.com/abigailStev/whizzy_scripts
 
 __author__ = "Abigail Stevens <A.L.Stevens at uva.nl>"
-__version__ = "0.2 2015-06-16"
+__version__ = "0.3 2026-10-18"
 
 """
 Converts an RXTE energy channel list to a list of real energy *boundaries* per
@@ -14,10 +14,162 @@ detector mode energy channel.
 Use this for plotting 2D CCF and lag-energy spectra vs energy in keV instead of
 vs detector mode energy channel.
 
+Can also be imported: energy_boundaries does the conversion on arrays, and
+channel_energies does it for an epoch and channel binning, reading each table
+once per process and keeping the results in memory.
+
 2015
 
 """
 
+## The energy-to-channel table that comes with this repository
+EC_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        "e-c_table.txt")
+
+## In-memory caches: table file name -> table, and
+## (table file name, epoch, channel binning) -> energy boundaries
+TABLE_CACHE = {}
+BOUNDS_CACHE = {}
+
+
+################################################################################
+def load_table(table_file):
+    """
+    Loads a text table with np.loadtxt, only reading each file once per process.
+
+    Parameters
+    ----------
+    table_file : str
+        The txt table file name.
+
+    Returns
+    -------
+    np.array
+        The table. Shared between calls, so don't change it.
+
+    """
+    key = os.path.abspath(table_file)
+    if key not in TABLE_CACHE:
+        TABLE_CACHE[key] = np.loadtxt(table_file)
+
+    return TABLE_CACHE[key]
+
+
+################################################################################
+def epoch_energies(ec_table, obs_epoch):
+    """
+    Gets the energy in keV of each absolute channel for an RXTE observation
+    epoch.
+
+    Parameters
+    ----------
+    ec_table : np.array
+        The energy-to-channel conversion table (e-c_table.txt).
+
+    obs_epoch : int
+        RXTE observation epoch, 1 to 5.
+
+    Returns
+    -------
+    np.array of floats
+        Energy in keV per absolute channel.
+
+    """
+    assert 1 <= obs_epoch <= 5, "ERROR: Invalid observation epoch. Must be an "\
+            "int between 1 and 5, inclusive."
+
+    ## Determining column for ec_table based on observation epoch
+    if obs_epoch <= 4:
+        ec_col = obs_epoch + 1
+    else:
+        ec_col = 7
+
+    return ec_table[:, ec_col]
+
+
+################################################################################
+def energy_boundaries(energies, binning):
+    """
+    Gets the real energy boundaries of each detector mode energy channel. The
+    boundary after a group of absolute channels is the mean of the energies of
+    the last absolute channel in the group and the first one in the next group
+    (or just the last energy, past the end of the table).
+
+    Parameters
+    ----------
+    energies : np.array of floats
+        Energy in keV per absolute channel, from epoch_energies.
+
+    binning : np.array of ints
+        How many absolute channels are grouped together for each detector mode
+        energy channel.
+
+    Returns
+    -------
+    np.array of floats
+        Energy boundary in keV per detector mode energy channel (the lower
+        boundary of each one).
+
+    """
+    energies = np.asarray(energies, dtype=np.float64)
+    ## The last energy is repeated, to have a boundary after the last channel
+    energies = np.append(energies, energies[-1])
+
+    ## Index of the first absolute channel after each group
+    bin_ends = np.cumsum(np.asarray(binning, dtype=np.int64))
+    ## (the last boundary gets chopped off, so it may run past the table)
+    assert np.all(bin_ends >= 1) and np.all(bin_ends[:-1] <= len(energies)), \
+            "ERROR: Channel binning doesn't fit the energy table."
+    bin_ends = np.minimum(bin_ends, len(energies))
+
+    ## Past the end of the table there's only the last energy to 'average'
+    after = energies[np.minimum(bin_ends, len(energies) - 1)]
+    before = energies[bin_ends - 1]
+    bounds = np.where(bin_ends < len(energies), (before + after) / 2.0,
+            before)
+
+    ## Starting at the first energy, and chopping off the last boundary to have
+    ## the correct amount of values in the list
+    return np.append(energies[0], bounds[:-1])
+
+
+################################################################################
+def channel_energies(obs_epoch, binning, ec_table_file=EC_TABLE_FILE):
+    """
+    Gets the real energy boundaries of each detector mode energy channel, for
+    an RXTE observation epoch and channel binning. Each (table, epoch, binning)
+    combination is only computed once per process.
+
+    Parameters
+    ----------
+    obs_epoch : int
+        RXTE observation epoch, 1 to 5.
+
+    binning : str or np.array of ints
+        Txt table with how many absolute channels to group together for each
+        mode energy channel (in column 2), or the array of those numbers.
+
+    ec_table_file : str, default=EC_TABLE_FILE
+        Txt table with energy in keV to absolute channel conversion for RXTE.
+
+    Returns
+    -------
+    np.array of floats
+        Energy boundary in keV per detector mode energy channel.
+
+    """
+    if isinstance(binning, basestring):
+        binning = load_table(binning)[:, 2]
+    binning = tuple(np.asarray(binning, dtype=np.int64))
+
+    key = (os.path.abspath(ec_table_file), obs_epoch, binning)
+    if key not in BOUNDS_CACHE:
+        energies = epoch_energies(load_table(ec_table_file), obs_epoch)
+        BOUNDS_CACHE[key] = energy_boundaries(energies, binning)
+
+    return BOUNDS_CACHE[key].copy()
+
+
 ################################################################################
 if __name__ == "__main__":
 
@@ -55,46 +207,13 @@ if __name__ == "__main__":
     assert args.obs_epoch <= 5, "ERROR: Invalid observation epoch. Must be an "\
             "int between 1 and 5, inclusive."
 
-    #############################
-    ## Loading tables from files
-    #############################
-
-    ec_table = np.loadtxt(args.ec_table_file)
-    chan_bin_table = np.loadtxt(args.chan_bin_file)
-
-    ## Determining column for ec_table based on observation epoch
-    if args.obs_epoch <= 4:
-        ec_col = args.obs_epoch + 1
-    else:
-        ec_col = 7
-
-    ## Extracting specific columns (these numbers don't change)
-    energies = ec_table[:, ec_col]  ## Column with the energy in keV per
-                                    ## absolute channel
-    binning = chan_bin_table[:, 2]  ## Column telling how many absolute channels
-                                    ## to bin together for that energy bin
-
-    ## Initializations
-    energies = np.append(energies, energies[-1])
-    energy_array = np.asarray(energies[0])
-    prev_ind = 0
-
-    ############################################
-    ## Looping through the energy binning array
-    ############################################
-
-    for amt in binning:
-        en_bin_bound = np.mean(energies[prev_ind + amt - 1:prev_ind + amt + 1])
-        energy_array = np.append(energy_array, en_bin_bound)
-        prev_ind += amt
-
-    ## Chop off the last one to have the correct amount of values in the list
-    energy_array = energy_array[0:-1]
-
     ####################################
     ## Output energy array to text file
     ####################################
 
+    energy_array = channel_energies(args.obs_epoch, args.chan_bin_file,
+            ec_table_file=args.ec_table_file)
+
     np.savetxt(args.out_file, energy_array)
 
 ################################################################################
@@ -0,0 +1,688 @@
+#!/usr/bin/env python
+
+"""
+Downloads the raw data directories of a list of obsIDs from the RXTE archive,
+like download_obsIDs.sh, with a bounded number of concurrent transfers.
+
+The archive can be an ftp://, http:// or https:// URL, or a local directory (or
+file:// URL) with the same layout, <archive>/AO<n>/P<propID>/<obsID>/. Each
+obsID is saved in <data dir>/P<propID>/<obsID>, and once all its files are
+there it gets a manifest (download_manifest.txt) with the size and MD5 checksum
+of each file. An obsID only counts as downloaded if it has a manifest and its
+files match it; otherwise the files that are missing or don't have the archive's
+size are fetched again, and partial files (.part) are resumed where they
+stopped.
+
+Transfers are checked by size: against the archive listing for ftp and local
+archives, and against the Content-Length or Content-Range of the response for
+http(s), whose listings have no sizes. A file only loses its .part extension
+once its size is right. The MD5 checksums in the manifest are computed from the
+local copy after download, so they catch later changes to the local files
+(with --verify), not errors in the transfer itself.
+
+"""
+
+import argparse
+import os
+import re
+import time
+import hashlib
+import ftplib
+import urllib2
+import httplib
+import urlparse
+from multiprocessing.pool import ThreadPool
+
+__author__ = "Abigail Stevens <A.L.Stevens at uva.nl>"
+__version__ = "0.1 2026-10-18"
+__year__ = "2013-2017"
+
+HOME_DIR = os.path.expanduser("~")
+DATA_DIR = os.path.join(HOME_DIR, "Data", "RXTE")
+WEB_PREFIX = "ftp://legacy.gsfc.nasa.gov/xte/data/archive"
+
+MANIFEST = "download_manifest.txt"
+PART_EXT = ".part"
+CHUNK_SIZE = 1024 * 1024
+TIMEOUT = 60
+
+
+################################################################################
+def archive_prefix(obsID):
+    """
+    Gets the archive directory (AO cycle) of an obsID from its proposal ID:
+    AO1 to AO8 for proposal IDs starting with 1 to 8, and AO9 onwards for
+    90xxx, 91xxx, etc.
+    """
+    propID = obsID.split("-")[0]
+    if int(propID[0]) < 9:
+        return "AO%s" % propID[0]
+
+    return "AO%d" % (int(propID[1]) + 9)
+
+
+################################################################################
+def obsID_url(archive, obsID):
+    """
+    Gets the archive location of an obsID: <archive>/AO<n>/P<propID>/<obsID>.
+    """
+    return "/".join([archive.rstrip("/"), archive_prefix(obsID),
+            "P" + obsID.split("-")[0], obsID])
+
+
+################################################################################
+def obsID_dir(data_dir, obsID):
+    """
+    Gets the local directory of an obsID: <data_dir>/P<propID>/<obsID>.
+    """
+    return os.path.join(data_dir, "P" + obsID.split("-")[0], obsID)
+
+
+################################################################################
+def local_path(url):
+    """
+    Gets the local path of a file:// URL or a plain path, or None for a remote
+    URL.
+    """
+    parsed = urlparse.urlparse(url)
+    if parsed.scheme == "file":
+        return urllib2.unquote(parsed.path)
+    if parsed.scheme == "":
+        return url
+
+    return None
+
+
+################################################################################
+def ftp_connect(url):
+    """
+    Opens an FTP connection to the host of an ftp:// URL, logged in
+    anonymously unless the URL has a user name and password.
+    """
+    parsed = urlparse.urlparse(url)
+    ftp = ftplib.FTP()
+    ftp.connect(parsed.hostname, parsed.port or 21, timeout=TIMEOUT)
+    ftp.login(parsed.username or "anonymous", parsed.password or "")
+
+    return ftp
+
+
+################################################################################
+def list_ftp(url):
+    """
+    Lists the files under an ftp:// URL, with their sizes, from Unix-style
+    LIST output.
+    """
+    ftp = ftp_connect(url)
+    files = []
+    try:
+        to_do = [""]
+        root = urllib2.unquote(urlparse.urlparse(url).path).rstrip("/")
+        while to_do:
+            rel_dir = to_do.pop()
+            lines = []
+            ftp.retrlines("LIST %s" % (root + "/" + rel_dir).rstrip("/"),
+                    lines.append)
+            for line in lines:
+                parts = line.split(None, 8)
+                if len(parts) < 9 or parts[8] in (".", ".."):
+                    continue
+                rel_path = rel_dir + parts[8]
+                if line.startswith("d"):
+                    to_do.append(rel_path + "/")
+                elif line.startswith("-"):
+                    files.append((rel_path, int(parts[4])))
+    finally:
+        ftp.close()
+
+    return files
+
+
+################################################################################
+def list_http(url):
+    """
+    Lists the files under an http(s):// URL by following the links in its
+    directory index pages. The sizes aren't known until download (None).
+    """
+    files = []
+    root = url.rstrip("/") + "/"
+    to_do = [root]
+    while to_do:
+        dir_url = to_do.pop()
+        page = urllib2.urlopen(dir_url, timeout=TIMEOUT).read()
+        for href in re.findall(r'href\s*=\s*["\']([^"\'#?]+)["\']', page,
+                flags=re.IGNORECASE):
+            link = urlparse.urljoin(dir_url, href)
+            ## Only links further down the tree, not parents or other sites
+            if not link.startswith(dir_url) or link == dir_url:
+                continue
+            if link.endswith("/"):
+                to_do.append(link)
+            else:
+                files.append((urllib2.unquote(link[len(root):]), None))
+
+    return sorted(set(files))
+
+
+################################################################################
+def list_local(path):
+    """
+    Lists the files under a local directory, with their sizes.
+    """
+    files = []
+    for (dir_path, dir_names, file_names) in os.walk(path):
+        for file_name in file_names:
+            full_path = os.path.join(dir_path, file_name)
+            rel_path = os.path.relpath(full_path, path).replace(os.sep, "/")
+            files.append((rel_path, os.path.getsize(full_path)))
+
+    return files
+
+
+################################################################################
+def list_files(url):
+    """
+    Lists the files in an archive directory and its subdirectories.
+
+    Parameters
+    ----------
+    url : str
+        ftp://, http:// or https:// URL, or local directory.
+
+    Returns
+    -------
+    list of (str, int or None)
+        Path relative to url (with '/' separators) and size in bytes (None if
+        not known) of each file.
+
+    Raises
+    ------
+    IOError if the directory can't be listed.
+
+    """
+    path = local_path(url)
+    if path is not None:
+        if not os.path.isdir(path):
+            raise IOError("ERROR: Archive directory does not exist: %s" % path)
+        return list_local(path)
+
+    scheme = urlparse.urlparse(url).scheme
+    try:
+        if scheme == "ftp":
+            return list_ftp(url)
+        if scheme in ("http", "https"):
+            return list_http(url)
+    except (ftplib.all_errors, urllib2.URLError) as err:
+        raise IOError("ERROR: Couldn't list %s: %s" % (url, err))
+
+    raise IOError("ERROR: Unsupported archive URL: %s" % url)
+
+
+################################################################################
+def fetch_ftp(url, part_file, offset):
+    """
+    Downloads an ftp:// URL into part_file, from byte offset on if the server
+    can restart there. Returns the number of bytes transferred.
+    """
+    ftp = ftp_connect(url)
+    path = urllib2.unquote(urlparse.urlparse(url).path)
+    transferred = [0]
+    try:
+        ftp.voidcmd("TYPE I")
+        if offset > 0:
+            ## Servers that can't restart a transfer send the whole file again
+            try:
+                ftp.sendcmd("REST %d" % offset)
+            except (ftplib.error_perm, ftplib.error_reply):
+                offset = 0
+        with open(part_file, 'ab' if offset > 0 else 'wb') as out:
+            def write(block):
+                out.write(block)
+                transferred[0] += len(block)
+            ftp.retrbinary("RETR %s" % path, write, blocksize=CHUNK_SIZE,
+                    rest=offset or None)
+    finally:
+        ftp.close()
+
+    return transferred[0]
+
+
+################################################################################
+def fetch_http(url, part_file, offset):
+    """
+    Downloads an http(s):// URL into part_file, from byte offset on if the
+    server sends partial content. Returns the number of bytes transferred.
+    The bytes received are checked against the Content-Length (or, for
+    partial content, the Content-Range) of the response; if they don't match,
+    IOError is raised and part_file is left to be resumed. If the server says
+    the range isn't satisfiable, part_file is only taken as complete if it's
+    the size of the remote file; otherwise it's fetched again from byte 0.
+    """
+    request = urllib2.Request(url)
+    if offset > 0:
+        request.add_header("Range", "bytes=%d-" % offset)
+    try:
+        response = urllib2.urlopen(request, timeout=TIMEOUT)
+    except urllib2.HTTPError as err:
+        if err.code != 416:
+            raise
+        ## Range not satisfiable: part_file is all there only if it's the size
+        ## in Content-Range ('bytes */<size>'); if it's bigger (stale, or the
+        ## remote file shrank), it's fetched again from the start
+        match = re.match(r"bytes\s+\*/(\d+)", err.info().get("Content-Range",
+                ""))
+        if match is not None and int(match.group(1)) == offset:
+            return 0
+        os.remove(part_file)
+        return fetch_http(url, part_file, 0)
+
+    ## A server that ignores Range sends the whole file again
+    partial = offset > 0 and response.getcode() == 206
+    headers = response.info()
+    expected = None
+    if partial:
+        match = re.match(r"bytes\s+(\d+)-(\d+)/", headers.get("Content-Range",
+                ""))
+        if match is None or int(match.group(1)) != offset:
+            response.close()
+            raise IOError("Bad Content-Range: %s" % headers.get(
+                    "Content-Range"))
+        expected = int(match.group(2)) - int(match.group(1)) + 1
+    elif headers.get("Content-Length") is not None:
+        expected = int(headers.get("Content-Length"))
+
+    transferred = 0
+    with open(part_file, 'ab' if partial else 'wb') as out:
+        while True:
+            block = response.read(CHUNK_SIZE)
+            if not block:
+                break
+            out.write(block)
+            transferred += len(block)
+    response.close()
+
+    ## A connection cut short just ends the response early
+    if expected is not None and transferred != expected:
+        raise IOError("Transfer cut short: got %d of %d bytes." % \
+                (transferred, expected))
+
+    return transferred
+
+
+################################################################################
+def fetch_local(path, part_file, offset):
+    """
+    Copies a local file into part_file, from byte offset on. Returns the number
+    of bytes copied.
+    """
+    transferred = 0
+    with open(path, 'rb') as in_f, open(part_file, 'ab' if offset > 0 else
+            'wb') as out:
+        in_f.seek(offset)
+        while True:
+            block = in_f.read(CHUNK_SIZE)
+            if not block:
+                break
+            out.write(block)
+            transferred += len(block)
+
+    return transferred
+
+
+################################################################################
+def file_md5(path):
+    """
+    Computes the MD5 checksum of a file, reading it in chunks.
+    """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as in_f:
+        for block in iter(lambda: in_f.read(CHUNK_SIZE), b""):
+            md5.update(block)
+
+    return md5.hexdigest()
+
+
+################################################################################
+def read_manifest(obs_dir):
+    """
+    Reads the download manifest of an obsID directory.
+
+    Returns
+    -------
+    dict
+        Relative path -> (size, MD5 checksum). Empty if there's no manifest.
+
+    """
+    manifest = dict()
+    manifest_file = os.path.join(obs_dir, MANIFEST)
+    if not os.path.isfile(manifest_file):
+        return manifest
+
+    with open(manifest_file, 'r') as in_f:
+        for line in in_f:
+            if line.startswith("#") or not line.strip():
+                continue
+            (md5, size, rel_path) = line.rstrip("\n").split(None, 2)
+            manifest[rel_path] = (int(size), md5)
+
+    return manifest
+
+
+################################################################################
+def write_manifest(obs_dir, url, manifest):
+    """
+    Writes the download manifest of an obsID directory.
+
+    Parameters
+    ----------
+    obs_dir : str
+        The obsID directory.
+
+    url : str
+        Where the obsID was downloaded from.
+
+    manifest : dict
+        Relative path -> (size, MD5 checksum).
+
+    Returns
+    -------
+    nothing
+
+    """
+    manifest_file = os.path.join(obs_dir, MANIFEST)
+    with open(manifest_file + ".tmp", 'w') as out:
+        out.write("# %s\n# MD5 SIZE FILE\n" % url)
+        for rel_path in sorted(manifest):
+            (size, md5) = manifest[rel_path]
+            out.write("%s %d %s\n" % (md5, size, rel_path))
+    os.rename(manifest_file + ".tmp", manifest_file)
+
+
+################################################################################
+def is_complete(obs_dir, verify=False):
+    """
+    Checks whether an obsID was completely downloaded: it has a manifest and
+    its files have the sizes (and, if verify, the MD5 checksums) in it.
+    """
+    manifest = read_manifest(obs_dir)
+    if len(manifest) == 0:
+        return False
+
+    for (rel_path, (size, md5)) in manifest.items():
+        path = os.path.join(obs_dir, rel_path)
+        if not os.path.isfile(path) or os.path.getsize(path) != size:
+            return False
+        if verify and file_md5(path) != md5:
+            return False
+
+    return True
+
+
+################################################################################
+def list_worker(job):
+    """
+    Lists the archive files of an obsID, for use in a thread pool.
+
+    Parameters
+    ----------
+    job : tuple
+        (obsID, archive URL of the obsID).
+
+    Returns
+    -------
+    list of (str, int or None), or None
+        As from list_files, or None if it couldn't be listed.
+
+    """
+    (obsID, url) = job
+    try:
+        return list_files(url)
+    except IOError as err:
+        print "\t%s" % ' '.join(str(err).split())
+        return None
+
+
+################################################################################
+def download_worker(job):
+    """
+    Downloads one file into <local file>.part, resuming a partial one, checks
+    its size and moves it into place. For use in a thread pool.
+
+    Parameters
+    ----------
+    job : tuple
+        (obsID, URL of the file, local file, size in the archive or None).
+
+    Returns
+    -------
+    tuple
+        (obsID, local file, bytes transferred, True if it's complete).
+
+    """
+    (obsID, url, out_file, size) = job
+    part_file = out_file + PART_EXT
+    out_dir = os.path.dirname(out_file)
+    try:
+        if not os.path.isdir(out_dir):
+            try:
+                os.makedirs(out_dir)
+            except OSError:
+                ## Another thread may have just made it
+                if not os.path.isdir(out_dir):
+                    raise
+        offset = os.path.getsize(part_file) if os.path.isfile(part_file) \
+                else 0
+        if size is not None and offset > size:
+            offset = 0
+
+        path = local_path(url)
+        scheme = urlparse.urlparse(url).scheme
+        if path is not None:
+            transferred = fetch_local(path, part_file, offset)
+        elif scheme == "ftp":
+            transferred = fetch_ftp(url, part_file, offset)
+        else:
+            transferred = fetch_http(url, part_file, offset)
+    except (IOError, OSError, httplib.HTTPException, ftplib.all_errors) as \
+            err:
+        print "\tERROR: Couldn't download %s: %s" % (url,
+                ' '.join(str(err).split()))
+        return obsID, out_file, 0, False
+
+    got = os.path.getsize(part_file)
+    if size is not None and got != size:
+        print "\tERROR: %s has %d bytes, expected %d." % (out_file, got, size)
+        if got > size:
+            os.remove(part_file)
+        return obsID, out_file, transferred, False
+
+    os.rename(part_file, out_file)
+
+    return obsID, out_file, transferred, True
+
+
+################################################################################
+def download(obsIDs, archive=WEB_PREFIX, data_dir=DATA_DIR, n_transfers=4,
+        verify=False):
+    """
+    Downloads the obsIDs that aren't completely downloaded yet.
+
+    Parameters
+    ----------
+    obsIDs : list of str
+        The obsIDs.
+
+    archive : str
+        Archive root, as URL or local directory.
+
+    data_dir : str
+        Directory to save the data in, as data_dir/P<propID>/<obsID>.
+
+    n_transfers : int, default=4
+        Number of concurrent transfers.
+
+    verify : bool, default=False
+        If True, also check the MD5 checksums of obsIDs that look complete, and
+        of files already there, against their manifest.
+
+    Returns
+    -------
+    list of str
+        The obsIDs that are now completely downloaded.
+
+    """
+    to_get = []
+    done = []
+    for obsID in obsIDs:
+        if is_complete(obsID_dir(data_dir, obsID), verify=verify):
+            done.append(obsID)
+        else:
+            to_get.append(obsID)
+    print "%d obsIDs already downloaded, %d to get." % (len(done),
+            len(to_get))
+    if len(to_get) == 0:
+        print "\tNothing new to download!"
+        return done
+
+    start_time = time.time()
+    pool = ThreadPool(processes=max(1, n_transfers))
+    try:
+        listings = pool.map(list_worker, [(obsID, obsID_url(archive, obsID)) \
+                for obsID in to_get], chunksize=1)
+
+        jobs = []
+        manifests = dict()
+        for (obsID, listing) in zip(to_get, listings):
+            if listing is None:
+                continue
+            obs_dir = obsID_dir(data_dir, obsID)
+            old_manifest = read_manifest(obs_dir)
+            manifests[obsID] = listing
+            for (rel_path, size) in listing:
+                out_file = os.path.join(obs_dir, *rel_path.split("/"))
+                if os.path.isfile(out_file) and (size is None or
+                        os.path.getsize(out_file) == size):
+                    old = old_manifest.get(rel_path)
+                    if not verify or (old is not None and old[0] == \
+                            os.path.getsize(out_file) and old[1] == \
+                            file_md5(out_file)):
+                        continue
+                    os.remove(out_file)
+                jobs.append((obsID, obsID_url(archive, obsID) + "/" + \
+                        rel_path, out_file, size))
+        print "Downloading %d files with %d concurrent transfers." % \
+                (len(jobs), max(1, n_transfers))
+
+        results = pool.imap_unordered(download_worker, jobs)
+        failed = set()
+        n_bytes = 0
+        n_files = 0
+        for (obsID, out_file, transferred, ok) in results:
+            n_bytes += transferred
+            if ok:
+                n_files += 1
+            else:
+                failed.add(obsID)
+    finally:
+        pool.close()
+        pool.join()
+
+    for obsID in to_get:
+        if obsID not in manifests:
+            continue
+        if obsID in failed:
+            print "\tERROR: %s is not completely downloaded. Run again to "\
+                    "resume." % obsID
+            continue
+        obs_dir = obsID_dir(data_dir, obsID)
+        manifest = dict()
+        for (rel_path, size) in manifests[obsID]:
+            path = os.path.join(obs_dir, *rel_path.split("/"))
+            manifest[rel_path] = (os.path.getsize(path), file_md5(path))
+        write_manifest(obs_dir, obsID_url(archive, obsID), manifest)
+        done.append(obsID)
+
+    elapsed = time.time() - start_time
+    print "Downloaded %d files, %.1f MB in %.1f s (%.2f MB/s)." % (n_files,
+            n_bytes / 1e6, elapsed, n_bytes / 1e6 / max(elapsed, 1e-6))
+
+    return done
+
+
+################################################################################
+def main(obsID_list, archive=WEB_PREFIX, data_dir=DATA_DIR, n_transfers=4,
+        verify=False):
+    """
+    Reads a list of obsIDs and downloads them.
+
+    Parameters
+    ----------
+    obsID_list : str
+        List of obsIDs, one per line. Duplicates are only downloaded once.
+
+    archive, data_dir, n_transfers, verify
+        As for download.
+
+    Returns
+    -------
+    list of str
+        The obsIDs that are now completely downloaded.
+
+    """
+    if not os.path.isfile(obsID_list):
+        print "\tERROR: observation ID list does not exist."
+        exit()
+
+    obsIDs = []
+    for line in open(obsID_list):
+        if line.strip() and line.strip() not in obsIDs:
+            obsIDs.append(line.strip())
+    if len(obsIDs) == 0:
+        print "\tERROR: Observation ID list exists but is empty: %s" % \
+                obsID_list
+        exit()
+
+    done = download(obsIDs, archive=archive, data_dir=data_dir,
+            n_transfers=n_transfers, verify=verify)
+    print "%d /%d obsIDs completely downloaded." % (len(done), len(obsIDs))
+
+    return done
+
+
+################################################################################
+if __name__ == "__main__":
+
+    ##############################################
+    ## Parsing input arguments and calling 'main'
+    ##############################################
+
+    parser = argparse.ArgumentParser(usage="python download_obsIDs.py "\
+            "obsID_list [--archive URL --data_dir DIR --transfers N "\
+            "--verify]", description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter,
+            epilog="For optional arguments, default values are given in "\
+            "brackets at end of description.")
+
+    parser.add_argument('obsID_list', help="List of obsIDs to download, one "\
+            "per line.")
+
+    parser.add_argument('--archive', default=WEB_PREFIX, help="Archive root: "\
+            "ftp://, http:// or https:// URL, or local directory. [%s]" % \
+            WEB_PREFIX)
+
+    parser.add_argument('--data_dir', default=DATA_DIR, help="Directory to "\
+            "save the data in, as <dir>/P<propID>/<obsID>. [%s]" % DATA_DIR)
+
+    parser.add_argument('--transfers', type=int, default=4,
+            dest='n_transfers', help="Number of concurrent transfers. [4]")
+
+    parser.add_argument('--verify', action='store_true', default=False,
+            help="Also check MD5 checksums against the manifests, not only "\
+            "file sizes. [False]")
+
+    args = parser.parse_args()
+
+    main(args.obsID_list, archive=args.archive, data_dir=args.data_dir,
+            n_transfers=args.n_transfers, verify=args.verify)
+
+################################################################################
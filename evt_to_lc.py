@@ -0,0 +1,641 @@
+#!/usr/bin/env python
+
+"""
+Bins a GTI'd event list (from apply_gti.py, in FITS or compact format) into a
+light curve of counts per time bin and energy channel, or per time bin and
+energy band. Events are put in bins by integer bin indexing and np.bincount, so
+this is one pass over the events. Time bins that aren't entirely inside a GTI
+are flagged as bad. The light curve is saved as a .npz file with the counts in
+the smallest unsigned int type they fit in, for the power spectrum and CCF
+code; load_lc reads it back.
+
+For Fourier-segment timing analysis, lc_segments streams through an event list
+and yields one fixed-length, GTI-contained segment of the light curve at a
+time, without holding the whole light curve in memory.
+
+"""
+
+import argparse
+import numpy as np
+from astropy.io import fits
+
+from apply_gti import read_gti, load_compact, read_compact_header, \
+        compact_chunks, COMPACT_EXT
+
+__author__ = "Abigail Stevens <A.L.Stevens at uva.nl>"
+__version__ = "0.1 2026-10-18"
+__year__ = "2014-2016"
+
+
+################################################################################
+def read_events(event_list):
+    """
+    Reads the header, TIME, CHANNEL and PCUID of a GTI'd event list.
+
+    Parameters
+    ----------
+    event_list : str
+        The GTI'd event list, in FITS or compact (.evtc) format.
+
+    Returns
+    -------
+    astropy.io.fits header object
+        The header of the event list.
+
+    np.array of floats
+        TIME, with TIMEZERO applied (as apply_gti.py writes it).
+
+    np.array of ints
+        CHANNEL.
+
+    np.array of ints
+        PCUID.
+
+    """
+    if event_list.endswith(COMPACT_EXT):
+        (header, time, chan, pcu) = load_compact(event_list)
+        return header, time, chan, pcu
+
+    with fits.open(event_list, memmap=True) as data_hdu:
+        header = data_hdu[1].header.copy()
+        data = data_hdu[1].data
+        time = np.array(data.field('TIME'), dtype=np.float64)
+        chan = np.array(data.field('CHANNEL'), dtype=np.int64)
+        pcu = np.array(data.field('PCUID'), dtype=np.int64)
+
+    return header, time, chan, pcu
+
+
+################################################################################
+def event_gti(header, gti_file=None):
+    """
+    Gets the GTIs of a GTI'd event list, on the same time scale as its TIME.
+
+    Parameters
+    ----------
+    header : astropy.io.fits header object
+        The header of the GTI'd event list.
+
+    gti_file : str, optional
+        The GTI file. Default is the GTI_FILE in the header.
+
+    Returns
+    -------
+    np.array of floats, or None
+        2-D array of the GTIs with TIMEZERO applied, or None if there's no GTI
+        file.
+
+    """
+    if gti_file is None:
+        gti_file = header.get('GTI_FILE', None)
+    if gti_file is None:
+        return None
+
+    return read_gti(gti_file) + header.get('TIMEZERO', 0.0)
+
+
+################################################################################
+def band_lookup(bands, detchans):
+    """
+    Makes a channel -> band index lookup table for energy bands that don't
+    overlap.
+
+    Parameters
+    ----------
+    bands : list of (int, int)
+        The (lowest, highest) channel of each band, inclusive.
+
+    detchans : int
+        The number of detector energy channels.
+
+    Returns
+    -------
+    np.array of ints, or None
+        The band index of each channel (-1 for channels in no band), or None if
+        the bands overlap.
+
+    """
+    lookup = -np.ones(detchans, dtype=np.int64)
+    for (i, (low, high)) in enumerate(bands):
+        if np.any(lookup[low:high + 1] >= 0):
+            return None
+        lookup[low:high + 1] = i
+
+    return lookup
+
+
+################################################################################
+def bin_events(time, chan, t_start, dt, n_bins, detchans=64, bands=None):
+    """
+    Bins events into counts per time bin and energy channel (or band).
+
+    Parameters
+    ----------
+    time : np.array of floats
+        Event times.
+
+    chan : np.array of ints
+        Event energy channels, 0 to detchans-1.
+
+    t_start : float
+        Start time of the first time bin.
+
+    dt : float
+        Length of a time bin, in seconds.
+
+    n_bins : int
+        Number of time bins. Events outside them are left out.
+
+    detchans : int, default=64
+        The number of detector energy channels.
+
+    bands : list of (int, int), optional
+        The (lowest, highest) channel of each energy band, inclusive. Default is
+        one column per energy channel.
+
+    Returns
+    -------
+    np.array of ints
+        2-D array of counts, of shape (n_bins, detchans or number of bands).
+
+    """
+    time_index = np.floor((np.asarray(time) - t_start) / dt).astype(np.int64)
+    chan = np.asarray(chan).astype(np.int64)
+    keep = (time_index >= 0) & (time_index < n_bins) & (chan >= 0) & \
+            (chan < detchans)
+    time_index = time_index[keep]
+    chan = chan[keep]
+
+    if bands is None:
+        flat_index = time_index * detchans + chan
+        return np.bincount(flat_index, minlength=n_bins * detchans).reshape(
+                n_bins, detchans)
+
+    lookup = band_lookup(bands, detchans)
+    if lookup is not None:
+        band_index = lookup[chan]
+        in_band = band_index >= 0
+        flat_index = time_index[in_band] * len(bands) + band_index[in_band]
+        return np.bincount(flat_index, minlength=n_bins * len(bands)).reshape(
+                n_bins, len(bands))
+
+    ## Overlapping bands are binned one at a time
+    counts = np.zeros((n_bins, len(bands)), dtype=np.int64)
+    for (i, (low, high)) in enumerate(bands):
+        in_band = (chan >= low) & (chan <= high)
+        counts[:, i] = np.bincount(time_index[in_band], minlength=n_bins)
+
+    return counts
+
+
+################################################################################
+def good_bins(t_start, dt, n_bins, gti=None):
+    """
+    Flags the time bins that are entirely inside a GTI.
+
+    Parameters
+    ----------
+    t_start : float
+        Start time of the first time bin.
+
+    dt : float
+        Length of a time bin, in seconds.
+
+    n_bins : int
+        Number of time bins.
+
+    gti : np.array of floats, optional
+        2-D array of the GTIs, start times in column 0 and stop times in column
+        1, in time order. Default is that all the bins are good.
+
+    Returns
+    -------
+    np.array of bools
+        True for the good time bins.
+
+    """
+    if gti is None:
+        return np.ones(n_bins, dtype=bool)
+
+    bin_start = t_start + np.arange(n_bins) * dt
+    gti_index = np.searchsorted(gti[:, 0], bin_start, side='right') - 1
+    good = gti_index >= 0
+    good[good] = bin_start[good] + dt <= gti[gti_index[good], 1]
+
+    return good
+
+
+################################################################################
+def make_lc(event_list, dt, gti_file=None, pcus=None, bands=None,
+        time_range=None):
+    """
+    Makes a binned light curve from a GTI'd event list.
+
+    Parameters
+    ----------
+    event_list : str
+        The GTI'd event list, in FITS or compact (.evtc) format.
+
+    dt : float
+        Length of a time bin, in seconds.
+
+    gti_file : str, optional
+        The GTI file. Default is the GTI_FILE in the event list header.
+
+    pcus : list of ints, optional
+        Only use events from these PCUs. Default is all PCUs.
+
+    bands : list of (int, int), optional
+        The (lowest, highest) channel of each energy band, inclusive. Default is
+        one column per energy channel.
+
+    time_range : (float, float), optional
+        Start and stop time of the light curve. Default is from the start of the
+        first GTI to the end of the last one (or the first to last event, if
+        there's no GTI file).
+
+    Returns
+    -------
+    np.array of ints
+        2-D array of counts per time bin and energy channel (or band).
+
+    np.array of bools
+        True for the time bins entirely inside a GTI.
+
+    float
+        Start time of the first time bin.
+
+    astropy.io.fits header object
+        The header of the event list.
+
+    """
+    (header, time, chan, pcu) = read_events(event_list)
+    detchans = int(header.get('DETCHANS', 64))
+    gti = event_gti(header, gti_file)
+
+    if pcus is not None:
+        pcu_mask = np.in1d(pcu, pcus)
+        time = time[pcu_mask]
+        chan = chan[pcu_mask]
+
+    if time_range is not None:
+        (t_start, t_stop) = time_range
+    elif gti is not None and len(gti) > 0:
+        (t_start, t_stop) = (gti[0, 0], gti[-1, 1])
+    elif len(time) > 0:
+        (t_start, t_stop) = (time[0], time[-1] + dt)
+    else:
+        (t_start, t_stop) = (0.0, 0.0)
+
+    n_bins = max(0, int(np.ceil((t_stop - t_start) / dt)))
+    counts = bin_events(time, chan, t_start, dt, n_bins, detchans=detchans,
+            bands=bands)
+
+    return counts, good_bins(t_start, dt, n_bins, gti), t_start, header
+
+
+################################################################################
+def segment_starts(gti, numsec):
+    """
+    Gets the start times of the fixed-length segments that fit entirely inside
+    the GTIs. Each GTI is cut into as many segments as fit from its start time,
+    so the segments are the same every time.
+
+    Parameters
+    ----------
+    gti : np.array of floats
+        2-D array of the GTIs, start times in column 0 and stop times in column
+        1, in time order.
+
+    numsec : float
+        Length of a segment, in seconds.
+
+    Returns
+    -------
+    np.array of floats
+        Start time of each segment, in time order.
+
+    """
+    gti = np.reshape(gti, (-1, 2))
+    n_segs = np.floor((gti[:, 1] - gti[:, 0]) / numsec).astype(np.int64)
+    n_segs = np.maximum(n_segs, 0)
+    gti_index = np.repeat(np.arange(len(gti)), n_segs)
+    seg_in_gti = np.arange(np.sum(n_segs)) - np.repeat(np.cumsum(n_segs) - \
+            n_segs, n_segs)
+
+    return gti[gti_index, 0] + seg_in_gti * numsec
+
+
+################################################################################
+def event_chunks(event_list, chunk_rows=1000000):
+    """
+    Reads a GTI'd event list in chunks of rows, from a memory map. Compact
+    event lists with delta-encoded TIME are decoded a chunk at a time.
+
+    Parameters
+    ----------
+    event_list : str
+        The GTI'd event list, in FITS or compact (.evtc) format.
+
+    chunk_rows : int, default=1000000
+        Number of events per chunk.
+
+    Yields
+    ------
+    np.array of floats, np.array of ints, np.array of ints
+        TIME, CHANNEL and PCUID of a chunk of events.
+
+    """
+    if event_list.endswith(COMPACT_EXT):
+        for (time, chan, pcu) in compact_chunks(event_list,
+                chunk_rows=chunk_rows):
+            yield np.array(time, dtype=np.float64), \
+                    np.array(chan, dtype=np.int64), \
+                    np.array(pcu, dtype=np.int64)
+        return
+
+    with fits.open(event_list, memmap=True) as data_hdu:
+        data = data_hdu[1].data
+        for start in xrange(0, len(data), chunk_rows):
+            rows = data[start:start + chunk_rows]
+            yield np.array(rows.field('TIME'), dtype=np.float64), \
+                    np.array(rows.field('CHANNEL'), dtype=np.int64), \
+                    np.array(rows.field('PCUID'), dtype=np.int64)
+
+
+################################################################################
+def lc_segments(event_list, numsec, dt, gti_file=None, pcus=None, bands=None,
+        chunk_rows=1000000):
+    """
+    Generates the binned light curve of a GTI'd event list one fixed-length,
+    GTI-contained segment at a time, for Fourier-segment timing analysis. The
+    event list is streamed through in chunks, so only one chunk of events and
+    the segments it touches are in memory at a time. The events must be in time
+    order, as apply_gti.py writes them.
+
+    Parameters
+    ----------
+    event_list : str
+        The GTI'd event list, in FITS or compact (.evtc) format.
+
+    numsec : float
+        Length of a segment, in seconds.
+
+    dt : float
+        Length of a time bin, in seconds. numsec must be a whole number of
+        time bins.
+
+    gti_file : str, optional
+        The GTI file. Default is the GTI_FILE in the event list header.
+
+    pcus : list of ints, optional
+        Only use events from these PCUs. Default is all PCUs.
+
+    bands : list of (int, int), optional
+        The (lowest, highest) channel of each energy band, inclusive. Default is
+        one column per energy channel.
+
+    chunk_rows : int, default=1000000
+        Number of events read at a time.
+
+    Yields
+    ------
+    float
+        Start time of the segment.
+
+    np.array of ints
+        2-D array of counts per time bin and energy channel (or band) in the
+        segment.
+
+    Raises
+    ------
+    ValueError if numsec isn't a whole number of time bins, or if there's no
+    GTI file.
+
+    """
+    n_bins = int(round(numsec / dt))
+    if n_bins < 1 or not np.isclose(n_bins * dt, numsec):
+        raise ValueError("ERROR: numsec must be a whole number of time bins.")
+
+    if event_list.endswith(COMPACT_EXT):
+        header = read_compact_header(event_list)[0]
+    else:
+        header = fits.getheader(event_list, 1)
+    detchans = int(header.get('DETCHANS', 64))
+    gti = event_gti(header, gti_file)
+    if gti is None:
+        raise ValueError("ERROR: No GTI file for the event list: %s" % \
+                event_list)
+
+    seg_starts = segment_starts(gti, numsec)
+    seg_stops = seg_starts + numsec
+    n_cols = detchans if bands is None else len(bands)
+    filled = {}
+    next_seg = 0
+
+    for (time, chan, pcu) in event_chunks(event_list, chunk_rows=chunk_rows):
+        if len(time) == 0:
+            continue
+        chunk_end = time[-1]
+        if pcus is not None:
+            pcu_mask = np.in1d(pcu, pcus)
+            time = time[pcu_mask]
+            chan = chan[pcu_mask]
+
+        ## Which segment each event is in, if any
+        seg_index = np.searchsorted(seg_starts, time, side='right') - 1
+        in_seg = seg_index >= 0
+        in_seg[in_seg] = time[in_seg] < seg_stops[seg_index[in_seg]]
+        seg_index = seg_index[in_seg]
+        time = time[in_seg]
+        chan = chan[in_seg]
+
+        ## Events are in time order, so each segment is a contiguous slice
+        bounds = np.flatnonzero(np.diff(seg_index)) + 1
+        for (first, last) in zip(np.append(0, bounds), np.append(bounds,
+                len(seg_index))):
+            if first == last:
+                continue
+            seg = seg_index[first]
+            counts = bin_events(time[first:last], chan[first:last],
+                    seg_starts[seg], dt, n_bins, detchans=detchans,
+                    bands=bands)
+            if seg in filled:
+                filled[seg] += counts
+            else:
+                filled[seg] = counts
+
+        ## Segments that end by the last event read can't get more events
+        done = np.searchsorted(seg_stops, chunk_end, side='right')
+        while next_seg < done:
+            yield seg_starts[next_seg], filled.pop(next_seg, np.zeros((n_bins,
+                    n_cols), dtype=np.int64))
+            next_seg += 1
+
+    while next_seg < len(seg_starts):
+        yield seg_starts[next_seg], filled.pop(next_seg, np.zeros((n_bins,
+                n_cols), dtype=np.int64))
+        next_seg += 1
+
+
+################################################################################
+def smallest_uint(counts):
+    """
+    Gets the smallest unsigned int type that the counts fit in.
+    """
+    max_count = np.max(counts) if np.size(counts) > 0 else 0
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_count <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+################################################################################
+def write_lc(out_file, counts, good, t_start, dt, bands=None, header=None):
+    """
+    Saves a binned light curve to a .npz file.
+
+    Parameters
+    ----------
+    out_file : str
+        The output file (.npz).
+
+    counts : np.array of ints
+        2-D array of counts per time bin and energy channel (or band).
+
+    good : np.array of bools
+        True for the time bins entirely inside a GTI.
+
+    t_start : float
+        Start time of the first time bin.
+
+    dt : float
+        Length of a time bin, in seconds.
+
+    bands : list of (int, int), optional
+        The energy bands of the columns. Default is one column per channel.
+
+    header : astropy.io.fits header object, optional
+        The header of the event list, kept as a string.
+
+    Returns
+    -------
+    nothing
+
+    """
+    if bands is None:
+        bands = [(chan, chan) for chan in range(np.shape(counts)[1])]
+    header_str = header.tostring() if header is not None else ""
+
+    np.savez(out_file, counts=counts.astype(smallest_uint(counts)),
+            good=good, t_start=t_start, dt=dt,
+            bands=np.reshape(np.asarray(bands, dtype=np.int64), (-1, 2)),
+            header=header_str)
+
+
+################################################################################
+def load_lc(in_file):
+    """
+    Loads a binned light curve saved by write_lc.
+
+    Parameters
+    ----------
+    in_file : str
+        The light curve file (.npz).
+
+    Returns
+    -------
+    dict
+        'counts' (2-D array of counts per time bin and channel or band), 'good'
+        (good time bins), 't_start', 'dt', 'bands' ((lowest, highest) channel of
+        each column) and 'header' (the event list header).
+
+    """
+    with np.load(in_file) as saved:
+        lc = {'counts': saved['counts'], 'good': saved['good'],
+                't_start': float(saved['t_start']), 'dt': float(saved['dt']),
+                'bands': saved['bands']}
+        header_str = str(saved['header'])
+    lc['header'] = fits.Header.fromstring(header_str) if header_str else None
+
+    return lc
+
+
+################################################################################
+def main(event_list, out_file, dt, gti_file=None, pcus=None, bands=None,
+        time_range=None):
+    """
+    Makes a binned light curve from a GTI'd event list and saves it.
+
+    Returns
+    -------
+    np.array of ints
+        2-D array of counts per time bin and energy channel (or band).
+
+    """
+    try:
+        (counts, good, t_start, header) = make_lc(event_list, dt,
+                gti_file=gti_file, pcus=pcus, bands=bands,
+                time_range=time_range)
+    except IOError:
+        print "\tERROR: File does not exist: %s" % event_list
+        exit()
+
+    write_lc(out_file, counts, good, t_start, dt, bands=bands, header=header)
+
+    n_good = np.sum(good)
+    if n_good > 0:
+        print "%d time bins, %d good. Mean count rate in good bins: %.3f c/s" \
+                % (len(good), n_good, np.sum(counts[good]) / (n_good * dt))
+    else:
+        print "%d time bins, none good." % len(good)
+
+    return counts
+
+
+################################################################################
+if __name__ == "__main__":
+
+    ##############################################
+    ## Parsing input arguments and calling 'main'
+    ##############################################
+
+    parser = argparse.ArgumentParser(usage="python evt_to_lc.py event_list "\
+            "out_file [--dt DT --gti GTI_FILE --pcu PCU [PCU ...] --band LOW "\
+            "HIGH --time START STOP]", description=__doc__, epilog="For "\
+            "optional arguments, default values are given in brackets at end "\
+            "of description.")
+
+    parser.add_argument('event_list', help="GTI'd event list from "\
+            "apply_gti.py (FITS or .evtc).")
+
+    parser.add_argument('out_file', help="Output light curve file (.npz).")
+
+    parser.add_argument('--dt', type=float, default=1.0/128.0, help="Length "\
+            "of a time bin, in seconds. [0.0078125]")
+
+    parser.add_argument('--gti', default=None, dest='gti_file', help="GTI "\
+            "file. [GTI_FILE in the event list header]")
+
+    parser.add_argument('--pcu', type=int, nargs='+', default=None,
+            dest='pcus', help="Only use events from these PCUs. [all]")
+
+    parser.add_argument('--band', type=int, nargs=2, action='append',
+            default=None, dest='bands', help="Lowest and highest channel "\
+            "(inclusive) of an energy band. Give once per band. [one column "\
+            "per channel]")
+
+    parser.add_argument('--time', type=float, nargs=2, default=None,
+            dest='time_range', help="Start and stop time of the light curve. "\
+            "[first GTI start to last GTI stop]")
+
+    args = parser.parse_args()
+
+    bands = None
+    if args.bands is not None:
+        bands = [tuple(band) for band in args.bands]
+
+    main(args.event_list, args.out_file, args.dt, gti_file=args.gti_file,
+            pcus=args.pcus, bands=bands, time_range=args.time_range)
+
+################################################################################
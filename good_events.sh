@@ -2,7 +2,8 @@
 
 ################################################################################
 ##
-## Bash script that decodes the binary event list and runs apply_gti.py
+## Bash script that decodes the binary event lists and runs apply_gti.py on
+## all of them together
 ##
 ## If there are some events that don't have any good events in them, they are 
 ## removed from lists and the user is instructed to run reduce_alltogether.sh 
@@ -54,10 +55,13 @@ list_dir="$home_dir/Dropbox/Lists"
 
 bad_orbits="$red_dir/bad_orbits.lst"  ## list of obsIDs with at least one orbit
                                       ## with no good events
+evt_manifest="$red_dir/eventlist_manifest.lst"  ## event lists decoded in this
+                                               ## run, for apply_gti.py
 
 if [ -e "$gtideventlist_list" ]; then rm "$gtideventlist_list"; fi
 touch "$gtideventlist_list"
 if [ -e "$bad_orbits" ]; then rm "$bad_orbits"; fi; touch "$bad_orbits"
+if [ -e "$evt_manifest" ]; then rm "$evt_manifest"; fi; touch "$evt_manifest"
 
 ################################################################################
 ################################################################################
@@ -85,59 +89,53 @@ for obsID in $( cat "$obsID_list" ); do
 
 			binaryfile="$data_dir/evt_${num}.pca"
 			eventlist="$data_dir/eventlist_${num}.fits"
-			if [ -e "$eventlist" ]; then rm "$eventlist"; fi
 
 			##################################
 			## 'Decode' the binary event list
 			##################################
 
 			if [ -e "$binaryfile" ]; then
-				decodeevt infile="$binaryfile" outfile="$eventlist" > dump.txt
+				## Only if it wasn't decoded since the binary file was made, so
+				## apply_gti.py can tell its GTI'd event list is up to date.
+				## Decoded to a temporary file first, so a decodeevt that dies
+				## part-way doesn't leave an event list that looks done.
+				if [ ! -e "$eventlist" ] || [ "$binaryfile" -nt "$eventlist" ]; then
+					if [ -e "$eventlist" ]; then rm "$eventlist"; fi
+					tmp_eventlist="$data_dir/eventlist_${num}_tmp.fits"
+					if [ -e "$tmp_eventlist" ]; then rm "$tmp_eventlist"; fi
+					decodeevt infile="$binaryfile" outfile="$tmp_eventlist" > dump.txt
+					if [ -e "$tmp_eventlist" ]; then
+						mv "$tmp_eventlist" "$eventlist"
+					fi
+				fi
+				if [ -e "$eventlist" ]; then
+					## '-': GTId_eventlist_${num} with the extension
+					## for apply_gti.py's output format
+					echo "$eventlist $gtifile - $binaryfile" >> "$evt_manifest"
+				else
+					echo -e "\tBinary file $binaryfile did not decode."
+				fi
 			else
 				echo -e "\tBinary file not decoded; does not exist."
 				continue
 			fi
 
-			gtid_eventlist="$data_dir/GTId_eventlist_${num}.fits"
-
-			####################
-            ## Run apply_gti.py
-            ####################
-
-            if [ -e "${eventlist}" ] && [ -e "$gtifile" ]; then
-                python "$exe_dir/apply_gti.py" "${eventlist}" "$gtifile" \
-                        "$gtid_eventlist"
-#                rm "${eventlist}"
-            else
-                continue
-            fi
-
-            if [ -e "$gtid_eventlist" ]; then
-                naxis2=$( python -c "from tools import get_key_val; print get_key_val('$gtid_eventlist', 1, 'NAXIS2')" )
-
-                ###############################################################
-                ## Only append the GTI'd eventlist file name to the list if it
-                ## has good events in it (i.e. length > 0)
-                ###############################################################
-
-                if (( $naxis2 > 0 )); then
-                    echo "$gtid_eventlist" >> $gtideventlist_list
-                    echo "$obsID" >> "$bad_orbits"
-                else
-                    echo -e "\tNo good events in eventlist for $obsID orbit ${num}."
-                    rm "$binaryfile"
-                    echo "$obsID" >> "$bad_orbits"
-                fi  ## End of 'if there are good events in this eventlist'
-            else
-                echo -e "\tERROR: apply_gti.py did not work. GTI'd eventlist "\
-                        "does not exist."
-            fi  ## End of 'if gti'd eventlist exists, i.e. apply_gti worked.
 		done  ## End of looping through the eventlists in this obsID
 
 	fi  ## End of 'if there are event files in this obsID directory'
 
 done  ## End of looping through obsIDs in obsID_list
 
+#################################################################
+## Run apply_gti.py on the event lists decoded above (listed in the
+## manifest) in one process pool. Only GTI'd eventlists with good
+## events in them (i.e. length > 0) go in the list; obsIDs with an
+## orbit with no good events go in the bad orbits list.
+#################################################################
+
+python "$exe_dir/apply_gti.py" batch "$evt_manifest" "$gtideventlist_list" \
+        "$bad_orbits" --manifest
+
 ## If there were obsIDs that had orbits no good events, check if no good orbits
 if (( $( wc -l < $bad_orbits ) > 0 )); then
     python -c "from tools import no_duplicates; no_duplicates('$bad_orbits')"
@@ -0,0 +1,179 @@
+"""
+Content hashing for the caches of pcu_filter.py, addpha.py, apply_gti.py and
+reduce_scheduler.py, which re-use results for files whose contents haven't
+changed, and the records of the cached stages of reduce_scheduler.py and
+apply_gti.py.
+
+"""
+
+import hashlib
+import numpy as np
+import os
+
+__author__ = "Abigail Stevens <A.L.Stevens at uva.nl>"
+__version__ = "0.1 2026-10-18"
+__year__ = "2017"
+
+## Bytes read at a time, so big files aren't read into memory all at once
+BLOCK_SIZE = 1048576
+
+
+################################################################################
+def file_hash(in_file):
+    """
+    Gets the SHA-1 hash of the contents of a file.
+
+    Parameters
+    ----------
+    in_file : str
+        The full path of the file.
+
+    Returns
+    -------
+    str
+        The hex digest.
+
+    """
+    sha = hashlib.sha1()
+    with open(in_file, 'rb') as in_f:
+        for block in iter(lambda: in_f.read(BLOCK_SIZE), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+################################################################################
+def hash_inputs(inputs, old_hashes):
+    """
+    Gets the size, modification time and content hash of each input file,
+    re-using the hashes of files whose size and modification time are the same
+    as before.
+
+    Parameters
+    ----------
+    inputs : list of str
+        The input files.
+
+    old_hashes : dict
+        File -> (size, mtime, hash), from the stage's last record.
+
+    Returns
+    -------
+    list of tuples
+        (file, size, mtime, hash) for each input file. Files that don't exist
+        have size -1 and hash 'missing'.
+
+    """
+    hashes = []
+    for in_file in inputs:
+        if not os.path.isfile(in_file):
+            hashes.append((in_file, -1, 0.0, "missing"))
+            continue
+        stat = os.stat(in_file)
+        old = old_hashes.get(in_file)
+        if old is not None and old[0] == stat.st_size and old[1] == \
+                stat.st_mtime:
+            content_hash = old[2]
+        else:
+            content_hash = file_hash(in_file)
+        hashes.append((in_file, stat.st_size, stat.st_mtime, content_hash))
+
+    return hashes
+
+
+################################################################################
+def stage_key(stage, hashes, params):
+    """
+    Gets the hash of everything a stage depends on: its name, the names and
+    contents of its input files, and its parameters.
+    """
+    sha = hashlib.sha1()
+    sha.update(stage)
+    for (in_file, size, mtime, content_hash) in hashes:
+        sha.update("\n%s %s" % (in_file, content_hash))
+    for name in sorted(params):
+        sha.update("\n%s=%s" % (name, params[name]))
+
+    return sha.hexdigest()
+
+
+################################################################################
+def load_record(record_file):
+    """
+    Loads the record of the last time a stage worked.
+
+    Parameters
+    ----------
+    record_file : str
+        The record (.npz) file.
+
+    Returns
+    -------
+    dict or None
+        'key': the stage key, 'inputs': file -> (size, mtime, hash), 'outputs':
+        file -> (size, mtime), 'result': what the stage returned. None if there
+        is no record.
+
+    """
+    if not os.path.isfile(record_file):
+        return None
+
+    with np.load(record_file) as saved:
+        inputs = dict((str(in_file), (int(size), float(mtime),
+                str(content_hash))) for (in_file, size, mtime, content_hash) in
+                zip(saved['in_files'], saved['in_sizes'], saved['in_mtimes'],
+                saved['in_hashes']))
+        outputs = dict((str(out_file), (int(size), float(mtime))) for
+                (out_file, size, mtime) in zip(saved['out_files'],
+                saved['out_sizes'], saved['out_mtimes']))
+        result = tuple([[str(entry) for entry in saved['result_%d' % i]] for \
+                i in range(int(saved['n_results']))])
+
+        return {'key': str(saved['key']), 'inputs': inputs, 'outputs': outputs,
+                'result': result}
+
+
+################################################################################
+def save_record(record_file, key, hashes, result):
+    """
+    Saves the record of a stage that worked: its key, its input files, and the
+    files it made (those in its result).
+    """
+    out_files = sorted(set([out_file for entries in result for out_file in \
+            entries if os.path.isfile(out_file)]))
+    stats = [os.stat(out_file) for out_file in out_files]
+    results = dict(("result_%d" % i, np.array(entries, dtype=str)) for (i,
+            entries) in enumerate(result))
+
+    ## Writing to a temporary file first, so a crash can't leave half a record
+    tmp_file = record_file + ".tmp.npz"
+    np.savez(tmp_file, key=key,
+            in_files=np.array([entry[0] for entry in hashes], dtype=str),
+            in_sizes=np.array([entry[1] for entry in hashes], dtype=np.int64),
+            in_mtimes=np.array([entry[2] for entry in hashes],
+            dtype=np.float64),
+            in_hashes=np.array([entry[3] for entry in hashes], dtype=str),
+            out_files=np.array(out_files, dtype=str),
+            out_sizes=np.array([stat.st_size for stat in stats],
+            dtype=np.int64),
+            out_mtimes=np.array([stat.st_mtime for stat in stats],
+            dtype=np.float64),
+            n_results=len(result), **results)
+    os.rename(tmp_file, record_file)
+
+
+################################################################################
+def outputs_unchanged(record):
+    """
+    Checks that the files a stage made are all still there and unchanged.
+    """
+    for (out_file, (size, mtime)) in record['outputs'].items():
+        if not os.path.isfile(out_file):
+            return False
+        stat = os.stat(out_file)
+        if (stat.st_size, stat.st_mtime) != (size, mtime):
+            return False
+
+    return True
+
+################################################################################
@@ -0,0 +1,503 @@
+#!/usr/bin/env python
+
+"""
+Keeps an index (sqlite database) of the header keywords the reduction uses --
+DATAMODE, time resolution, TSTART, TSTOP, DATE-OBS, TIMEPIXR, NAXIS2, OBS_ID --
+for every PCA science, filter and reduced data file under the raw data and
+reduced data directories, so they can be looked up without opening the files.
+
+A refresh only reads the headers of files that are new or have a different
+modification time or size since the last refresh (in a thread pool), and drops
+files that are gone. Queries select files by data mode, obsID, gain epoch and
+kind of file:
+
+    python header_index.py refresh
+    python header_index.py query --datamode E_125us_64M_0_1s --obsID_list \
+obsIDs.lst --epoch 5
+    python header_index.py value ~/Reduced_data/GX339/filter.xfl timepixr
+
+"""
+
+import argparse
+import numpy as np
+from astropy.io import fits
+import os
+import re
+import fnmatch
+import sqlite3
+from multiprocessing.pool import ThreadPool
+
+__author__ = "Abigail Stevens <A.L.Stevens at uva.nl>"
+__version__ = "0.1 2026-10-18"
+__year__ = "2017"
+
+HOME_DIR = os.path.expanduser("~")
+DATA_DIR = os.path.join(HOME_DIR, "Data", "RXTE")
+REDUCED_DIR = os.path.join(HOME_DIR, "Reduced_data")
+INDEX_FILE = os.path.join(DATA_DIR, "header_index.db")
+
+## File names that get indexed, and what kind of file they are
+FILE_KINDS = [("FS*", "science"), ("*.xfl", "filter"), ("*.xfl.gz", "filter"),
+        ("*.pca", "reduced"), ("*.evt", "reduced"), ("*.lc", "reduced"),
+        ("*.pha", "reduced"), ("*.gti", "reduced"), ("*.fits", "reduced")]
+
+## Binned modes keep their time resolution in 1CDLT2 instead of TIMEDEL
+BINNED_PREFIXES = ("B", "CB", "SB")
+
+## Start of PCA gain epochs 2 to 5, in MJD (epoch 1 is from launch)
+GAIN_EPOCH_STARTS = np.array([50163.7729167, 50188.9618056, 51259.7340278,
+        51677.0])
+
+## MJD of RXTE mission time 0, if the header doesn't have MJDREFI and MJDREFF
+MJDREF = 49353.000696574074
+
+OBSID_RE = re.compile(r"\d{5}-\d{2}-\d{2}-\d{2}[A-Z]?")
+
+COLUMNS = [("path", "TEXT PRIMARY KEY"), ("mtime", "REAL"), ("size", "INTEGER"),
+        ("kind", "TEXT"), ("obsid", "TEXT"), ("datamode", "TEXT"),
+        ("time_res", "REAL"), ("tstart", "REAL"), ("tstop", "REAL"),
+        ("date_obs", "TEXT"), ("timepixr", "REAL"), ("naxis2", "INTEGER"),
+        ("gain_epoch", "INTEGER"), ("object", "TEXT")]
+COLUMN_NAMES = [name for (name, sql_type) in COLUMNS]
+
+## Number of files whose headers are read between database commits
+BATCH_SIZE = 500
+
+
+################################################################################
+def file_kind(file_name):
+    """
+    Gets the kind of file ('science', 'filter' or 'reduced') from its name, or
+    None if it's not a kind that gets indexed.
+    """
+    for (pattern, kind) in FILE_KINDS:
+        if fnmatch.fnmatch(file_name, pattern):
+            return kind
+
+    return None
+
+
+################################################################################
+def gain_epoch(mjd):
+    """
+    Gets the PCA gain epoch (1 to 5) of an MJD, or None if the MJD is None.
+    """
+    if mjd is None:
+        return None
+
+    return int(np.searchsorted(GAIN_EPOCH_STARTS, mjd, side='right')) + 1
+
+
+################################################################################
+def open_index(index_file=INDEX_FILE):
+    """
+    Opens the header index database, making it if it doesn't exist yet.
+
+    Parameters
+    ----------
+    index_file : str
+        The sqlite database.
+
+    Returns
+    -------
+    sqlite3.Connection
+        The database, with rows returned as sqlite3.Row.
+
+    """
+    index_dir = os.path.dirname(os.path.abspath(index_file))
+    if not os.path.isdir(index_dir):
+        os.makedirs(index_dir)
+
+    db = sqlite3.connect(index_file)
+    db.row_factory = sqlite3.Row
+    db.execute("CREATE TABLE IF NOT EXISTS headers (%s)" % ", ".join(["%s %s" \
+            % column for column in COLUMNS]))
+    db.execute("CREATE INDEX IF NOT EXISTS mode_obsid ON headers "\
+            "(datamode, obsid)")
+    db.execute("CREATE INDEX IF NOT EXISTS obsid ON headers (obsid)")
+    db.execute("CREATE INDEX IF NOT EXISTS epoch ON headers (gain_epoch)")
+    db.commit()
+
+    return db
+
+
+################################################################################
+def read_keys(job):
+    """
+    Reads the indexed keywords of a file, from the extension 1 header, or the
+    primary header for those that aren't in extension 1. For use in a thread
+    pool.
+
+    Parameters
+    ----------
+    job : tuple
+        (path, mtime, size, kind).
+
+    Returns
+    -------
+    tuple or None
+        The values of COLUMNS for the file. Keywords it doesn't have are None.
+        None if the header couldn't be read, so the file isn't stored as
+        indexed and is tried again next time.
+
+    """
+    (path, mtime, size, kind) = job
+    headers = []
+    try:
+        with fits.open(path, memmap=True) as hdu_list:
+            if len(hdu_list) > 1:
+                headers.append(hdu_list[1].header)
+            headers.append(hdu_list[0].header)
+    except (IOError, IndexError, ValueError) as err:
+        print "\tERROR: Couldn't read header of %s: %s" % (path,
+                ' '.join(str(err).split()))
+        return None
+
+    def key_val(key):
+        for header in headers:
+            if key in header:
+                return header[key]
+        return None
+
+    def number(key):
+        value = key_val(key)
+        try:
+            return None if value is None else float(value)
+        except ValueError:
+            return None
+
+    datamode = key_val('DATAMODE')
+    datamode = None if datamode is None else str(datamode).strip()
+    if datamode and datamode.split("_")[0] in BINNED_PREFIXES:
+        time_res = number('1CDLT2')
+    else:
+        time_res = number('TIMEDEL')
+
+    obsID = key_val('OBS_ID')
+    if obsID is None or not str(obsID).strip():
+        match = OBSID_RE.search(path)
+        obsID = match.group(0) if match else None
+    else:
+        obsID = str(obsID).strip()
+
+    tstart = number('TSTART')
+    epoch = None
+    if tstart is not None:
+        mjdrefi = number('MJDREFI')
+        mjdreff = number('MJDREFF')
+        if mjdrefi is not None and mjdreff is not None:
+            mjdref = mjdrefi + mjdreff
+        else:
+            mjdref = number('MJDREF') or MJDREF
+        epoch = gain_epoch(mjdref + tstart / 86400.)
+
+    naxis2 = number('NAXIS2')
+    date_obs = key_val('DATE-OBS')
+    target = key_val('OBJECT')
+
+    return (path, mtime, size, kind, obsID, datamode, time_res, tstart,
+            number('TSTOP'), None if date_obs is None else str(date_obs),
+            number('TIMEPIXR'), None if naxis2 is None else int(naxis2), epoch,
+            None if target is None else str(target))
+
+
+################################################################################
+def find_files(roots):
+    """
+    Finds the files to index under some directories.
+
+    Parameters
+    ----------
+    roots : list of str
+        The directories.
+
+    Returns
+    -------
+    dict
+        Absolute path -> (mtime, size, kind), for each file to index.
+
+    """
+    found = dict()
+    for root in roots:
+        for (dir_path, dir_names, file_names) in os.walk(root):
+            for file_name in file_names:
+                kind = file_kind(file_name)
+                if kind is None:
+                    continue
+                path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found[path] = (stat.st_mtime, stat.st_size, kind)
+
+    return found
+
+
+################################################################################
+def store(db, rows):
+    """
+    Writes rows of COLUMNS values to the header index, replacing any old rows
+    of the same files.
+    """
+    db.executemany("INSERT OR REPLACE INTO headers (%s) VALUES (%s)" % \
+            (", ".join(COLUMN_NAMES), ", ".join(["?"] * len(COLUMNS))), rows)
+    db.commit()
+
+
+################################################################################
+def refresh(db, roots=(DATA_DIR, REDUCED_DIR), n_threads=8):
+    """
+    Brings the header index up to date with the files under some directories:
+    reads the headers of files that are new or whose modification time or size
+    changed, and drops files that are gone. Files whose header can't be read
+    are dropped too, and read again the next time.
+
+    Parameters
+    ----------
+    db : sqlite3.Connection
+        The header index, from open_index.
+
+    roots : list of str
+        Directories to index.
+
+    n_threads : int, default=8
+        Number of threads reading headers.
+
+    Returns
+    -------
+    int, int, int
+        Number of files (re-)read, unchanged, and dropped.
+
+    """
+    ## Directories that aren't there (e.g. an unmounted disk) are left alone
+    roots = [os.path.abspath(os.path.expanduser(root)) for root in roots]
+    roots = [root for root in roots if os.path.isdir(root)]
+    found = find_files(roots)
+
+    known = dict()
+    for root in roots:
+        for row in db.execute("SELECT path, mtime, size FROM headers WHERE "\
+                "path LIKE ? ESCAPE '\\'", (like_prefix(root),)):
+            known[row['path']] = (row['mtime'], row['size'])
+
+    jobs = [(path, mtime, size, kind) for (path, (mtime, size, kind)) in \
+            sorted(found.items()) if known.get(path) != (mtime, size)]
+    gone = [path for path in known if path not in found]
+
+    if len(gone) > 0:
+        db.executemany("DELETE FROM headers WHERE path = ?", [(path,) for path \
+                in gone])
+        db.commit()
+
+    if len(jobs) > 0:
+        pool = ThreadPool(processes=max(1, n_threads))
+        try:
+            for start in range(0, len(jobs), BATCH_SIZE):
+                batch = jobs[start:start + BATCH_SIZE]
+                rows = pool.map(read_keys, batch, chunksize=1)
+                ## Any old row of a file that can't be read is out of date
+                db.executemany("DELETE FROM headers WHERE path = ?",
+                        [(job[0],) for (job, row) in zip(batch, rows) if \
+                        row is None])
+                store(db, [row for row in rows if row is not None])
+        finally:
+            pool.close()
+            pool.join()
+
+    return len(jobs), len(found) - len(jobs), len(gone)
+
+
+################################################################################
+def like_prefix(directory):
+    """
+    Makes a LIKE pattern for all paths under a directory, escaping the '%' and
+    '_' in its name.
+    """
+    escaped = directory.rstrip(os.sep).replace("\\", "\\\\").replace("%",
+            "\\%").replace("_", "\\_")
+
+    return escaped + os.sep + "%"
+
+
+################################################################################
+def query(db, datamode=None, obsIDs=None, epoch=None, kind=None):
+    """
+    Selects files from the header index. Criteria that are None aren't used.
+
+    Parameters
+    ----------
+    db : sqlite3.Connection
+        The header index, from open_index.
+
+    datamode : str, optional
+        The data mode, e.g. 'E_125us_64M_0_1s'.
+
+    obsIDs : list of str, optional
+        The obsIDs.
+
+    epoch : int, optional
+        The PCA gain epoch, 1 to 5.
+
+    kind : str, optional
+        'science', 'filter' or 'reduced'.
+
+    Returns
+    -------
+    list of sqlite3.Row
+        The selected files' rows, ordered by obsID, TSTART and path.
+
+    """
+    where = []
+    params = []
+    if datamode is not None:
+        where.append("datamode = ?")
+        params.append(datamode)
+    if obsIDs is not None:
+        if len(obsIDs) == 0:
+            return []
+        where.append("obsid IN (%s)" % ", ".join(["?"] * len(obsIDs)))
+        params += list(obsIDs)
+    if epoch is not None:
+        where.append("gain_epoch = ?")
+        params.append(int(epoch))
+    if kind is not None:
+        where.append("kind = ?")
+        params.append(kind)
+
+    sql = "SELECT * FROM headers"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY obsid, tstart, path"
+
+    return db.execute(sql, params).fetchall()
+
+
+################################################################################
+def header_value(db, path, column):
+    """
+    Gets one indexed value of a file, re-reading its header first if the file
+    changed since it was indexed (or wasn't yet).
+
+    Parameters
+    ----------
+    db : sqlite3.Connection
+        The header index, from open_index.
+
+    path : str
+        The file.
+
+    column : str
+        One of COLUMN_NAMES, e.g. 'timepixr'.
+
+    Returns
+    -------
+    The value, or None if the file doesn't have that keyword.
+
+    Raises
+    ------
+    ValueError if column isn't an indexed column.
+
+    IOError if the file doesn't exist or its header can't be read.
+
+    """
+    if column not in COLUMN_NAMES:
+        raise ValueError("ERROR: Not an indexed column: %s. Must be one of: "\
+                "%s" % (column, ", ".join(COLUMN_NAMES)))
+    path = os.path.abspath(os.path.expanduser(path))
+    if not os.path.isfile(path):
+        raise IOError("ERROR: File does not exist: %s" % path)
+
+    stat = os.stat(path)
+    row = db.execute("SELECT * FROM headers WHERE path = ?", (path,)).fetchone()
+    if row is None or (row['mtime'], row['size']) != (stat.st_mtime,
+            stat.st_size):
+        kind = file_kind(os.path.basename(path)) or "reduced"
+        keys = read_keys((path, stat.st_mtime, stat.st_size, kind))
+        if keys is None:
+            raise IOError("ERROR: Couldn't read header of %s" % path)
+        store(db, [keys])
+        row = db.execute("SELECT * FROM headers WHERE path = ?",
+                (path,)).fetchone()
+
+    return row[column]
+
+
+################################################################################
+if __name__ == "__main__":
+
+    ##############################################
+    ## Parsing input arguments and calling things
+    ##############################################
+
+    parser = argparse.ArgumentParser(usage="python header_index.py "\
+            "{refresh,query,value} ...", description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--index', default=INDEX_FILE, dest='index_file',
+            help="Header index database. [%s]" % INDEX_FILE)
+    subparsers = parser.add_subparsers(dest='command')
+
+    refresh_parser = subparsers.add_parser('refresh', help="Index new and "\
+            "changed files.")
+    refresh_parser.add_argument('roots', nargs='*', default=[DATA_DIR,
+            REDUCED_DIR], help="Directories to index. [%s %s]" % (DATA_DIR,
+            REDUCED_DIR))
+    refresh_parser.add_argument('--threads', type=int, default=8,
+            dest='n_threads', help="Number of threads reading headers. [8]")
+
+    query_parser = subparsers.add_parser('query', help="Print the files "\
+            "that match, one per line.")
+    query_parser.add_argument('--datamode', default=None, help="Data mode. "\
+            "[any]")
+    query_parser.add_argument('--obsID', action='append', default=None,
+            dest='obsIDs', help="ObsID. Give once per obsID. [any]")
+    query_parser.add_argument('--obsID_list', default=None, help="List of "\
+            "obsIDs, one per line. [any]")
+    query_parser.add_argument('--epoch', type=int, default=None,
+            choices=[1, 2, 3, 4, 5], help="PCA gain epoch. [any]")
+    query_parser.add_argument('--kind', default=None, choices=['science',
+            'filter', 'reduced'], help="Kind of file. [any]")
+    query_parser.add_argument('--long', action='store_true', default=False,
+            help="Also print the indexed keywords, like xtescan's "\
+            "_allinfo.lst.")
+
+    value_parser = subparsers.add_parser('value', help="Print one indexed "\
+            "value of a file.")
+    value_parser.add_argument('path', help="The file.")
+    value_parser.add_argument('column', choices=COLUMN_NAMES, help="The "\
+            "indexed value.")
+
+    args = parser.parse_args()
+
+    db = open_index(args.index_file)
+    try:
+        if args.command == 'refresh':
+            (n_read, n_same, n_gone) = refresh(db, args.roots,
+                    n_threads=args.n_threads)
+            print "Header index %s: %d files read, %d unchanged, %d dropped." \
+                    % (args.index_file, n_read, n_same, n_gone)
+
+        elif args.command == 'query':
+            obsIDs = args.obsIDs
+            if args.obsID_list is not None:
+                obsIDs = (obsIDs or []) + [line.strip() for line in \
+                        open(args.obsID_list) if line.strip()]
+            for row in query(db, datamode=args.datamode, obsIDs=obsIDs,
+                    epoch=args.epoch, kind=args.kind):
+                if args.long:
+                    print "%s %s %s %s %s" % (row['path'], row['datamode'],
+                            row['date_obs'], row['time_res'],
+                            row['gain_epoch'])
+                else:
+                    print row['path']
+
+        else:
+            try:
+                print header_value(db, args.path, args.column)
+            except (ValueError, IOError) as err:
+                print "\t%s" % err
+                exit()
+    finally:
+        db.close()
+
+################################################################################
@@ -0,0 +1,552 @@
+#!/usr/bin/env python
+
+"""
+Makes a GTI (good times interval) file from an RXTE filter file and a filter
+expression, like HEASoft's maketime. The expression uses the same syntax as the
+'filtex' given to maketime, e.g.
+    (PCU2_ON==1)&&(NUM_PCU_ON>=2)&&(elv>10)&&(offset<0.02)&&(TIME_SINCE_SAA>30)
+and is evaluated as numpy boolean arrays over the filter file columns. The
+filter file is only read once, so many expressions can be tried in-process with
+gtis_for_exprs.
+
+Like maketime with compact=no, each row of the filter file covers the time from
+prefr of the way back to the previous row to postfr of the way on to the next
+row, and runs of good rows are merged into one GTI. prefr and postfr are set
+from TIMEPIXR, like in gti_and_bkgd.sh. Rows with a null value in any column the
+expression uses are bad.
+
+"""
+
+import argparse
+import numpy as np
+from astropy.io import fits
+import re
+
+__author__ = "Abigail Stevens <A.L.Stevens at uva.nl>"
+__version__ = "0.1 2026-10-18"
+__year__ = "2014-2016"
+
+## Tokens of a filter expression. The Fortran-style operators go first, so that
+## '.5' and '.lt.' don't get mixed up.
+TOKEN_RE = re.compile(r"""\s*(?:
+        (?P<fortran>\.(?:and|or|not|eq|ne|lt|le|gt|ge)\.) |
+        (?P<number>(?:\d+(?:\.(?![A-Za-z]{2})\d*)?|\.\d+)(?:[eEdD][-+]?\d+)?) |
+        (?P<name>[A-Za-z_][A-Za-z0-9_]*) |
+        (?P<op>&&|\|\||==|!=|<=|>=|\*\*|[-+*/^<>!=(),])
+        )""", re.VERBOSE | re.IGNORECASE)
+
+FORTRAN_OPS = {'.and.': '&&', '.or.': '||', '.not.': '!', '.eq.': '==',
+        '.ne.': '!=', '.lt.': '<', '.le.': '<=', '.gt.': '>', '.ge.': '>='}
+
+COMPARISONS = {'==': np.equal, '=': np.equal, '!=': np.not_equal,
+        '<': np.less, '<=': np.less_equal, '>': np.greater,
+        '>=': np.greater_equal}
+
+FUNCTIONS = {'ABS': np.abs, 'SQRT': np.sqrt, 'EXP': np.exp, 'LOG': np.log,
+        'LOG10': np.log10, 'SIN': np.sin, 'COS': np.cos, 'TAN': np.tan,
+        'ARCSIN': np.arcsin, 'ARCCOS': np.arccos, 'ARCTAN': np.arctan,
+        'MIN': np.minimum, 'MAX': np.maximum}
+
+## Header keywords copied from the filter file to the GTI file
+GTI_KEYWORDS = ['TELESCOP', 'INSTRUME', 'OBS_ID', 'OBJECT', 'RA_OBJ',
+        'DEC_OBJ', 'EQUINOX', 'RADECSYS', 'DATE-OBS', 'TIME-OBS', 'DATE-END',
+        'TIME-END', 'TSTART', 'TSTOP', 'MJDREFI', 'MJDREFF', 'TIMEREF',
+        'TIMESYS', 'TIMEUNIT', 'TASSIGN', 'TIMEZERO', 'CLOCKAPP']
+
+
+################################################################################
+def tokenize(expr):
+    """
+    Splits a filter expression into tokens.
+
+    Parameters
+    ----------
+    expr : str
+        The filter expression.
+
+    Returns
+    -------
+    list of tuples
+        (kind, value), with kind 'number', 'name' or 'op'. Fortran-style
+        operators are given as their C-style equivalent.
+
+    Raises
+    ------
+    ValueError if the expression has characters that aren't in the syntax.
+
+    """
+    tokens = []
+    pos = 0
+    expr = expr.strip()
+    while pos < len(expr):
+        match = TOKEN_RE.match(expr, pos)
+        if match is None or match.end() == pos:
+            raise ValueError("ERROR: Can't parse filter expression at '%s'." % \
+                    expr[pos:])
+        pos = match.end()
+        if match.group('fortran'):
+            tokens.append(('op', FORTRAN_OPS[match.group('fortran').lower()]))
+        elif match.group('number'):
+            number = re.sub('[dD]', 'e', match.group('number'))
+            tokens.append(('number', float(number)))
+        elif match.group('name'):
+            tokens.append(('name', match.group('name').upper()))
+        elif match.group('op'):
+            tokens.append(('op', match.group('op')))
+
+    return tokens
+
+
+################################################################################
+class Parser(object):
+    """
+    Recursive-descent evaluator of a tokenized filter expression. Precedence,
+    lowest first: ||, &&, !, comparisons, + -, * /, unary -, ** ^.
+
+    Parameters
+    ----------
+    tokens : list of tuples
+        From tokenize.
+
+    column : function
+        Gets a column (np.array) by its upper-case name.
+
+    """
+    def __init__(self, tokens, column):
+        self.tokens = tokens
+        self.pos = 0
+        self.column = column
+        self.names = set()
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def take(self, value=None):
+        token = self.peek()
+        if token[0] is None or (value is not None and token[1] != value):
+            raise ValueError("ERROR: Expected '%s' in filter expression." % \
+                    (value if value is not None else "more"))
+        self.pos += 1
+        return token
+
+    def parse(self):
+        value = self.logical_or()
+        if self.pos != len(self.tokens):
+            raise ValueError("ERROR: Unexpected '%s' in filter expression." % \
+                    str(self.peek()[1]))
+        return value
+
+    def logical_or(self):
+        value = self.logical_and()
+        while self.peek() == ('op', '||'):
+            self.take()
+            value = np.logical_or(value, self.logical_and())
+        return value
+
+    def logical_and(self):
+        value = self.logical_not()
+        while self.peek() == ('op', '&&'):
+            self.take()
+            value = np.logical_and(value, self.logical_not())
+        return value
+
+    def logical_not(self):
+        if self.peek() == ('op', '!'):
+            self.take()
+            return np.logical_not(self.logical_not())
+        return self.comparison()
+
+    def comparison(self):
+        value = self.additive()
+        while self.peek()[0] == 'op' and self.peek()[1] in COMPARISONS:
+            op = self.take()[1]
+            value = COMPARISONS[op](value, self.additive())
+        return value
+
+    def additive(self):
+        value = self.multiplicative()
+        while self.peek() in (('op', '+'), ('op', '-')):
+            op = self.take()[1]
+            if op == '+':
+                value = value + self.multiplicative()
+            else:
+                value = value - self.multiplicative()
+        return value
+
+    def multiplicative(self):
+        value = self.unary()
+        while self.peek() in (('op', '*'), ('op', '/')):
+            op = self.take()[1]
+            if op == '*':
+                value = value * self.unary()
+            else:
+                value = np.true_divide(value, self.unary())
+        return value
+
+    def unary(self):
+        if self.peek() == ('op', '-'):
+            self.take()
+            return -self.unary()
+        if self.peek() == ('op', '+'):
+            self.take()
+            return self.unary()
+        return self.power()
+
+    def power(self):
+        value = self.primary()
+        if self.peek() in (('op', '**'), ('op', '^')):
+            self.take()
+            value = np.power(value, self.unary())
+        return value
+
+    def primary(self):
+        (kind, value) = self.take()
+        if kind == 'number':
+            return value
+        if kind == 'op' and value == '(':
+            inner = self.logical_or()
+            self.take(')')
+            return inner
+        if kind == 'name':
+            if self.peek() == ('op', '('):
+                if value not in FUNCTIONS:
+                    raise ValueError("ERROR: Unknown function in filter "\
+                            "expression: %s" % value)
+                self.take('(')
+                args = [self.logical_or()]
+                while self.peek() == ('op', ','):
+                    self.take()
+                    args.append(self.logical_or())
+                self.take(')')
+                return FUNCTIONS[value](*args)
+            if value in ('T', 'TRUE'):
+                return True
+            if value in ('F', 'FALSE'):
+                return False
+            self.names.add(value)
+            return self.column(value)
+        raise ValueError("ERROR: Unexpected '%s' in filter expression." % \
+                str(value))
+
+
+################################################################################
+def read_filter_columns(filter_file):
+    """
+    Reads all the columns of a filter file, with their null-value masks, and
+    its TIMEPIXR.
+
+    Parameters
+    ----------
+    filter_file : str
+        The filter file (.xfl).
+
+    Returns
+    -------
+    dict of np.arrays
+        Upper-case column name -> column values.
+
+    dict of np.arrays of bools
+        Upper-case column name -> True where the value is null (TNULL or NaN).
+
+    fits.Header
+        The header of the filter table extension.
+
+    float
+        TIMEPIXR, from the primary header or the filter table header. 0 if it's
+        in neither.
+
+    """
+    with fits.open(filter_file) as file_hdu:
+        header = file_hdu[1].header
+        data = file_hdu[1].data
+        columns = {}
+        nulls = {}
+        for col in file_hdu[1].columns:
+            name = col.name.upper()
+            values = np.array(data.field(col.name))
+            null = np.zeros(len(values), dtype=bool)
+            if values.dtype.kind == 'f':
+                null = np.isnan(values)
+            elif col.null is not None:
+                null = values == col.null
+            if values.ndim > 1:
+                null = np.any(null.reshape(len(values), -1), axis=1)
+            columns[name] = values
+            nulls[name] = null
+        timepixr = file_hdu[0].header.get('TIMEPIXR', header.get('TIMEPIXR',
+                0.0))
+        header = header.copy()
+
+    return columns, nulls, header, float(timepixr)
+
+
+################################################################################
+def evaluate_filtex(filtex, columns, nulls=None):
+    """
+    Evaluates a filter expression over filter file columns.
+
+    Parameters
+    ----------
+    filtex : str
+        The filter expression, in the syntax maketime takes.
+
+    columns : dict of np.arrays
+        Upper-case column name -> column values, from read_filter_columns.
+
+    nulls : dict of np.arrays of bools, optional
+        Upper-case column name -> null mask, from read_filter_columns. Rows with
+        a null value in any column used are bad.
+
+    Returns
+    -------
+    np.array of bools
+        True for the good rows.
+
+    Raises
+    ------
+    ValueError if the expression can't be parsed or uses a column that isn't
+    there.
+
+    """
+    def column(name):
+        if name not in columns:
+            raise ValueError("ERROR: Column in filter expression not in the "\
+                    "filter file: %s" % name)
+        return columns[name]
+
+    n_rows = len(columns.values()[0]) if columns else 0
+    parser = Parser(tokenize(filtex), column)
+    good = np.asarray(parser.parse(), dtype=bool)
+    good = np.logical_and(good, np.ones(n_rows, dtype=bool))
+
+    if nulls is not None:
+        for name in parser.names:
+            good &= ~nulls[name]
+
+    return good
+
+
+################################################################################
+def pre_post_fractions(timepixr):
+    """
+    Gets maketime's prefr and postfr for a TIMEPIXR, like gti_and_bkgd.sh does.
+
+    Parameters
+    ----------
+    timepixr : float
+        TIMEPIXR of the filter file.
+
+    Returns
+    -------
+    float, float
+        prefr and postfr.
+
+    """
+    if timepixr == 0:
+        return 0.0, 1.0
+    elif timepixr == 1:
+        return 1.0, 0.0
+    else:
+        print "Warning: TIMEPIXR is neither 0 nor 1. Setting prefr=postfr=0.5."
+        return 0.5, 0.5
+
+
+################################################################################
+def make_gti(time, good, prefr=0.0, postfr=1.0):
+    """
+    Makes GTIs from the good rows of a filter file. Each run of good rows is one
+    GTI, from prefr of the way back to the row before the run until postfr of
+    the way on to the row after it. The first and last rows use the row spacing
+    on their other side.
+
+    Parameters
+    ----------
+    time : np.array of floats
+        The TIME column of the filter file.
+
+    good : np.array of bools
+        True for the good rows, from evaluate_filtex.
+
+    prefr, postfr : floats, default=0.0, 1.0
+        maketime's pre- and post-time interval factors.
+
+    Returns
+    -------
+    np.array of floats
+        2-D array of the GTIs, with the start times in column 0 and the stop
+        times in column 1.
+
+    """
+    time = np.asarray(time, dtype=np.float64)
+    good = np.asarray(good, dtype=bool)
+    if len(time) == 0 or not np.any(good):
+        return np.zeros((0, 2))
+
+    if len(time) > 1:
+        spacing = np.diff(time)
+        before = np.append(spacing[0], spacing)
+        after = np.append(spacing, spacing[-1])
+    else:
+        before = after = np.zeros(1)
+
+    ## Edges of the runs of good rows
+    edges = np.diff(np.concatenate(([0], good.astype(np.int8), [0])))
+    first = np.where(edges == 1)[0]
+    last = np.where(edges == -1)[0] - 1
+
+    return np.column_stack((time[first] - prefr * before[first],
+            time[last] + postfr * after[last]))
+
+
+################################################################################
+def write_gti(gti, gti_file, header=None):
+    """
+    Writes GTIs to a FITS GTI file, like maketime's: an empty primary extension
+    and a STDGTI table extension with START and STOP columns.
+
+    Parameters
+    ----------
+    gti : np.array of floats
+        2-D array of the GTIs, from make_gti.
+
+    gti_file : str
+        The output GTI file name.
+
+    header : fits.Header, optional
+        The filter table header, to copy the time keywords from.
+
+    Returns
+    -------
+    nothing
+
+    """
+    gti = np.reshape(gti, (-1, 2))
+    cols = [fits.Column(name='START', format='1D', unit='s', array=gti[:, 0]),
+            fits.Column(name='STOP', format='1D', unit='s', array=gti[:, 1])]
+    gti_hdu = fits.BinTableHDU.from_columns(cols)
+    gti_hdu.header['EXTNAME'] = 'STDGTI'
+    gti_hdu.header['HDUCLASS'] = 'OGIP'
+    gti_hdu.header['HDUCLAS1'] = 'GTI'
+    gti_hdu.header['HDUCLAS2'] = 'STANDARD'
+    primary = fits.PrimaryHDU()
+
+    if header is not None:
+        for key in GTI_KEYWORDS:
+            if key in header:
+                gti_hdu.header[key] = header[key]
+                primary.header[key] = header[key]
+    gti_hdu.header['CREATOR'] = "make_gti.py %s" % __version__
+
+    fits.HDUList([primary, gti_hdu]).writeto(gti_file, overwrite=True)
+
+
+################################################################################
+def gtis_for_exprs(filter_file, filtexes, prefr=None, postfr=None):
+    """
+    Makes the GTIs of a filter file for each of many filter expressions,
+    reading the filter file only once.
+
+    Parameters
+    ----------
+    filter_file : str
+        The filter file (.xfl).
+
+    filtexes : list of str
+        The filter expressions.
+
+    prefr, postfr : floats, optional
+        maketime's pre- and post-time interval factors. Default is from the
+        TIMEPIXR of the filter file.
+
+    Returns
+    -------
+    list of np.arrays of floats
+        The GTIs (as from make_gti) for each filter expression.
+
+    """
+    (columns, nulls, header, timepixr) = read_filter_columns(filter_file)
+    if prefr is None or postfr is None:
+        (prefr, postfr) = pre_post_fractions(timepixr)
+
+    return [make_gti(columns['TIME'], evaluate_filtex(filtex, columns, nulls),
+            prefr, postfr) for filtex in filtexes]
+
+
+################################################################################
+def main(filter_file, gti_file, filtex, prefr=None, postfr=None):
+    """
+    Makes a GTI file from a filter file and a filter expression.
+
+    Parameters
+    ----------
+    filter_file : str
+        The filter file (.xfl).
+
+    gti_file : str
+        The output GTI file name.
+
+    filtex : str
+        The filter expression, in the syntax maketime takes.
+
+    prefr, postfr : floats, optional
+        maketime's pre- and post-time interval factors. Default is from the
+        TIMEPIXR of the filter file.
+
+    Returns
+    -------
+    np.array of floats
+        2-D array of the GTIs.
+
+    """
+    try:
+        (columns, nulls, header, timepixr) = read_filter_columns(filter_file)
+    except IOError:
+        print "\tERROR: File does not exist: %s" % filter_file
+        exit()
+
+    if prefr is None or postfr is None:
+        print "TIMEPIXR = %g" % timepixr
+        (prefr, postfr) = pre_post_fractions(timepixr)
+
+    good = evaluate_filtex(filtex, columns, nulls)
+    gti = make_gti(columns['TIME'], good, prefr, postfr)
+    write_gti(gti, gti_file, header)
+    print "%d GTIs, %.1f s good time." % (len(gti), np.sum(gti[:, 1] - \
+            gti[:, 0]))
+
+    return gti
+
+
+################################################################################
+if __name__ == "__main__":
+
+    ##############################################
+    ## Parsing input arguments and calling 'main'
+    ##############################################
+
+    parser = argparse.ArgumentParser(usage="python make_gti.py filter_file "\
+            "gti_file filtex [--prefr PREFR --postfr POSTFR]",
+            description=__doc__, epilog="For optional arguments, default "\
+            "values are given in brackets at end of description.")
+
+    parser.add_argument('filter_file', help="The filter file (.xfl).")
+
+    parser.add_argument('gti_file', help="Output GTI file (.gti).")
+
+    parser.add_argument('filtex', help="Filter expression, in the syntax "\
+            "maketime takes.")
+
+    parser.add_argument('--prefr', type=float, default=None, help="Pre-time "\
+            "interval factor. [from TIMEPIXR]")
+
+    parser.add_argument('--postfr', type=float, default=None, help="Post-time"\
+            " interval factor. [from TIMEPIXR]")
+
+    args = parser.parse_args()
+
+    main(args.filter_file, args.gti_file, args.filtex, prefr=args.prefr,
+            postfr=args.postfr)
+
+################################################################################
@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+
+"""
+Extracts energy band event lists (e.g. the reference band, or the channels of
+interest) from GTI'd event lists, for cross-correlation. A band is a set of
+PCUs and a range of energy channels, given as 'name:pcus:low-high', e.g.
+'ref:0:0-63' for all of PCU 0 (the default) or 'ci:1,2,3,4:2-26'. Each GTI'd
+event list is read once for all the bands, and the event lists are done in a
+process pool. CHANNEL and PCUID are written as unsigned bytes, not floats.
+
+"""
+
+import argparse
+import numpy as np
+from astropy.io import fits
+import os
+import multiprocessing
+from datetime import datetime
+
+from evt_to_lc import read_events
+
+__author__ = "Abigail Stevens <A.L.Stevens at uva.nl>"
+__version__ = "0.1 2026-10-18"
+__year__ = "2015-2016"
+
+DEFAULT_BAND = "ref:0:0-63"
+
+
+################################################################################
+def parse_band(band_str):
+    """
+    Parses a band given as 'name:pcus:low-high', like 'ci:1,2,3,4:2-26'.
+
+    Parameters
+    ----------
+    band_str : str
+        The band. The PCUs are comma-separated, or 'all'. The channel range is
+        inclusive.
+
+    Returns
+    -------
+    tuple
+        (name, list of PCUs or None for all, lowest channel, highest channel).
+
+    Raises
+    ------
+    ValueError if the band isn't in that format.
+
+    """
+    try:
+        (name, pcus, chans) = band_str.split(":")
+        if pcus.lower() == "all":
+            pcus = None
+        else:
+            pcus = [int(pcu) for pcu in pcus.split(",")]
+        (low, high) = [int(chan) for chan in chans.split("-")]
+    except ValueError:
+        raise ValueError("ERROR: Band must be 'name:pcus:low-high', e.g. "\
+                "'ref:0:0-63': %s" % band_str)
+
+    return name, pcus, low, high
+
+
+################################################################################
+def band_mask(chan, pcu, band):
+    """
+    Selects the events in a band.
+
+    Parameters
+    ----------
+    chan : np.array of ints
+        CHANNEL of the events.
+
+    pcu : np.array of ints
+        PCUID of the events.
+
+    band : tuple
+        (name, PCUs or None, lowest channel, highest channel), from parse_band.
+
+    Returns
+    -------
+    np.array of bools
+        True for the events in the band.
+
+    """
+    (name, pcus, low, high) = band
+    mask = (chan >= low) & (chan <= high)
+    if pcus is not None:
+        mask &= np.in1d(pcu, pcus)
+
+    return mask
+
+
+################################################################################
+def band_file(event_list, band, out_dir=None):
+    """
+    Gets the output file name of a band of an event list: <event list
+    name>_<band name>.fits next to the event list, or, with out_dir,
+    out_dir/<obsID>_<event list name>_<band name>.fits, where the obsID is the
+    name of the event list's directory (every obsID's GTI'd event lists are
+    called GTId_eventlist_N).
+    """
+    root = os.path.splitext(os.path.basename(event_list))[0]
+    if out_dir is None:
+        return os.path.join(os.path.dirname(event_list), "%s_%s.fits" % \
+                (root, band[0]))
+
+    obsID = os.path.basename(os.path.dirname(os.path.abspath(event_list)))
+
+    return os.path.join(out_dir, "%s_%s_%s.fits" % (obsID, root, band[0]))
+
+
+################################################################################
+def write_band(out_file, header, time, chan, pcu, band, event_list):
+    """
+    Writes the events of a band to a FITS table.
+
+    Parameters
+    ----------
+    out_file : str
+        The output file.
+
+    header : astropy.io.fits header object
+        The header of the GTI'd event list.
+
+    time, chan, pcu : np.arrays
+        TIME, CHANNEL and PCUID of the events in the band.
+
+    band : tuple
+        (name, PCUs or None, lowest channel, highest channel), from parse_band.
+
+    event_list : str
+        The GTI'd event list the band is from.
+
+    Returns
+    -------
+    nothing
+
+    """
+    (name, pcus, low, high) = band
+    cols = [fits.Column(name='TIME', format='D', array=time),
+            fits.Column(name='CHANNEL', unit='(0-DETCHANS)', format='B',
+                    array=chan.astype(np.uint8)),
+            fits.Column(name='PCUID', unit='(0-4)', format='B',
+                    array=pcu.astype(np.uint8))]
+    tbhdu = fits.BinTableHDU.from_columns(cols)
+
+    ## Keeping the keywords of the GTI'd event list that aren't about columns
+    ## (or about the encoding of a compact event list)
+    for card in header.cards:
+        if card.keyword not in tbhdu.header and card.keyword not in \
+                ('COMMENT', 'HISTORY', '', 'CMPTIME', 'CMPCHAN', 'CMPPCU') \
+                and not card.keyword.startswith(
+                ('TTYPE', 'TFORM', 'TUNIT', 'TNULL', 'TSCAL', 'TZERO',
+                'TDISP', 'TDIM', 'TLMIN', 'TLMAX')):
+            tbhdu.header[card.keyword] = (card.value, card.comment)
+
+    prihdr = fits.Header()
+    prihdr.set('DATE', str(datetime.now()), "YYYY-MM-DD localtime")
+    prihdr.set('BAND', name, "Name of the energy band")
+    prihdr.set('BAND_PCU', "all" if pcus is None else ",".join([str(p) for p \
+            in pcus]), "PCUs in the band")
+    prihdr.set('BAND_CHN', "%d-%d" % (low, high), "Channels in the band")
+    prihdr.set('GTID_EVT', event_list, "GTI'd event list")
+    for key in ('BAND', 'BAND_PCU', 'BAND_CHN', 'GTID_EVT'):
+        tbhdu.header[key] = (prihdr[key], prihdr.comments[key])
+
+    fits.HDUList([fits.PrimaryHDU(header=prihdr), tbhdu]).writeto(out_file,
+            overwrite=True)
+
+
+################################################################################
+def extract_bands(event_list, bands, out_dir=None):
+    """
+    Reads a GTI'd event list once, and writes the events of each band to their
+    own file.
+
+    Parameters
+    ----------
+    event_list : str
+        The GTI'd event list, in FITS or compact (.evtc) format.
+
+    bands : list of tuples
+        (name, PCUs or None, lowest channel, highest channel), from parse_band.
+
+    out_dir : str, optional
+        Directory for the band event lists. Default is the directory of the
+        GTI'd event list.
+
+    Returns
+    -------
+    list of (str, int)
+        The band event list and its number of events, for each band.
+
+    """
+    (header, time, chan, pcu) = read_events(event_list)
+    time = np.asarray(time, dtype=np.float64)
+    chan = np.asarray(chan)
+    pcu = np.asarray(pcu)
+
+    written = []
+    for band in bands:
+        mask = band_mask(chan, pcu, band)
+        out_file = band_file(event_list, band, out_dir)
+        write_band(out_file, header, time[mask], chan[mask], pcu[mask], band,
+                event_list)
+        written.append((out_file, int(np.sum(mask))))
+
+    return written
+
+
+################################################################################
+def batch_worker(job):
+    """
+    Runs extract_bands on one GTI'd event list, for use in a process pool.
+
+    Parameters
+    ----------
+    job : tuple
+        (event list, bands, out_dir).
+
+    Returns
+    -------
+    list of (str, int)
+        As from extract_bands, or an empty list if it failed.
+
+    """
+    (event_list, bands, out_dir) = job
+    try:
+        return extract_bands(event_list, bands, out_dir)
+    except (IOError, ValueError, KeyError) as err:
+        print "\tERROR: Couldn't extract bands from %s: %s" % (event_list,
+                ' '.join(str(err).split()))
+        return []
+
+
+################################################################################
+def main(event_lists, bands, out_dir=None, processes=None):
+    """
+    Extracts the bands of each GTI'd event list, with the event lists done in a
+    process pool.
+
+    Parameters
+    ----------
+    event_lists : list of str
+        The GTI'd event lists.
+
+    bands : list of tuples
+        (name, PCUs or None, lowest channel, highest channel), from parse_band.
+
+    out_dir : str, optional
+        Directory for the band event lists, which also gets a list
+        <band name>_eventlists.lst of them per band. Default is the directory
+        of each GTI'd event list, with no lists written.
+
+    processes : int, optional
+        Number of worker processes. Default is the number of CPUs.
+
+    Returns
+    -------
+    list of lists of (str, int)
+        As from extract_bands, for each event list.
+
+    Raises
+    ------
+    ValueError if two event lists would write the same band event list.
+
+    """
+    out_files = {}
+    for event_list in event_lists:
+        for band in bands:
+            out_file = os.path.abspath(band_file(event_list, band, out_dir))
+            if out_file in out_files:
+                raise ValueError("ERROR: %s and %s would both write %s." % \
+                        (out_files[out_file], event_list, out_file))
+            out_files[out_file] = event_list
+
+    jobs = [(event_list, bands, out_dir) for event_list in event_lists]
+
+    if processes == 1 or len(jobs) <= 1:
+        results = [batch_worker(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(processes=processes)
+        try:
+            results = pool.map(batch_worker, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    for (event_list, written) in zip(event_lists, results):
+        for (out_file, n_events) in written:
+            print "%s: %d events" % (out_file, n_events)
+
+    if out_dir is not None:
+        for (i, band) in enumerate(bands):
+            with open(os.path.join(out_dir, "%s_eventlists.lst" % band[0]),
+                    'w') as out:
+                for written in results:
+                    if len(written) == len(bands):
+                        out.write(written[i][0] + "\n")
+
+    return results
+
+
+################################################################################
+if __name__ == "__main__":
+
+    ##############################################
+    ## Parsing input arguments and calling 'main'
+    ##############################################
+
+    parser = argparse.ArgumentParser(usage="python make_ref_band.py in_list "\
+            "[--band name:pcus:low-high ... --out_dir OUT_DIR --procs N]",
+            description=__doc__, epilog="For optional arguments, default "\
+            "values are given in brackets at end of description.")
+
+    parser.add_argument('in_list', help="A GTI'd event list (.fits or .evtc),"\
+            " or a list of them (.lst or .txt), one per line.")
+
+    parser.add_argument('--band', action='append', default=None,
+            dest='bands', help="Band to extract, as name:pcus:low-high. PCUs "\
+            "are comma-separated or 'all'; channels are inclusive. Give once "\
+            "per band. [%s]" % DEFAULT_BAND)
+
+    parser.add_argument('--out_dir', default=None, help="Directory for the "\
+            "band event lists, named <obsID>_<event list>_<band>.fits. "\
+            "[directory of each GTI'd event list]")
+
+    parser.add_argument('--procs', type=int, default=None, dest='processes',
+            help="Number of worker processes. [number of CPUs]")
+
+    args = parser.parse_args()
+
+    if os.path.splitext(args.in_list)[1].lower() in (".lst", ".txt"):
+        event_lists = [line.strip() for line in open(args.in_list) if
+                line.strip()]
+    else:
+        event_lists = [args.in_list]
+
+    try:
+        bands = [parse_band(band) for band in (args.bands or [DEFAULT_BAND])]
+    except ValueError as err:
+        print "\t%s" % err
+        exit()
+
+    try:
+        main(event_lists, bands, out_dir=args.out_dir,
+                processes=args.processes)
+    except ValueError as err:
+        print "\t%s" % err
+        exit()
+
+################################################################################
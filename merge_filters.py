@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+
+"""
+Merges RXTE filter files into one big filter file, like fmerge with
+copyprime=yes and lastkey='TSTOP'. The filter files are put in time order by
+the TSTART of their filter extension (only the headers are read for this),
+duplicates are dropped, and the table data are copied straight into the merged
+filter file, one file after the other. The time-ordered list without duplicates
+is written back to the filter list.
+
+"""
+
+import argparse
+import numpy as np
+from astropy.io import fits
+import os
+
+__author__ = "Abigail Stevens <A.L.Stevens at uva.nl>"
+__version__ = "0.1 2026-10-18"
+__year__ = "2015-2016"
+
+## FITS files are in blocks of this many bytes
+FITS_BLOCK = 2880
+
+
+################################################################################
+def time_ordered(filter_files):
+    """
+    Puts filter files in time order by the TSTART of their filter extension,
+    dropping duplicates and files that can't be opened.
+
+    Parameters
+    ----------
+    filter_files : list of str
+        The filter files (.xfl).
+
+    Returns
+    -------
+    list of str
+        The filter files, in time order. Files with the same TSTART stay in
+        list order.
+
+    """
+    unique_files = []
+    seen = set()
+    for filter_file in filter_files:
+        if filter_file not in seen:
+            seen.add(filter_file)
+            unique_files.append(filter_file)
+
+    good_files = []
+    tstarts = []
+    for filter_file in unique_files:
+        try:
+            header = fits.getheader(filter_file, 1)
+        except IOError:
+            print "\tERROR: File does not exist: %s" % filter_file
+            continue
+        good_files.append(filter_file)
+        tstarts.append(header['TSTART'])
+
+    order = np.argsort(np.asarray(tstarts, dtype=np.float64), kind='mergesort')
+
+    return [good_files[i] for i in order]
+
+
+################################################################################
+def table_layout(table_hdu):
+    """
+    Gets what has to match between filter tables for them to be merged.
+
+    Parameters
+    ----------
+    table_hdu : fits.BinTableHDU
+        The filter table extension.
+
+    Returns
+    -------
+    tuple
+        (row length in bytes, column names, column formats).
+
+    """
+    return (table_hdu.header['NAXIS1'], tuple(table_hdu.columns.names),
+            tuple(str(fmt) for fmt in table_hdu.columns.formats))
+
+
+################################################################################
+def copy_bytes(in_f, out_f, n_bytes, block=1048576):
+    """
+    Copies n_bytes from the current position of in_f to out_f.
+    """
+    while n_bytes > 0:
+        buf = in_f.read(min(block, n_bytes))
+        if not buf:
+            raise IOError("ERROR: File ended before the end of its data.")
+        out_f.write(buf)
+        n_bytes -= len(buf)
+
+
+################################################################################
+def merge_filters(filter_files, out_file):
+    """
+    Merges filter files, in the order given, into one filter file. The primary
+    extension and the filter extension header come from the first file, with
+    NAXIS2 set to the total number of rows and TSTOP taken from the last file.
+
+    Parameters
+    ----------
+    filter_files : list of str
+        The filter files (.xfl), in time order.
+
+    out_file : str
+        The merged filter file.
+
+    Returns
+    -------
+    int
+        The number of rows in the merged filter table.
+
+    Raises
+    ------
+    ValueError if the filter tables don't all have the same columns, or have
+    variable-length columns.
+
+    """
+    ## Reading the headers and data locations
+    tables = []
+    layout = None
+    for filter_file in filter_files:
+        with fits.open(filter_file) as file_hdu:
+            if file_hdu[1].header.get('PCOUNT', 0) != 0:
+                raise ValueError("ERROR: Can't merge filter files with "\
+                        "variable-length columns: %s" % filter_file)
+            if layout is None:
+                layout = table_layout(file_hdu[1])
+                prim_header = file_hdu[0].header.copy()
+                prim_info = file_hdu[0].fileinfo()
+                table_header = file_hdu[1].header.copy()
+            elif table_layout(file_hdu[1]) != layout:
+                raise ValueError("ERROR: Filter file columns don't match the "\
+                        "first filter file's: %s" % filter_file)
+            tables.append((filter_file, file_hdu[1].fileinfo()['datLoc'],
+                    file_hdu[1].header['NAXIS1'] * \
+                    file_hdu[1].header['NAXIS2']))
+            last_tstop = file_hdu[1].header.get('TSTOP')
+            last_prim_tstop = file_hdu[0].header.get('TSTOP')
+
+    n_rows = sum(n_bytes for (_, _, n_bytes) in tables) // layout[0]
+
+    ## These would be wrong for the merged file
+    for header in (prim_header, table_header):
+        for key in ('CHECKSUM', 'DATASUM'):
+            if key in header:
+                del header[key]
+    table_header['NAXIS2'] = n_rows
+    if last_tstop is not None:
+        table_header['TSTOP'] = last_tstop
+    if last_prim_tstop is not None and 'TSTOP' in prim_header:
+        prim_header['TSTOP'] = last_prim_tstop
+
+    ## Streaming the table data of each file into the merged file
+    tmp_file = out_file + ".tmp"
+    with open(tmp_file, 'wb') as out_f:
+        out_f.write(prim_header.tostring())
+        if prim_info['datSpan'] > 0:
+            with open(filter_files[0], 'rb') as in_f:
+                in_f.seek(prim_info['datLoc'])
+                copy_bytes(in_f, out_f, prim_info['datSpan'])
+
+        out_f.write(table_header.tostring())
+        n_written = 0
+        for (filter_file, data_loc, n_bytes) in tables:
+            with open(filter_file, 'rb') as in_f:
+                in_f.seek(data_loc)
+                copy_bytes(in_f, out_f, n_bytes)
+            n_written += n_bytes
+        if n_written % FITS_BLOCK != 0:
+            out_f.write(b'\0' * (FITS_BLOCK - n_written % FITS_BLOCK))
+    os.rename(tmp_file, out_file)
+
+    return n_rows
+
+
+################################################################################
+def main(filter_list, out_file):
+    """
+    Puts the filter files in filter_list in time order without duplicates,
+    writes that back to filter_list, and merges them into out_file.
+
+    Parameters
+    ----------
+    filter_list : str
+        List of filter files (.xfl), one per line.
+
+    out_file : str
+        The merged filter file.
+
+    Returns
+    -------
+    nothing
+
+    """
+    filter_files = [line.strip() for line in open(filter_list) if line.strip()]
+    filter_files = time_ordered(filter_files)
+
+    if len(filter_files) == 0:
+        print "\tERROR: No filter files to merge. Exiting."
+        exit()
+
+    with open(filter_list, 'w') as out:
+        for filter_file in filter_files:
+            out.write(filter_file + "\n")
+
+    n_rows = merge_filters(filter_files, out_file)
+    print "Merged %d filter files (%d rows) into %s" % (len(filter_files),
+            n_rows, out_file)
+
+
+################################################################################
+if __name__ == "__main__":
+
+    ##############################################
+    ## Parsing input arguments and calling 'main'
+    ##############################################
+
+    parser = argparse.ArgumentParser(usage="python merge_filters.py "\
+            "filter_list out_file", description=__doc__)
+
+    parser.add_argument('filter_list', help="List of filter files (.xfl). "\
+            "Gets re-written in time order, without duplicates.")
+
+    parser.add_argument('out_file', help="Merged filter file (.xfl).")
+
+    args = parser.parse_args()
+
+    main(args.filter_list, args.out_file)
+
+################################################################################
@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+
+"""
+Selects obsIDs from the power colour table by object, hue angle, count rate and
+MJD, and writes them to an obsID list for download_obsIDs.sh and xtescan.sh.
+
+The power colour CSV is converted once into a typed binary index (.npz): the
+rows are grouped by object, and within each object sorted by Angle, with the
+permutation that sorts them by MJD kept too. A query finds the object's rows
+and then the Angle (or MJD) range by binary search, so it only touches the rows
+it selects, however big the table is. The library version of
+PC_extract_obsIDs.ipynb.
+
+    python pc_select.py build power_colours.csv pc_index.npz
+    python pc_select.py query pc_index.npz XTE1550_obsIDs.lst --object \
+XTE1550 --angle 200 300 --rate_min 300
+
+"""
+
+import argparse
+import numpy as np
+import csv
+import os
+
+__author__ = "Abigail Stevens <A.L.Stevens at uva.nl>"
+__version__ = "0.1 2026-10-18"
+__year__ = "2016"
+
+## Columns of the power colour CSV that are kept in the index
+OBJECT_COL = 'Object'
+OBSID_COL = 'obsid'
+NUMBER_COLS = {'angle': 'Angle', 'rate': 'Count Rate', 'mjd': 'MJD'}
+
+
+################################################################################
+def to_float(value):
+    """
+    Converts a CSV value to a float, with NaN for empty or unreadable values.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+################################################################################
+def build_index(csv_file, index_file):
+    """
+    Converts the power colour CSV into a typed binary index.
+
+    Parameters
+    ----------
+    csv_file : str
+        The power colour table (.csv), with at least the columns Object, obsid,
+        Angle, Count Rate and MJD.
+
+    index_file : str
+        The output index (.npz).
+
+    Returns
+    -------
+    int
+        The number of rows in the index.
+
+    Raises
+    ------
+    ValueError if the CSV doesn't have the columns needed.
+
+    """
+    with open(csv_file, 'rb') as in_f:
+        reader = csv.reader(in_f)
+        names = [name.strip() for name in reader.next()]
+        needed = [OBJECT_COL, OBSID_COL] + NUMBER_COLS.values()
+        missing = [name for name in needed if name not in names]
+        if missing:
+            raise ValueError("ERROR: Power colour table is missing columns: "\
+                    "%s" % ", ".join(missing))
+        col = dict((name, names.index(name)) for name in needed)
+
+        objects = []
+        obsIDs = []
+        numbers = dict((key, []) for key in NUMBER_COLS)
+        for row in reader:
+            if len(row) < len(names):
+                continue
+            objects.append(row[col[OBJECT_COL]].strip())
+            obsIDs.append(row[col[OBSID_COL]].strip())
+            for (key, name) in NUMBER_COLS.items():
+                numbers[key].append(to_float(row[col[name]]))
+
+    objects = np.array(objects, dtype=str)
+    obsIDs = np.array(obsIDs, dtype=str)
+    angle = np.array(numbers['angle'], dtype=np.float64)
+    rate = np.array(numbers['rate'], dtype=np.float64)
+    mjd = np.array(numbers['mjd'], dtype=np.float64)
+
+    ## Grouping by object, and sorting by Angle within each object (NaNs last)
+    order = np.lexsort((angle, objects))
+    (object_names, obj_starts) = np.unique(objects[order], return_index=True)
+    obj_stops = np.append(obj_starts[1:], len(order))
+
+    ## Per object, the permutation that sorts its rows by MJD (and the MJDs in
+    ## that order, to search)
+    mjd_order = np.empty(len(order), dtype=np.int64)
+    for (start, stop) in zip(obj_starts, obj_stops):
+        mjd_order[start:stop] = start + np.argsort(mjd[order][start:stop],
+                kind='mergesort')
+
+    tmp_file = index_file + ".tmp.npz"
+    np.savez(tmp_file, objects=object_names, obj_starts=obj_starts,
+            obj_stops=obj_stops, obsid=obsIDs[order], angle=angle[order],
+            rate=rate[order], mjd=mjd[order], mjd_order=mjd_order,
+            mjd_sorted=mjd[order][mjd_order],
+            csv_file=os.path.abspath(csv_file))
+    os.rename(tmp_file, index_file)
+
+    return len(order)
+
+
+################################################################################
+def load_index(index_file):
+    """
+    Loads a power colour index. Given the CSV instead, builds its index
+    (<csv name>.npz) first if it's not there or is older than the CSV.
+
+    Parameters
+    ----------
+    index_file : str
+        The index (.npz) or the power colour table (.csv).
+
+    Returns
+    -------
+    dict of np.arrays
+        The index.
+
+    """
+    if index_file.lower().endswith(".csv"):
+        csv_file = index_file
+        index_file = os.path.splitext(csv_file)[0] + ".npz"
+        if not os.path.isfile(index_file) or os.path.getmtime(index_file) < \
+                os.path.getmtime(csv_file):
+            build_index(csv_file, index_file)
+
+    with np.load(index_file) as saved:
+        return dict((key, saved[key]) for key in saved.files)
+
+
+################################################################################
+def sorted_range(values, value_range):
+    """
+    Finds the slice of sorted values strictly inside a range, by binary
+    search.
+
+    Parameters
+    ----------
+    values : np.array of floats
+        Values sorted in increasing order (NaNs last).
+
+    value_range : (float, float)
+        The lower and upper bounds, exclusive. None for no bound.
+
+    Returns
+    -------
+    int, int
+        Start and stop index of the slice.
+
+    """
+    (low, high) = value_range
+    start = 0 if low is None else np.searchsorted(values, low, side='right')
+    if high is None:
+        ## NaNs sort after inf, so this leaves them out
+        stop = np.searchsorted(values, np.inf, side='right')
+    else:
+        stop = np.searchsorted(values, high, side='left')
+
+    return start, max(start, stop)
+
+
+################################################################################
+def query(index, objects=None, angle=None, rate_min=None, mjd=None):
+    """
+    Selects rows of the power colour index. All bounds are exclusive, as in
+    PC_extract_obsIDs.ipynb.
+
+    Parameters
+    ----------
+    index : dict of np.arrays
+        The index, from load_index.
+
+    objects : list of str, optional
+        Object names to select. Default is all objects.
+
+    angle : (float, float), optional
+        Lower and upper bound on the hue angle. None for no bound.
+
+    rate_min : float, optional
+        Lower bound on the count rate.
+
+    mjd : (float, float), optional
+        Lower and upper bound on the MJD. None for no bound.
+
+    Returns
+    -------
+    np.array of ints
+        Row numbers in the index of the selected rows, in MJD order.
+
+    """
+    if objects is None:
+        obj_indices = np.arange(len(index['objects']))
+    else:
+        obj_indices = np.searchsorted(index['objects'], objects)
+        obj_indices = [i for (i, name) in zip(obj_indices, objects) if i < \
+                len(index['objects']) and index['objects'][i] == name]
+
+    rows = []
+    for i in obj_indices:
+        (obj_start, obj_stop) = (index['obj_starts'][i], index['obj_stops'][i])
+        if angle is not None:
+            (start, stop) = sorted_range(index['angle'][obj_start:obj_stop],
+                    angle)
+            selected = np.arange(obj_start + start, obj_start + stop)
+        elif mjd is not None:
+            (start, stop) = sorted_range(index['mjd_sorted'][
+                    obj_start:obj_stop], mjd)
+            selected = index['mjd_order'][obj_start + start:obj_start + stop]
+        else:
+            selected = np.arange(obj_start, obj_stop)
+        rows.append(selected)
+
+    if len(rows) == 0:
+        return np.zeros(0, dtype=np.int64)
+    rows = np.concatenate(rows).astype(np.int64)
+
+    ## The rest of the cuts are on the selected rows only
+    if rate_min is not None:
+        rows = rows[index['rate'][rows] > rate_min]
+    if mjd is not None and angle is not None:
+        if mjd[0] is not None:
+            rows = rows[index['mjd'][rows] > mjd[0]]
+        if mjd[1] is not None:
+            rows = rows[index['mjd'][rows] < mjd[1]]
+
+    return rows[np.argsort(index['mjd'][rows], kind='mergesort')]
+
+
+################################################################################
+def write_obsID_list(index, rows, out_file):
+    """
+    Writes the obsIDs of selected rows to a list, one per line and without
+    duplicates, as download_obsIDs.sh and xtescan.sh read them.
+
+    Parameters
+    ----------
+    index : dict of np.arrays
+        The index, from load_index.
+
+    rows : np.array of ints
+        The selected rows, from query.
+
+    out_file : str
+        The output obsID list (.lst).
+
+    Returns
+    -------
+    list of str
+        The obsIDs written.
+
+    """
+    obsIDs = []
+    seen = set()
+    for obsID in index['obsid'][rows]:
+        if obsID not in seen:
+            seen.add(obsID)
+            obsIDs.append(str(obsID))
+
+    with open(out_file, 'w') as out:
+        for obsID in obsIDs:
+            out.write(obsID + "\n")
+
+    return obsIDs
+
+
+################################################################################
+if __name__ == "__main__":
+
+    ##############################################
+    ## Parsing input arguments and calling things
+    ##############################################
+
+    parser = argparse.ArgumentParser(usage="python pc_select.py "\
+            "{build,query} ...", description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+
+    build_parser = subparsers.add_parser('build', help="Convert the power "\
+            "colour CSV into an index.")
+    build_parser.add_argument('csv_file', help="Power colour table (.csv).")
+    build_parser.add_argument('index_file', help="Output index (.npz).")
+
+    query_parser = subparsers.add_parser('query', help="Select obsIDs and "\
+            "write them to a list.")
+    query_parser.add_argument('index_file', help="Index (.npz), or the power "\
+            "colour table (.csv) to index first.")
+    query_parser.add_argument('out_file', help="Output obsID list (.lst).")
+    query_parser.add_argument('--object', action='append', default=None,
+            dest='objects', help="Object to select. Give once per object. "\
+            "[all objects]")
+    query_parser.add_argument('--angle', type=float, nargs=2, default=None,
+            help="Lower and upper bound on the hue angle, exclusive. [none]")
+    query_parser.add_argument('--rate_min', type=float, default=None,
+            help="Lower bound on the count rate, exclusive. [none]")
+    query_parser.add_argument('--mjd', type=float, nargs=2, default=None,
+            help="Lower and upper bound on the MJD, exclusive. [none]")
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        n_rows = build_index(args.csv_file, args.index_file)
+        print "Indexed %d rows: %s" % (n_rows, args.index_file)
+    else:
+        index = load_index(args.index_file)
+        rows = query(index, objects=args.objects, angle=args.angle,
+                rate_min=args.rate_min, mjd=args.mjd)
+        obsIDs = write_obsID_list(index, rows, args.out_file)
+        print "%d obsIDs: %s" % (len(obsIDs), args.out_file)
+
+################################################################################
@@ -20,6 +20,7 @@ from optparse import OptionParser
 import os,os.path
 import time
 from datetime import datetime
+import multiprocessing
 #
 # ------------------------------------------------------------------------------
 # regrid data set
@@ -29,21 +30,28 @@ from datetime import datetime
 # pmesh - new mesh
 #
 # return - array of data on new mesh
+#
+# All points are done at once. Each new point is linearly interpolated between
+# the first original point at or above it and the point before that, or
+# extrapolated from the two end points if it is outside the original mesh.
 def regrid_dat(mesh,dat,pmesh):
-  out=[]
-  for ix in range(len(pmesh)):
-    x=pmesh[ix]
+  mesh=asarray(mesh,dtype=float64)
+  dat=asarray(dat,dtype=float64)
+  pmesh=asarray(pmesh,dtype=float64)
 
-    if x < mesh[0]:            # interpolate to the left
-      out.append(interpolate(x,mesh[0],dat[0],mesh[1],dat[1]))
-    elif x > mesh[-1]:         # interpolate to the right
-      out.append(interpolate(x,mesh[-2],dat[-2],mesh[-1],dat[-1]))
-    else:                      # normal interpolation
-      ixp=0
-      while mesh[ixp] < x: ixp+=1
-      out.append(interpolate(x,mesh[ixp-1],dat[ixp-1],mesh[ixp],dat[ixp]))
+  ixp=searchsorted(mesh,pmesh,side='left')
+  ixp[pmesh < mesh[0]]=1             # interpolate to the left
+  ixp[pmesh > mesh[-1]]=len(mesh)-1  # interpolate to the right
 
-  return out
+  x1=mesh[ixp-1]
+  y1=dat[ixp-1]
+  x2=mesh[ixp]
+  y2=dat[ixp]
+  if any(x1 == x2):
+    print "cannot interpolate given indentical x1 and x2"
+    raise ValueError("identical x1 and x2 in regrid_dat")
+  slope=(y2-y1)/(x2-x1)
+  return y1+slope*(pmesh-x1)
 # ------------------------------------------------------------------------------
 #
 # perform linear interpolation (or extrapolation)
@@ -82,6 +90,227 @@ def read_lines(infile):
 #
 # ------------------------------------------------------------------------------
 #
+# Caches, so that a batch of spectra only reads each correction file and
+# response once, and only regrids the correction once per pair of them
+#
+cor_cache={}     # correction file -> (energies, correction factors)
+resp_cache={}    # response file -> channel energies from EBOUNDS
+factor_cache={}  # (correction file, response file) -> regridded factors
+#
+# ------------------------------------------------------------------------------
+#
+# Read a correction file
+#
+# corfile - Correction file name
+#
+# return - arrays of the energies and the correction factors
+#
+def read_correction(corfile):
+  key=os.path.abspath(corfile)
+  if key not in cor_cache:
+    B=array(read_lines(corfile))
+    cor_cache[key]=(B[:,0].astype(float64),B[:,1].astype(float64))
+  return cor_cache[key]
+#
+# ------------------------------------------------------------------------------
+#
+# Read the channel energies of a response file
+#
+# respfile - Response file name
+#
+# return - array of the energy in the middle of each channel
+#
+def read_ebounds(respfile):
+  key=os.path.abspath(respfile)
+  if key not in resp_cache:
+    resplin=pyfits.getdata(respfile,2)
+    #resplin=pyfits.getdata(respfile,1)  # Needs to read extension EBOUNDS!!!
+    resp_cache[key]=(resplin.field(2)+resplin.field(1)).astype(float64)/2.
+  return resp_cache[key]
+#
+# ------------------------------------------------------------------------------
+#
+# Find the correction factors in the energy grid of a response
+#
+# corfile - Correction file name
+# respfile - Response file name
+#
+# return - array of correction factors, one per channel of the response
+#
+def correction_factors(corfile,respfile):
+  key=(os.path.abspath(corfile),os.path.abspath(respfile))
+  if key not in factor_cache:
+    oldmesh,olddata=read_correction(corfile)
+    factor_cache[key]=regrid_dat(oldmesh,olddata,read_ebounds(respfile))
+  return factor_cache[key]
+#
+# ------------------------------------------------------------------------------
+#
+# Error in correcting a spectrum, with the message to print
+#
+class PcacorrError(Exception):
+  pass
+#
+# ------------------------------------------------------------------------------
+#
+# Correct one spectrum
+#
+# specfile - Spectrum (PHA) file name
+# outfile  - Corrected spectrum file name
+# corfile  - Correction file name
+# respfile - Response file name
+# back     - Use the associated background file (True/False)
+# currtime - Creation date for the HISTORY comments
+# newdata  - Correction factors on the response grid; found from corfile and
+#            respfile if not given
+#
+# return - message to print when done
+#
+def correct_spectrum(specfile,outfile,corfile,respfile,back,currtime,newdata=None):
+  # Check if specfile exist
+  if not os.path.isfile(specfile):
+    raise PcacorrError('Error: spectrum file '+specfile+' does not exist!')
+
+  # Read the correction file
+  if not os.path.isfile(corfile):
+    raise PcacorrError('Error: correction file '+corfile+' does not exist!')
+
+  # Read spectrum file
+  hdulist = pyfits.open(specfile)
+  header = hdulist[0].header      # reads header
+  specdata=hdulist[1].data        # reads data
+
+  if not os.path.isfile(respfile):
+    raise PcacorrError('Error: response file '+respfile+' does not exist!')
+
+  #Background
+  if back:
+    backfile=hdulist[1].header['backfile']
+    # Read background file
+    hdulistback = pyfits.open(backfile)
+    backcts=array(hdulistback[1].data.field('counts'))
+  else:
+    backcts=zeros(len(specdata.field('counts')),dtype=int)
+
+  # Find the correction factor in the energy grid of the observation
+  if newdata is None:
+    newdata=correction_factors(corfile,respfile)
+
+  # First check we have the same number of channels
+  if len(newdata) != len(specdata.field('counts')):
+    raise PcacorrError('Error: obervation and correction files have different number of channels!\n'+
+      'Correction: '+str(len(newdata))+'\nObservation: '+str(len(specdata.field('counts'))))
+
+  # Apply the correction factors to the observation
+  counts=specdata.field('counts')
+  stat_err=specdata.field('stat_err')
+  counts[:]=(counts-backcts)/newdata+backcts
+  stat_err[:]=stat_err/newdata # Check what to do with the errors when background true
+
+  # Write corrected spectrum file
+  if os.path.isfile(outfile):
+    raise PcacorrError('Error: output file '+outfile+' already exist!')
+  # Include HISTORY comments
+  header['HISTORY'] = 'Original file corrected by phacorr.py version '+version
+  header['HISTORY'] = 'Creation date: '+currtime+' UTC'
+  header['HISTORY'] = 'Correction file '+corfile
+  hdulist.writeto(outfile)
+  hdulist.close()
+
+  if back:
+    return 'Corrected spectra written in:  '+outfile+' \n   with background: '+backfile
+  return 'Corrected spectra written in:  '+outfile
+#
+# ------------------------------------------------------------------------------
+#
+# Correct one spectrum in a batch (run in the worker processes)
+#
+# task - (specfile, outfile, corfile, respfile, back, currtime, newdata)
+#
+# return - (specfile, outfile, respfile, status, message), with status 'OK' or
+#          'ERROR'
+#
+def batch_worker(task):
+  specfile,outfile,corfile,respfile,back,currtime,newdata=task
+  try:
+    message=correct_spectrum(specfile,outfile,corfile,respfile,back,currtime,newdata)
+    return (specfile,outfile,respfile,'OK',' '.join(message.split()))
+  except Exception as err:
+    return (specfile,outfile,respfile,'ERROR',' '.join(str(err).split()))
+#
+# ------------------------------------------------------------------------------
+#
+# Correct many spectra at once
+#
+# The spectra are grouped by their RESPFILE, so each response's EBOUNDS is
+# read (and the correction regridded onto it) once per group. The spectra are
+# then corrected in a pool of worker processes, and one line per spectrum is
+# written to the report. A spectrum that can't be read or corrected (no
+# RESPFILE key, corrupt file, bad response) gets an ERROR line in the report
+# instead of stopping the batch.
+#
+# specfiles - List of spectrum file names
+# corfile   - Correction file name
+# back      - Use the associated background files (True/False)
+# currtime  - Creation date for the HISTORY comments
+# nproc     - Number of worker processes
+# report    - Report file name
+#
+# return - list of (specfile, outfile, respfile, status, message)
+#
+def batch_correct(specfiles,corfile,back,currtime,nproc,report):
+  groups={}
+  results=[]
+  for specfile in specfiles:
+    outfile=specfile.split('.pha')[0]+'-corr.pha'
+    if not os.path.isfile(specfile):
+      results.append((specfile,outfile,'','ERROR','Error: spectrum file '+specfile+' does not exist!'))
+      continue
+    try:
+      respfile=pyfits.getheader(specfile,1)['respfile']
+    except Exception as err:
+      results.append((specfile,outfile,'','ERROR','Error: could not read RESPFILE of '+specfile+': '+' '.join(str(err).split())))
+      continue
+    groups.setdefault(respfile,[]).append((specfile,outfile))
+
+  tasks=[]
+  for respfile in sorted(groups.keys()):
+    newdata=None
+    if os.path.isfile(respfile) and os.path.isfile(corfile):
+      try:
+        newdata=correction_factors(corfile,respfile)
+      except Exception as err:
+        message='Error: could not apply correction '+corfile+' to response '+respfile+': '+' '.join(str(err).split())
+        for specfile,outfile in groups[respfile]:
+          results.append((specfile,outfile,respfile,'ERROR',message))
+        continue
+    for specfile,outfile in groups[respfile]:
+      tasks.append((specfile,outfile,corfile,respfile,back,currtime,newdata))
+
+  if nproc > 1 and len(tasks) > 1:
+    pool=multiprocessing.Pool(processes=nproc)
+    try:
+      results+=pool.map(batch_worker,tasks,chunksize=1)
+    finally:
+      pool.close()
+      pool.join()
+  else:
+    results+=map(batch_worker,tasks)
+
+  # Report in the order the spectra were given
+  order=dict((specfile,i) for i,specfile in enumerate(specfiles))
+  results.sort(key=lambda x: order[x[0]])
+  fout=open(report,'w')
+  fout.write('# pcacorr.py batch report, '+currtime+' UTC\n')
+  fout.write('# Correction file: '+corfile+'\n')
+  fout.write('# specfile\toutfile\trespfile\tstatus\tmessage\n')
+  for result in results:
+    fout.write('\t'.join(result)+'\n')
+  fout.close()
+  return results
+#
+# ------------------------------------------------------------------------------
+#
 # MAIN PROGRAM
 #
 #
@@ -90,167 +319,106 @@ version='0.1d'
 date='- Tue Sep  2 10:28:58 CEST 2014 -'
 author='Javier Garcia <javier@head.cfa.harvard.edu>'
 #
-ul=[]
-ul.append("usage: %prog [options] PREFIX")
-ul.append("")
-ul.append("Produce a new PHA flie using the correction factors derived from")
-ul.append("the analysis to the Crab (see Garcia et al 2014; ApJ, 794, 73G)). A new PHA")
-ul.append("file is generated. The response corresponding to the observation")
-ul.append("is required. The response file name is obtained from the RESPFILE")
-ul.append("key or it must be supplied. The correction file is also required.")
-ul.append("PREFIX can be a single PHA file or a group (e.g. *.pha). Please")
-ul.append("check the gain epoch of your observation!")
-ul.append("")
-ul.append("*** Epoch 3 (MJD): 50188-51259")
-ul.append("*** Epochs 4 & 5 (MJD): > 51259")
-usage=""
-for u in ul: usage+=u+'\n'
+if __name__ == "__main__":
+  ul=[]
+  ul.append("usage: %prog [options] PREFIX")
+  ul.append("")
+  ul.append("Produce a new PHA flie using the correction factors derived from")
+  ul.append("the analysis to the Crab (see Garcia et al 2014; ApJ, 794, 73G)). A new PHA")
+  ul.append("file is generated. The response corresponding to the observation")
+  ul.append("is required. The response file name is obtained from the RESPFILE")
+  ul.append("key or it must be supplied. The correction file is also required.")
+  ul.append("PREFIX can be a single PHA file or a group (e.g. *.pha). Please")
+  ul.append("check the gain epoch of your observation!")
+  ul.append("")
+  ul.append("With -j N (N > 1), a group of PHA files is corrected as a batch in N")
+  ul.append("processes, with each response read once, and a report is written")
+  ul.append("(see -R). Otherwise the files are corrected one at a time. In batch")
+  ul.append("mode each response is taken from the RESPFILE key and each output is")
+  ul.append("<name>-corr.pha, so -r and -o can't be used.")
+  ul.append("")
+  ul.append("*** Epoch 3 (MJD): 50188-51259")
+  ul.append("*** Epochs 4 & 5 (MJD): > 51259")
+  usage=""
+  for u in ul: usage+=u+'\n'
 
-parser=OptionParser(usage=usage)
-parser.add_option("-v","--version",action="store_true",dest="version",default=False,help="show version number")
-parser.add_option("-r","--response",dest="respfile",default="",help="specify response file")
-parser.add_option("-p","--pcu",dest="pcu",default="2",help="specify which PCU (0-4, default 2)")
-parser.add_option("-l","--layer",dest="layer",default="a",help="specify if observation comes from the first layer (\"1\") or all (\"a\", default)")
-parser.add_option("-e","--epoch",dest="epoch",default="45",help="specify if observation was taken during gain epoch 3 only (\"3o\"), or during epochs 4 or 5 (\"45\", default)")
-parser.add_option("-c","--correction",dest="corfile",default="",help="specify correction file (default corr_pcu2_e45_la.out). Notice that this option overrides -p, -l, and -e options")
-parser.add_option("-o","--output",dest="outfile",default="",help="specify alternative output file")
-parser.add_option("-b","--background",action="store_true",dest="back",default=False,help="Use associated background file. In this case the corrected file will contain (C-B)/x + B, where C are the cts of the original spectrum, B are the cts of the background, and x is the correction factor. Be aware that the BACKFILE key must be defined in the spectrum file with the correct background filename")
+  parser=OptionParser(usage=usage)
+  parser.add_option("-v","--version",action="store_true",dest="version",default=False,help="show version number")
+  parser.add_option("-r","--response",dest="respfile",default="",help="specify response file")
+  parser.add_option("-p","--pcu",dest="pcu",default="2",help="specify which PCU (0-4, default 2)")
+  parser.add_option("-l","--layer",dest="layer",default="a",help="specify if observation comes from the first layer (\"1\") or all (\"a\", default)")
+  parser.add_option("-e","--epoch",dest="epoch",default="45",help="specify if observation was taken during gain epoch 3 only (\"3o\"), or during epochs 4 or 5 (\"45\", default)")
+  parser.add_option("-c","--correction",dest="corfile",default="",help="specify correction file (default corr_pcu2_e45_la.out). Notice that this option overrides -p, -l, and -e options")
+  parser.add_option("-o","--output",dest="outfile",default="",help="specify alternative output file")
+  parser.add_option("-b","--background",action="store_true",dest="back",default=False,help="Use associated background file. In this case the corrected file will contain (C-B)/x + B, where C are the cts of the original spectrum, B are the cts of the background, and x is the correction factor. Be aware that the BACKFILE key must be defined in the spectrum file with the correct background filename")
+  parser.add_option("-j","--jobs",dest="nproc",type="int",default=1,help="correct multiple files as a batch in this many processes (default 1, one file at a time)")
+  parser.add_option("-R","--report",dest="report",default="pcacorr_report.txt",help="report file for batch mode (default pcacorr_report.txt)")
 
-(options,args)=parser.parse_args()
+  (options,args)=parser.parse_args()
 
-if options.version:
-  print 'phacorr.py version:',version,date
-  print 'Author:',author
-  sys.exit()
+  if options.version:
+    print 'phacorr.py version:',version,date
+    print 'Author:',author
+    sys.exit()
 
-if len(args) == 0:
-  parser.print_help()
-  sys.exit(0)
+  if len(args) == 0:
+    parser.print_help()
+    sys.exit(0)
 
-# Check input options
-pcu=options.pcu
-layer=options.layer
-epoch=options.epoch
-corfile=options.corfile
+  # Check input options
+  pcu=options.pcu
+  layer=options.layer
+  epoch=options.epoch
+  corfile=options.corfile
 
-if pcu != "0" and pcu != "1" and pcu != "2" and pcu != "3" and pcu != "4":
-  print 'Error: allowed values for -p option are 0, 1, 2, 3, or 4'
-  print 'Aborting...'
-  sys.exit()
+  if pcu != "0" and pcu != "1" and pcu != "2" and pcu != "3" and pcu != "4":
+    print 'Error: allowed values for -p option are 0, 1, 2, 3, or 4'
+    print 'Aborting...'
+    sys.exit()
 
-if layer != "1" and layer != "a":
-  print 'Error: allowed values for -l option are \"1\" or \"a\"'
-  print 'Aborting...'
-  sys.exit()
+  if layer != "1" and layer != "a":
+    print 'Error: allowed values for -l option are \"1\" or \"a\"'
+    print 'Aborting...'
+    sys.exit()
 
-if epoch != "3o" and epoch != "45":
-  print 'Error: allowed values for -e option are \"3o\" or \"45\"'
-  print 'Aborting...'
-  sys.exit()
+  if epoch != "3o" and epoch != "45":
+    print 'Error: allowed values for -e option are \"3o\" or \"45\"'
+    print 'Aborting...'
+    sys.exit()
 
-if corfile == "":
-  corfile='corr_pcu'+pcu+'_e'+epoch+'_l'+layer+'.out'
-respfile=options.respfile
-outfile=options.outfile
+  if corfile == "":
+    corfile='corr_pcu'+pcu+'_e'+epoch+'_l'+layer+'.out'
+  respfile=options.respfile
+  outfile=options.outfile
 
-# Get current universal date and time 
-currtime=str(datetime.utcnow())
+  # Get current universal date and time 
+  currtime=str(datetime.utcnow())
 
-#-----
-for specfile in args:
-  # Check if specfile exist
-  if not os.path.isfile(specfile):
-    print 'Error: spectrum file',specfile,'does not exist!'
-    print 'Aborting...'
+  #-----
+  if options.nproc > 1 and len(args) > 1:
+    if respfile != "" or outfile != "":
+      print 'Error: -r and -o options can not be used in batch mode (-j > 1 with several files)'
+      print 'Aborting...'
+      sys.exit()
+    results=batch_correct(args,corfile,options.back,currtime,options.nproc,options.report)
+    nbad=len([x for x in results if x[3] != 'OK'])
+    print 'Corrected',len(results)-nbad,'of',len(results),'spectra. Report written in:',options.report
     sys.exit()
 
-  else:
-
+  for specfile in args:
     # If outfile is not defined (or multiple files), use the default
-    if outfile == "" or int(len(args)) > 1:
+    if outfile == "" or len(args) > 1:
       outfile=specfile.split('.pha')[0]+'-corr.pha'
 
-    # Read the correction file
-    if not os.path.isfile(corfile):
-      print 'Error: correction file',corfile,'does not exist!'
-      print 'Aborting...'
-      sys.exit()
-    corlin=read_lines(corfile)
-    
-    # Read spectrum file
-    hdulist = pyfits.open(specfile)
-    header = hdulist[0].header      # reads header
-    specdata=hdulist[1].data        # reads data
-    
     # Get response file name if not supplied (or multiple files)
-    if respfile == "" or int(len(args)):
-      respfile=hdulist[1].header['respfile']
-    if not os.path.isfile(respfile):
-      print 'Error: response file',specfile,'does not exist!'
-      print 'Aborting...'
-      sys.exit()
+    if (respfile == "" or len(args) > 1) and os.path.isfile(specfile):
+      respfile=pyfits.getheader(specfile,1)['respfile']
 
-    #Background
-    backcts=[]
-    if options.back:
-      backfile=hdulist[1].header['backfile']
-      # Read background file
-      hdulistback = pyfits.open(backfile)
-      backdata=hdulistback[1].data
-      for cts in backdata.field('counts'):
-        backcts.append(cts)
-    else:
-      backcts=[0]*len(specdata.field('counts'))
-    
-    # Read response file
-    resplin=pyfits.getdata(respfile,2)
-    #resplin=pyfits.getdata(respfile,1)  # Needs to read extension EBOUNDS!!!
-    
-    # Find the correction factor in the energy grid of the observation
-    oldmesh=[]  # Energy in the correction curve
-    olddata=[]  # Correction factors
-    newmesh=[]  # Energy in the observation
-    newdata=[]  # New correction factor
-    B=array(corlin)
-    oldmesh=map(float,B[:,0].tolist())     # Energy
-    olddata=map(float,B[:,1].tolist())     # Correction factors
-    
-    # Get the energies from response
-    for chan in resplin:
-      newmesh.append(float(chan[2]+chan[1])/2.)
-
-    # Map to the reference grid
-    newdata=regrid_dat(oldmesh,olddata,newmesh)
-    
-    # First check we have the same number of channels
-    if len(newdata) != len(specdata.field('counts')):
-      print 'Error: obervation and correction files have different number of channels!'
-      print 'Correction:',len(newdata)
-      print 'Observation:',len(specdata.field('counts'))
+    try:
+      print correct_spectrum(specfile,outfile,corfile,respfile,options.back,currtime)
+    except PcacorrError as err:
+      print err
       print 'Aborting...'
       sys.exit()
-    
-    # Apply the correction factors to the observation
-    for i in range(len(specdata.field('counts'))):
-      #specdata.field('counts')[i]=specdata.field('counts')[i]/newdata[i]
-      #specdata.field('stat_err')[i]=specdata.field('stat_err')[i]/newdata[i]
-      specdata.field('counts')[i]=(specdata.field('counts')[i]-backcts[i])/newdata[i]+backcts[i]
-      specdata.field('stat_err')[i]=specdata.field('stat_err')[i]/newdata[i] # Check what to do with the errors when background true
-    
-    # Write corrected spectrum file
-    if os.path.isfile(outfile):
-      print 'Error: output file ',outfile,' already exist!'
-      print 'Aborting...'
-      sys.exit()
-    else:
-      if options.back:
-        print 'Corrected spectra written in: ',outfile,'\n   with background:',backfile
-      else:
-        print 'Corrected spectra written in: ',outfile
-      # Include HISTORY comments
-      header['HISTORY'] = 'Original file corrected by phacorr.py version '+version
-      header['HISTORY'] = 'Creation date: '+currtime+' UTC'
-      header['HISTORY'] = 'Correction file '+corfile
-      hdulist.writeto(outfile)
-sys.exit()
+  sys.exit()
 # ------------------------------------------------------------------------------
@@ -5,198 +5,479 @@ from astropy.io import fits
 import os
 import sys
 import argparse
+import multiprocessing
+
+from hash_tools import file_hash
 
 """
 		pcu_filter.py
 
+Summarizes which PCUs are on during each obsID, from the filter files. The
+filter files are read in a process pool (only the TIME, NUM_PCU_ON and PCUn_ON
+columns), and the statistics go into one structured array, one row per obsID.
+The statistics of each filter file are cached (with the file's size, mtime and
+content hash) in data_dir/filter_stats_cache.npz, so later runs only read the
+filter files that are new or have changed.
+
 Written in python 2.7.
 
 """
+
+N_PCUS = 5
+## One exposure bin per combination of PCUs on, indexed by the bit mask
+## PCU0_ON * 1 + PCU1_ON * 2 + ... + PCU4_ON * 16
+N_COMBOS = 2 ** N_PCUS
+FILTER_COLS = ['TIME', 'NUM_PCU_ON'] + ['PCU%d_ON' % pcu for pcu in \
+	range(N_PCUS)]
+## Filter file row length (s), if the file has no TIMEDEL keyword
+FILTER_TIMEDEL = 16.0
+## Version of the statistics in the cache; cached rows from another version are
+## computed again
+CACHE_VERSION = 2
+
+STATS_DTYPE = [('obsID', 'S24'), \
+	('num_pcu_max', 'f8'), \
+	('num_pcu_mean', 'f8'), \
+	('pcu_max', 'f8', (N_PCUS,)), \
+	('pcu_frac', 'f8', (N_PCUS,)), \
+	('exposure', 'f8', (N_COMBOS,))]
+
 ################################################################################
-def main(filter_list, prefix, data_dir):
-	
-	###################
-	## Initializations
-	###################
-	
-	tab_file = data_dir+"/"+prefix+"_filters.dat"
-	tab2_file = data_dir+"/"+prefix+"_filter_info.txt"
-	out_file1 = data_dir+"/"+prefix+"_obsID_pcus.png"
-	out_file2 = data_dir+"/"+prefix+"_pcus_on.png"
-	filter_files = [line.strip() for line in open(filter_list)]
-	num = len(filter_files)
-	obsIDs = []
-	num_pcus_on_array = np.asarray([])
-	avg_pcus_on_array = np.asarray([])
-	pcus_on_list = []
-	pcu0_on_array = np.asarray([])
-	pcu0_avg_array = np.asarray([])
-	pcu1_on_array = np.asarray([])
-	pcu1_avg_array = np.asarray([])
-	pcu2_on_array = np.asarray([])
-	pcu2_avg_array = np.asarray([])
-	pcu3_on_array = np.asarray([])
-	pcu3_avg_array = np.asarray([])
-	pcu4_on_array = np.asarray([])
-	pcu4_avg_array = np.asarray([])
-	i = 1
-	
-	font_prop = font_manager.FontProperties(size=8)
-	
-	####################################
-	## Looping through the filter files
-	####################################
-	
-	for filter_file in filter_files:
-		try:
-			file_hdu = fits.open(filter_file)
-		except IOError:
-			print "\tERROR: File does not exist: %s" % filter_file
-			continue
-			
-		data = file_hdu[1].data
+def combo_label(combo):
+	"""
+	Gives the PCUs on for an exposure combination index, like '024'.
+	"""
+	return "".join([str(pcu) for pcu in range(N_PCUS) if combo & (1 << pcu)])
+
+
+################################################################################
+def read_filter(filter_file):
+	"""
+	Reads the obsID and the needed columns from a filter file.
+
+	Parameters
+	----------
+	filter_file : str
+		The filter file (.xfl).
+
+	Returns
+	-------
+	str
+		The obsID.
+
+	dict of np.arrays
+		The columns in FILTER_COLS, without the first row.
+
+	float
+		The row length (TIMEDEL), in seconds.
+
+	"""
+	with fits.open(filter_file, memmap=True) as file_hdu:
 		obsID = file_hdu[0].header["OBS_ID"]
-		file_hdu.close()
-	
+		timedel = float(file_hdu[1].header.get("TIMEDEL", FILTER_TIMEDEL))
+		data = file_hdu[1].data
 		## Need to start at 1 instead of 0, since [0]=255 (the null val)
-		time = data.field('TIME')[1:]
-		time = (time - time[0]) / 60
-		elv = data.field('ELV')[1:]
-		tssaa = data.field('TIME_SINCE_SAA')[1:]
-		offset = data.field('OFFSET')[1:]
-		electron2 = data.field('ELECTRON2')[1:]
-		num_pcu = data.field('NUM_PCU_ON')[1:]
-		pcu0 = data.field('PCU0_ON')[1:]
-		pcu1 = data.field('PCU1_ON')[1:]
-		pcu2 = data.field('PCU2_ON')[1:]
-		pcu3 = data.field('PCU3_ON')[1:]
-		pcu4 = data.field('PCU4_ON')[1:]
-	
-		num_pcu_on = np.max(num_pcu)
-		avg_pcu_on = np.mean(num_pcu)
-		pcu0_on = np.max(pcu0)
-		pcu0_avg = np.mean(pcu0)
-		pcu1_on = np.max(pcu1)
-		pcu1_avg = np.mean(pcu1)
-		pcu2_on = np.max(pcu2)
-		pcu2_avg = np.mean(pcu2)
-		pcu3_on = np.max(pcu3)
-		pcu3_avg = np.mean(pcu3)
-		pcu4_on = np.max(pcu4)
-		pcu4_avg = np.mean(pcu4)
-	
-	
-# 		ax1 = plt.subplot(3, 4, i)
-# 		ax1.plot(time, num_pcu, 'y-.', lw=4)
-# 		ax1.plot(time, pcu2, 'k', lw=1)
-# 		ax1.plot(time, pcu0, 'r--', lw=3)
-# 		ax1.plot(time, pcu1, 'b:', lw=3)
-# 		ax1.plot(time, pcu3, 'g--', lw=2)
-# 		ax1.plot(time, pcu4, 'm:', lw=2)
-# 		ax1.set_ylim(0, np.max(num_pcu)+0.25)
-# 		ax1.set_xlabel("Time (minutes)", fontproperties=font_prop)
-# 		ax1.tick_params(axis='x', labelsize=8)
-# 		ax1.tick_params(axis='y', labelsize=8)
-# 		ax1.set_title(obsID, fontsize=10)
-		i += 1
-
-		pcus_on = ""
-		if pcu0_on > 0:
-			pcus_on+="0"
-		if pcu1_on > 0:
-			pcus_on+="1"
-		if pcu2_on > 0:
-			pcus_on+="2"
-		if pcu3_on > 0:
-			pcus_on+="3"
-		if pcu4_on > 0:
-			pcus_on+="4"
-	
-		obsIDs.append(obsID)
-		num_pcus_on_array = np.append(num_pcus_on_array, num_pcu_on)
-		avg_pcus_on_array = np.append(avg_pcus_on_array, avg_pcu_on)
-		pcus_on_list.append(pcus_on)
-		pcu0_on_array = np.append(pcu0_on_array, pcu0_on)
-		pcu0_avg_array = np.append(pcu0_avg_array, pcu0_avg)
-		pcu1_on_array = np.append(pcu1_on_array, pcu1_on)
-		pcu1_avg_array = np.append(pcu1_avg_array, pcu1_avg)
-		pcu2_on_array = np.append(pcu2_on_array, pcu2_on)
-		pcu2_avg_array = np.append(pcu2_avg_array, pcu2_avg)
-		pcu3_on_array = np.append(pcu3_on_array, pcu3_on)
-		pcu3_avg_array = np.append(pcu3_avg_array, pcu3_avg)
-		pcu4_on_array = np.append(pcu4_on_array, pcu4_on)
-		pcu4_avg_array = np.append(pcu4_avg_array, pcu4_avg)
-	
-	## End of for loop through filter files
-	
-# 	plt.tight_layout()
-# 	plt.savefig(out_file1, dpi=300)
-# 	# plt.show()
-# 	plt.close()
+		columns = dict((col, np.array(data.field(col)[1:])) for col in \
+			FILTER_COLS)
 
-	tmp = np.arange(num)+0.5
-	pcu_stack = np.column_stack((pcu0_on_array, pcu1_on_array, pcu2_on_array, \
-		pcu3_on_array, pcu4_on_array))
-	pcu_sums = np.sum(pcu_stack, axis=0)
-	pcus = np.arange(5)
-
-	######################################################################
-	## Writing summary to a text file for easy human-reading and printing
-	######################################################################
-	
-	with open (tab2_file, 'w') as out:
+	return obsID, columns, timedel
+
+
+################################################################################
+def filter_stats(obsID, columns, timedel=FILTER_TIMEDEL):
+	"""
+	Computes the PCU statistics of one filter file.
+
+	Parameters
+	----------
+	obsID : str
+		The obsID.
+
+	columns : dict of np.arrays
+		The filter file columns, from read_filter.
+
+	timedel : float, default=FILTER_TIMEDEL
+		The filter file row length, in seconds.
+
+	Returns
+	-------
+	np.array of STATS_DTYPE
+		One row of statistics: max and mean of NUM_PCU_ON, max and on-fraction
+		per PCU, and exposure (s) per combination of PCUs on.
+
+	"""
+	stats = np.zeros(1, dtype=STATS_DTYPE)
+	stats['obsID'] = obsID
+	num_pcu = columns['NUM_PCU_ON']
+	if len(num_pcu) == 0:
+		return stats
+
+	stats['num_pcu_max'] = np.max(num_pcu)
+	stats['num_pcu_mean'] = np.mean(num_pcu)
+
+	pcu_on = np.column_stack([columns['PCU%d_ON' % pcu] for pcu in \
+		range(N_PCUS)])
+	stats['pcu_max'] = np.max(pcu_on, axis=0)
+	stats['pcu_frac'] = np.mean(pcu_on > 0, axis=0)
+
+	## Each filter file row lasts until the next one, but no longer than the
+	## row length, so data gaps (SAA, occultation) aren't counted as exposure;
+	## the last one gets the row length
+	time = np.asarray(columns['TIME'], dtype=np.float64)
+	dt = np.minimum(np.diff(time), timedel)
+	dt = np.append(dt, timedel)
+
+	combos = np.dot((pcu_on > 0).astype(np.int64), 1 << np.arange(N_PCUS))
+	stats['exposure'] = np.bincount(combos, weights=dt, minlength=N_COMBOS)
+
+	return stats
+
+
+################################################################################
+def summarize_worker(filter_file):
+	"""
+	Reads a filter file and computes its statistics. For use in a process pool.
+
+	Returns
+	-------
+	np.array of STATS_DTYPE, or None
+		The row of statistics, or None if the file couldn't be read.
+
+	"""
+	try:
+		obsID, columns, timedel = read_filter(filter_file)
+	except IOError:
+		print "\tERROR: File does not exist: %s" % filter_file
+		return None
+
+	return filter_stats(obsID, columns, timedel)
+
+
+################################################################################
+def summarize_hashed(filter_file):
+	"""
+	Computes the statistics of a filter file with summarize_worker, and gets its
+	size, mtime and content hash. For use in a process pool.
+
+	Returns
+	-------
+	tuple
+		(row of statistics or None, size, mtime, hash).
+
+	"""
+	stats = summarize_worker(filter_file)
+	if stats is None:
+		return None, 0, 0.0, ""
+	stat = os.stat(filter_file)
+
+	return stats, stat.st_size, stat.st_mtime, file_hash(filter_file)
+
+
+################################################################################
+def load_cache(cache_file):
+	"""
+	Loads the cached statistics of filter files.
+
+	Parameters
+	----------
+	cache_file : str
+		The full path of the cache (.npz) file.
+
+	Returns
+	-------
+	dict
+		File name -> (size, mtime, hash, row of statistics). Empty if the cache
+		file doesn't exist or is from another CACHE_VERSION.
+
+	"""
+	if not os.path.isfile(cache_file):
+		return {}
+
+	cache = {}
+	with np.load(cache_file) as saved:
+		if 'version' not in saved.files or \
+				int(saved['version']) != CACHE_VERSION:
+			return {}
+		stats = saved['stats'].astype(STATS_DTYPE)
+		for (i, filter_file) in enumerate(saved['files']):
+			cache[str(filter_file)] = (int(saved['sizes'][i]),
+				float(saved['mtimes'][i]), str(saved['hashes'][i]),
+				stats[i:i+1])
+
+	return cache
+
+
+################################################################################
+def save_cache(cache_file, cache):
+	"""
+	Saves the statistics of filter files to a cache (.npz) file.
+
+	Parameters
+	----------
+	cache_file : str
+		The full path of the cache (.npz) file.
+
+	cache : dict
+		File name -> (size, mtime, hash, row of statistics), as from load_cache.
+
+	Returns
+	-------
+	nothing
+
+	"""
+	files = sorted(cache.keys())
+	entries = [cache[filter_file] for filter_file in files]
+	if len(entries) > 0:
+		stats = np.concatenate([entry[3] for entry in entries])
+	else:
+		stats = np.zeros(0, dtype=STATS_DTYPE)
+
+	## Writing to a temporary file first, so a crash can't leave half a cache
+	tmp_file = cache_file + ".tmp.npz"
+	np.savez(tmp_file, files=np.array(files, dtype=str),
+		sizes=np.array([entry[0] for entry in entries], dtype=np.int64),
+		mtimes=np.array([entry[1] for entry in entries], dtype=np.float64),
+		hashes=np.array([entry[2] for entry in entries], dtype=str),
+		stats=stats, version=CACHE_VERSION)
+	os.rename(tmp_file, cache_file)
+
+
+################################################################################
+def summarize_filters(filter_files, processes=None, cache_file=None):
+	"""
+	Computes the PCU statistics of many filter files in a process pool.
+
+	With a cache file, the statistics of filter files with the same size and
+	mtime (or, failing that, the same content hash) as last time are taken from
+	the cache, and only new or changed filter files are read. Filter files that
+	aren't in filter_files any more are dropped from the cache. The cache hits
+	and misses are printed.
+
+	Parameters
+	----------
+	filter_files : list of str
+		The filter files (.xfl).
+
+	processes : int, optional
+		Number of worker processes. Default is the number of CPUs.
+
+	cache_file : str, optional
+		The full path of the cache (.npz) file. Made if it doesn't exist.
+
+	Returns
+	-------
+	np.array of STATS_DTYPE
+		One row per filter file that could be read, in the order given.
+
+	"""
+	cache = {}
+	if cache_file is not None:
+		cache = load_cache(cache_file)
+
+	to_read = []
+	reading = set()  ## The same files as to_read, for membership tests
+	n_hits = 0
+	changed = False
+	for filter_file in filter_files:
+		if filter_file in reading:
+			continue
+		if filter_file in cache and os.path.isfile(filter_file):
+			(size, mtime, saved_hash, stats) = cache[filter_file]
+			stat = os.stat(filter_file)
+			if stat.st_size == size and stat.st_mtime == mtime:
+				n_hits += 1
+				continue
+			if stat.st_size == size and file_hash(filter_file) == saved_hash:
+				## Same contents with a new mtime: saving the new mtime, so the
+				## file isn't hashed again next time
+				cache[filter_file] = (size, stat.st_mtime, saved_hash, stats)
+				changed = True
+				n_hits += 1
+				continue
+		to_read.append(filter_file)
+		reading.add(filter_file)
+
+	## Only hashing the files when there's a cache to put the hashes in
+	if cache_file is not None:
+		worker = summarize_hashed
+	else:
+		worker = summarize_worker
+
+	if processes == 1 or len(to_read) <= 1:
+		results = [worker(filter_file) for filter_file in to_read]
+	else:
+		pool = multiprocessing.Pool(processes=processes)
+		try:
+			results = pool.map(worker, to_read)
+		finally:
+			pool.close()
+			pool.join()
+
+	read = {}
+	for (filter_file, result) in zip(to_read, results):
+		if cache_file is None:
+			result = (result, 0, 0.0, "")
+		(stats, size, mtime, new_hash) = result
+		if stats is not None:
+			read[filter_file] = stats
+			cache[filter_file] = (size, mtime, new_hash, stats)
+			changed = True
+
+	if cache_file is not None:
+		print "Filter file stats cache: %d hits, %d misses." % (n_hits,
+			len(to_read))
+		listed = set(filter_files)
+		for filter_file in list(cache.keys()):
+			if filter_file not in listed:
+				del cache[filter_file]
+				changed = True
+		if changed:
+			save_cache(cache_file, cache)
+
+	rows = []
+	for filter_file in filter_files:
+		if filter_file in read:
+			rows.append(read[filter_file])
+		elif filter_file in cache and filter_file not in reading:
+			rows.append(cache[filter_file][3])
+
+	if len(rows) == 0:
+		return np.zeros(0, dtype=STATS_DTYPE)
+
+	return np.concatenate(rows)
+
+
+################################################################################
+def write_info(stats, tab2_file):
+	"""
+	Writes the summary to a text file for easy human-reading and printing.
+
+	Parameters
+	----------
+	stats : np.array of STATS_DTYPE
+		The PCU statistics per obsID, from summarize_filters.
+
+	tab2_file : str
+		The output text file.
+
+	"""
+	num = len(stats)
+	pcu_on = stats['pcu_max'] > 0
+	pcu_sums = np.sum(pcu_on, axis=0)
+	exposure = np.sum(stats['exposure'], axis=0)
+
+	with open(tab2_file, 'w') as out:
 		out.write("PCUs ON:")
 		for i in range(num):
-			out.write("\n"+obsIDs[i]+"\t"+str(pcus_on_list[i]))
+			pcus_on = "".join([str(pcu) for pcu in range(N_PCUS) if \
+				pcu_on[i, pcu]])
+			out.write("\n"+stats['obsID'][i]+"\t"+pcus_on)
 		out.write("\n("+str(num)+" obsIDs)")
 		out.write("\n")
 		out.write("\nPCUs:")
-		for (pcu, element) in zip(pcus, pcu_sums):
+		for (pcu, element) in zip(range(N_PCUS), pcu_sums):
 			out.write("\n\t"+str(pcu)+"\t"+str(int(element)))
 		out.write("\n")
+		out.write("\nExposure (s) per combination of PCUs on:")
+		for combo in np.where(exposure > 0)[0]:
+			out.write("\n\t%s\t%.1f" % (combo_label(combo), exposure[combo]))
+		out.write("\n")
+
+
+################################################################################
+def plot_pcus_on(stats, out_file2):
+	"""
+	Plots the maximum number of PCUs on per obsID.
+
+	Parameters
+	----------
+	stats : np.array of STATS_DTYPE
+		The PCU statistics per obsID, from summarize_filters.
+
+	out_file2 : str
+		The output plot file.
+
+	"""
+	num = len(stats)
+	tmp = np.arange(num)+0.5
+	num_pcus_on_array = stats['num_pcu_max']
 
-	if len(num_pcus_on_array) > num:
-		num_pcus_on_array = num_pcus_on_array[-num]
-	
-	########################################
-	## Plotting number of pcus on per obsID
-	########################################
-	
 	if num <= 100:
 		fs = (8,8)
 	elif num <= 160:
 		fs = (8,16)
 	else:
 		fs = (8,20)
-		
-	font_prop = font_manager.FontProperties(size=16)
+
 	fig, ax = plt.subplots(1,1,figsize=fs)
 	ax.plot(num_pcus_on_array, tmp, '*', ms=10)
 	ax.hlines(tmp, [0], num_pcus_on_array, linestyles='dotted', lw=3)
 	ax.set(xlim=(0,5.1), ylim=(0, np.max(tmp)+0.5), yticks=tmp, \
-		yticklabels=obsIDs, xlabel="Maximum number of PCUs on during obsID")
+		yticklabels=list(stats['obsID']), \
+		xlabel="Maximum number of PCUs on during obsID")
 	ax.tick_params(axis='y', labelsize=10)
 	fig.set_tight_layout(True)
 	plt.savefig(out_file2, dpi=200)
-	# plt.show()	
+	# plt.show()
 	plt.close()
-	
+
+
+################################################################################
+def main(filter_list, prefix, data_dir, processes=None, use_cache=True):
+	"""
+	Summarizes the filter files in filter_list, and writes the summary to
+	data_dir/prefix_filter_info.txt and data_dir/prefix_pcus_on.png. Unless
+	use_cache is False, the statistics per filter file are cached in
+	data_dir/filter_stats_cache.npz.
+
+	Returns
+	-------
+	np.array of STATS_DTYPE
+		The PCU statistics per obsID.
+
+	"""
+	tab2_file = data_dir+"/"+prefix+"_filter_info.txt"
+	out_file2 = data_dir+"/"+prefix+"_pcus_on.png"
+	cache_file = None
+	if use_cache:
+		cache_file = data_dir+"/filter_stats_cache.npz"
+	filter_files = [line.strip() for line in open(filter_list) if \
+		line.strip()]
+
+	stats = summarize_filters(filter_files, processes=processes, \
+		cache_file=cache_file)
+
+	if len(stats) == 0:
+		print "\tERROR: No filter files could be read. Exiting."
+		return stats
+
+	write_info(stats, tab2_file)
+	plot_pcus_on(stats, out_file2)
+
+	return stats
+
 ## End of function 'main'
 
 
 ################################################################################
 if __name__ == "__main__":
-	
+
 	##############################################
 	## Parsing input arguments and calling 'main'
 	##############################################
-	
+
 	parser = argparse.ArgumentParser(usage='', description='', epilog='')
 	parser.add_argument('filter_list', help="List of filter files.")
 	parser.add_argument('prefix', help="Prefix of data set.")
 	parser.add_argument('data_dir', help="Directory of reduced data.")
+	parser.add_argument('--procs', type=int, default=None, dest='processes', \
+		help="Number of worker processes. [number of CPUs]")
+	parser.add_argument('--no_cache', action='store_false', default=True, \
+		dest='use_cache', help="Don't use or update the filter file stats "\
+		"cache in data_dir.")
 	args = parser.parse_args()
-	
-	main(args.filter_list, args.prefix, args.data_dir)
+
+	main(args.filter_list, args.prefix, args.data_dir, \
+		processes=args.processes, use_cache=args.use_cache)
 
 ################################################################################
@@ -1,53 +1,382 @@
+#!/usr/bin/env python
+
+"""
+Computes the mean count rate, variance and fractional rms of many light curves,
+writes them to a summary table, and optionally plots each light curve.
+
+Light curves can be text tables (time and rate columns, or only rate), .npy
+arrays of the same, FITS light curves (TIME and RATE columns), or .npz binned
+light curves from evt_to_lc.py. Text tables are parsed with np.fromstring
+instead of np.loadtxt. The statistics of all the light curves are computed
+together, and the plots are made without a display, in a process pool.
+
+"""
+
 import argparse
 import numpy as np
-import matplotlib.pyplot as plt
 from astropy.io import fits
-import matplotlib.font_manager as font_manager
-import subprocess
+import os
+import multiprocessing
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from plot_std2_lightcurve import minmax_decimate
+
+__author__ = "Abigail Stevens <A.L.Stevens at uva.nl>"
+__version__ = "0.2 2026-10-18"
+__year__ = "2015-2016"
+
+DEFAULT_DT = 0.0078125
+
+
+################################################################################
+def read_text_table(in_file):
+    """
+    Reads a whitespace-separated text table of numbers, skipping '#' comment
+    lines, much faster than np.loadtxt.
+
+    Parameters
+    ----------
+    in_file : str
+        The text table.
+
+    Returns
+    -------
+    np.array of floats
+        2-D array of the table, one row per line.
+
+    """
+    with open(in_file, 'r') as in_f:
+        lines = [line for line in in_f if line.strip() and not \
+                line.lstrip().startswith('#')]
+    if len(lines) == 0:
+        return np.zeros((0, 1))
+
+    n_cols = len(lines[0].split())
+    values = np.fromstring("".join(lines), sep=" ")
+    if len(values) != n_cols * len(lines):
+        ## Ragged table; let np.loadtxt say where
+        return np.atleast_2d(np.loadtxt(in_file))
+
+    return values.reshape(len(lines), n_cols)
+
+
+################################################################################
+def load_lc(in_file, dt=DEFAULT_DT):
+    """
+    Loads a light curve.
+
+    Parameters
+    ----------
+    in_file : str
+        The light curve: a text table or .npy array (time and rate columns, or
+        only rate), a FITS light curve (TIME and RATE columns), or a .npz
+        binned light curve from evt_to_lc.py (only its good time bins are
+        used).
+
+    dt : float, default=0.0078125
+        Length of a time bin in seconds, for tables that only have the rate.
+
+    Returns
+    -------
+    np.array of floats
+        The time of each bin (the bin number times dt, if the file doesn't have
+        times).
+
+    np.array of floats
+        The count rate of each bin, in photons/s.
+
+    float
+        The length of a time bin, in seconds.
+
+    """
+    ext = os.path.splitext(in_file)[1].lower()
+
+    if ext in (".lc", ".fits", ".fit", ".fts"):
+        with fits.open(in_file, memmap=True) as fits_hdu:
+            data = fits_hdu[1].data
+            names = [name.upper() for name in data.columns.names]
+            time = np.array(data.field(names.index('TIME') if 'TIME' in \
+                    names else 0), dtype=np.float64)
+            rate = np.array(data.field(names.index('RATE') if 'RATE' in \
+                    names else 1), dtype=np.float64)
+            dt = float(fits_hdu[1].header.get('TIMEDEL', dt))
+        return time, rate, dt
+
+    if ext == ".npz":
+        with np.load(in_file) as saved:
+            dt = float(saved['dt'])
+            good = saved['good']
+            time = float(saved['t_start']) + np.arange(len(good)) * dt
+            rate = np.sum(saved['counts'], axis=1, dtype=np.float64) / dt
+        return time[good], rate[good], dt
+
+    if ext == ".npy":
+        table = np.load(in_file)
+    else:
+        table = read_text_table(in_file)
+
+    if table.ndim == 1 or table.shape[1] == 1:
+        rate = np.asarray(table, dtype=np.float64).ravel()
+        return np.arange(len(rate)) * dt, rate, dt
+
+    return table[:, 0], table[:, 1], dt
+
+
+################################################################################
+def lc_stats(rates):
+    """
+    Computes the mean count rate, variance, fractional variance and fractional
+    rms of many light curves at once.
+
+    Parameters
+    ----------
+    rates : list of np.arrays of floats
+        The count rate of each light curve.
+
+    Returns
+    -------
+    np.array
+        Structured array with 'n_bins', 'mean_rate', 'variance', 'frac_var'
+        and 'frac_rms', one row per light curve. Empty light curves get NaNs.
+
+    """
+    stats = np.zeros(len(rates), dtype=[('n_bins', 'i8'), ('mean_rate', 'f8'),
+            ('variance', 'f8'), ('frac_var', 'f8'), ('frac_rms', 'f8')])
+    n_bins = np.array([len(rate) for rate in rates], dtype=np.int64)
+    stats['n_bins'] = n_bins
+    stats['mean_rate'] = np.nan
+    stats['variance'] = np.nan
+
+    nonempty = n_bins > 0
+    if np.any(nonempty):
+        all_rates = np.concatenate([rate for rate in rates if len(rate) > 0])
+        lengths = n_bins[nonempty]
+        starts = np.append(0, np.cumsum(lengths)[:-1])
+
+        means = np.add.reduceat(all_rates, starts) / lengths
+        deviations = all_rates - np.repeat(means, lengths)
+        stats['mean_rate'][nonempty] = means
+        stats['variance'][nonempty] = np.add.reduceat(deviations ** 2,
+                starts) / lengths
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stats['frac_var'] = stats['variance'] / stats['mean_rate'] ** 2
+        stats['frac_rms'] = np.sqrt(stats['variance']) / stats['mean_rate']
+
+    return stats
+
+
+################################################################################
+def write_summary(summary_file, in_files, dts, stats):
+    """
+    Writes the light curve statistics to a tab-separated summary table.
+
+    Parameters
+    ----------
+    summary_file : str
+        The output summary table.
+
+    in_files : list of str
+        The light curve files.
+
+    dts : list of floats
+        The length of a time bin of each light curve, in seconds.
+
+    stats : np.array
+        The statistics, from lc_stats.
+
+    Returns
+    -------
+    nothing
+
+    """
+    with open(summary_file, 'w') as out:
+        out.write("#FILE\tN_BINS\tDT\tMEAN_RATE\tVARIANCE\tFRAC_VAR\t"\
+                "FRAC_RMS\n")
+        for (in_file, dt, row) in zip(in_files, dts, stats):
+            out.write("%s\t%d\t%.9g\t%.6g\t%.6g\t%.6g\t%.6g\n" % (in_file,
+                    row['n_bins'], dt, row['mean_rate'], row['variance'],
+                    row['frac_var'], row['frac_rms']))
+
+
+################################################################################
+def plot_worker(job):
+    """
+    Plots one light curve, with its mean count rate, to a plot file. For use in
+    a process pool.
+
+    Parameters
+    ----------
+    job : tuple
+        (light curve file, plot file, plot title, dt, x limits or None, y
+        limits or None).
+
+    Returns
+    -------
+    str or None
+        The plot file, or None if it couldn't be made.
+
+    """
+    (in_file, plot_file, plot_title, dt, xlim, ylim) = job
+    try:
+        (time_bins, lightcurve, dt) = load_lc(in_file, dt=dt)
+    except (IOError, ValueError, KeyError) as err:
+        print "\tERROR: Couldn't plot %s: %s" % (in_file,
+                ' '.join(str(err).split()))
+        return None
+    if len(lightcurve) == 0:
+        return None
+
+    mean_rate = np.mean(lightcurve)
+    if xlim is not None:
+        in_xlim = (time_bins >= xlim[0]) & (time_bins <= xlim[1])
+        time_bins = time_bins[in_xlim]
+        lightcurve = lightcurve[in_xlim]
+
+    fig, ax = plt.subplots(1, 1, figsize=(15,10))  ## figsize=(width, height)
+    (plot_time, plot_lc) = minmax_decimate(time_bins, lightcurve,
+            int(ax.get_window_extent().width))
+    ax.plot(plot_time, plot_lc, lw=2)
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("Count rate (photons/s)")
+    if len(time_bins) > 0:
+        ax.plot([time_bins[0], time_bins[-1]], [mean_rate, mean_rate], lw=1.5,
+                ls='dashed', c='black')
+    if xlim is not None:
+        ax.set_xlim(xlim[0], xlim[1])
+    if ylim is not None:
+        ax.set_ylim(ylim[0], ylim[1])
+    ax.set_title(plot_title)
+    fig.savefig(plot_file)
+    plt.close(fig)
+
+    return plot_file
+
+
+################################################################################
+def main(in_files, summary_file, dt=DEFAULT_DT, plot_dir=None, xlim=None,
+        ylim=None, processes=None):
+    """
+    Computes the statistics of many light curves, writes them to a summary
+    table, and optionally plots the light curves.
+
+    Parameters
+    ----------
+    in_files : list of str
+        The light curve files (see load_lc).
+
+    summary_file : str
+        The output summary table.
+
+    dt : float, default=0.0078125
+        Length of a time bin in seconds, for tables that only have the rate.
+
+    plot_dir : str, optional
+        Directory for the plots (<light curve name>.png). Default is no plots.
+
+    xlim, ylim : (float, float), optional
+        Limits of the plots' time and count rate axes. Default is the whole
+        light curve.
+
+    processes : int, optional
+        Number of worker processes for the plots. Default is the number of
+        CPUs.
+
+    Returns
+    -------
+    np.array
+        The statistics, from lc_stats.
+
+    """
+    good_files = []
+    rates = []
+    dts = []
+    for in_file in in_files:
+        try:
+            (time_bins, lightcurve, file_dt) = load_lc(in_file, dt=dt)
+        except (IOError, ValueError, KeyError) as err:
+            print "\tERROR: Couldn't read %s: %s" % (in_file,
+                    ' '.join(str(err).split()))
+            continue
+        good_files.append(in_file)
+        rates.append(lightcurve)
+        dts.append(file_dt)
+
+    stats = lc_stats(rates)
+    write_summary(summary_file, good_files, dts, stats)
+    print "Light curve summary: %s" % summary_file
+
+    if plot_dir is not None:
+        jobs = []
+        for in_file in good_files:
+            name = os.path.splitext(os.path.basename(in_file))[0]
+            jobs.append((in_file, os.path.join(plot_dir, name + ".png"),
+                    "%s light curve" % name, dt, xlim, ylim))
+
+        if processes == 1 or len(jobs) <= 1:
+            plot_files = [plot_worker(job) for job in jobs]
+        else:
+            pool = multiprocessing.Pool(processes=processes)
+            try:
+                plot_files = pool.map(plot_worker, jobs, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        print "Made %d plots in %s" % (len([plot_file for plot_file in \
+                plot_files if plot_file is not None]), plot_dir)
+
+    return stats
+
+
+################################################################################
+if __name__ == "__main__":
 
-dt = 0.0078125
+    ##############################################
+    ## Parsing input arguments and calling 'main'
+    ##############################################
 
-in_file = "/Users/abigailstevens/Dropbox/Research/simulate/out_sim/TK_lightcurve_nopoiss.dat"
-plot_file = '/Users/abigailstevens/Dropbox/Research/simulate/out_sim/TK_lightcurve_nopoiss.png'
-plot_title = "FAKE-TK-GX339B lightcurve chunk, no Poisson noise"
+    parser = argparse.ArgumentParser(usage="python plot_lightcurves.py "\
+            "summary_file in_file [in_file ...] [--list] [--dt DT] "\
+            "[--plot_dir PLOT_DIR] [--xlim MIN MAX] [--ylim MIN MAX] "\
+            "[--procs N]", description=__doc__, epilog="For optional "\
+            "arguments, default values are given in brackets at end of "\
+            "description.")
 
-# in_file = "/Users/abigailstevens/Dropbox/Research/simulate/out_sim/TK_lightcurve_wpoiss.dat"
-# plot_file = '/Users/abigailstevens/Dropbox/Research/simulate/out_sim/TK_lightcurve_wpoiss.png'
-# plot_title = "FAKE-TK-GX339B lightcurve chunk, with Poisson noise"
+    parser.add_argument('summary_file', help="Output summary table (.txt).")
 
+    parser.add_argument('in_files', nargs='+', help="Light curve files (text"\
+            ", .npy, FITS or .npz from evt_to_lc.py).")
 
-# in_file = "/Users/abigailstevens/Dropbox/Research/cross_correlation/GX339-BQPO_ref_lc.dat"
-# plot_file = "/Users/abigailstevens/Dropbox/Research/cross_correlation/GX339-BQPO_ref_lc.png"
-# plot_title = "GX339-BQPO lightcurve chunk"
+    parser.add_argument('--list', action='store_true', default=False,
+            dest='is_list', help="in_files are lists of light curve files, "\
+            "one per line.")
 
+    parser.add_argument('--dt', type=float, default=DEFAULT_DT, help="Length "\
+            "of a time bin in seconds, for tables with only the rate. "\
+            "[%g]" % DEFAULT_DT)
 
-table = np.loadtxt(in_file)
-print np.shape(table)
+    parser.add_argument('--plot_dir', default=None, help="Directory to save "\
+            "a plot of each light curve in. [no plots]")
 
-time_bins = table[:,0]
-lightcurve = table[:,1]
-# lightcurve = table
-# time_bins = np.arange(len(lightcurve))
+    parser.add_argument('--xlim', type=float, nargs=2, default=None,
+            help="Time axis limits of the plots. [whole light curve]")
 
-mean_rate = np.mean(lightcurve)
+    parser.add_argument('--ylim', type=float, nargs=2, default=None,
+            help="Count rate axis limits of the plots. [whole light curve]")
 
-var = np.sum(lightcurve * dt)
-rms = np.sqrt(var)
-print var / mean_rate ** 2
-print rms / mean_rate
+    parser.add_argument('--procs', type=int, default=None, dest='processes',
+            help="Number of worker processes for the plots. [number of CPUs]")
 
+    args = parser.parse_args()
 
+    in_files = args.in_files
+    if args.is_list:
+        in_files = [line.strip() for in_list in args.in_files for line in \
+                open(in_list) if line.strip()]
 
-fig, ax = plt.subplots(1, 1, figsize=(15,10))  ## figsize=(width, height)
-ax.plot(time_bins, lightcurve, lw=2)
-ax.set_xlabel(r"Time bins ($\times\,\frac{1}{128}\,$s)")
-ax.set_ylabel("Count rate (photons/s)")
-ax.plot([0, len(lightcurve)],[mean_rate,mean_rate], lw=1.5, ls='dashed', c='black')
-# ax.set_xlim(len(lightcurve)-3000, len(lightcurve))
-ax.set_xlim(0, 500)
-ax.set_ylim(0, 3000)
-ax.set_title(plot_title)
-plt.savefig(plot_file)
-plt.close()
+    main(in_files, args.summary_file, dt=args.dt, plot_dir=args.plot_dir,
+            xlim=args.xlim, ylim=args.ylim, processes=args.processes)
 
-subprocess.call(["open", plot_file])
\ No newline at end of file
+################################################################################
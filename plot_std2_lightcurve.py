@@ -2,130 +2,255 @@
 """
 Plots the time-domain light curve of Standard-2 RXTE PCA data.
 
+Only TIME and RATE are read from the light curve. By default the light curve is
+min-max decimated to the pixel width of the plot before plotting (the lowest
+and highest rate in each pixel column is kept), so the time to plot stays about
+the same however long the light curve is. Plots are made without a display, and
+several light curves can be plotted per call.
+
 """
 
 import argparse
 import numpy as np
 from astropy.io import fits
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import os
-import tools
 
 __author__ = "Abigail Stevens <A.L.Stevens@uva.nl>"
 __year__ = "2014-2016"
 
+FIG_SIZE = (10, 7.5)
+DPI = 200
+
 
 ################################################################################
-# def main(prefix, obsID_list_file, plot_file="./std2_lc.png"):
-def main(prefix, all_std2_lc_file, plot_file="./std2_lc.png"):
+def read_lc(lc_file):
+    """
+    Reads the TIME and RATE columns of a FITS light curve.
+
+    Parameters
+    ----------
+    lc_file : str
+        A light curve file, in FITS format with extension '.lc'.
+
+    Returns
+    -------
+    np.array of floats
+        TIME.
+
+    np.array of floats
+        RATE (or the second column, if there's no RATE column).
 
     """
-    Main of plot_std2_lightcurve.py.
+    if lc_file[-3:].lower() != ".lc":
+        raise Exception("\tERROR: Light curve needs to be in FITS format "\
+                        "with extension '.lc'. Exiting.")
+
+    with fits.open(lc_file, memmap=True) as fits_hdu:
+        data = fits_hdu[1].data
+        names = [name.upper() for name in data.columns.names]
+        time_col = names.index('TIME') if 'TIME' in names else 0
+        rate_col = names.index('RATE') if 'RATE' in names else 1
+        time = np.array(data.field(time_col), dtype=np.float64)
+        rate = np.array(data.field(rate_col), dtype=np.float64)
+
+    return time, rate
+
+
+################################################################################
+def minmax_decimate(x, y, n_pixels):
+    """
+    Min-max decimates a curve to a number of pixel columns: for each column of
+    x values with points in it, keeps the lowest and the highest y value (in the
+    order they come in). The plotted line looks the same as the full one at
+    that width.
 
     Parameters
     ----------
-    prefix : str
-        The identifying prefix of the data (object nickname or data ID).
+    x : np.array of floats
+        The x values, in increasing order.
 
-    all_std2_lc_file : str
-        A light curve file extracted from all the Standard2 data together.
+    y : np.array of floats
+        The y values.
 
-    plot_file : str, default='std2_lc.png'
-        The name of the plot file to save the std2 lightcurve to.
+    n_pixels : int
+        The number of pixel columns across the x range.
 
     Returns
     -------
-    Nothing, but saves to plot_file.
+    np.array of floats
+        The decimated x values (at most 2 * n_pixels).
+
+    np.array of floats
+        The decimated y values.
 
     """
+    if len(x) <= 2 * n_pixels or x[-1] == x[0]:
+        return x, y
 
-    assert os.path.exists(all_std2_lc_file)
-
-    # file_path = os.path.dirname(obsID_list_file).strip().split('/')
-    # file_prefix = "/".join(file_path[0:len(file_path)-2]) + \
-    #               "/Reduced_data/" + prefix
-    #
-    # obsID_list = [line.strip() for line in open(obsID_list_file)]
-
-    time_avg = []
-    counts_avg = []
-
-    ###################################
-    ## Start of looping through obsIDs
-    ###################################
-    # for obsID in obsID_list:
-    # file = file_prefix + "/" + obsID + "/all_std2.lc"
-    file = all_std2_lc_file
-    len_fname = len(file)
-    # time = []
-    # rate = []
-    if file[len_fname - 3:len_fname].lower() == ".lc":
-        fits_hdu = fits.open(file)
-        # header = fits_hdu[1].header
-        data = fits_hdu[1].data
-        fits_hdu.close()
-        time = data.field(0)
-        counts = data.field(1)
-        time_avg.append(np.mean(time))
-        counts_avg.append(np.mean(counts))
-    else:
-        raise Exception("\tERROR: Light curve needs to be in FITS format "\
-                        "with extension '.lc'. Exiting.")
+    column = np.floor((x - x[0]) / (x[-1] - x[0]) * n_pixels).astype(np.int64)
+    column = np.minimum(column, n_pixels - 1)
+    starts = np.flatnonzero(np.diff(np.append(-1, column)))
+    stops = np.append(starts[1:], len(x))
+
+    ## Index of the lowest and highest y in each column
+    order = np.lexsort((y, column))
+    low = order[starts]
+    high = order[stops - 1]
+
+    ## Keeping them in x order within each column
+    first = np.minimum(low, high)
+    second = np.maximum(low, high)
+    keep = np.column_stack((first, second)).ravel()
+
+    return x[keep], y[keep]
+
+
+################################################################################
+def plot_lc(ax, prefix, time, counts, decimate=True):
+    """
+    Plots a light curve on a set of axes.
+
+    Parameters
+    ----------
+    ax : matplotlib axes object
+        The axes to plot on. Anything already on them is cleared.
+
+    prefix : str
+        The identifying prefix of the data (object nickname or data ID).
+
+    time : np.array of floats
+        TIME of the light curve.
 
-    if np.amax(counts) == 63:
-        print "\n\t WARNING: Are you sure you're not plotting time vs energy channel?"
+    counts : np.array of floats
+        RATE of the light curve.
 
-    ## Sorting the averaged lists, since obsIDs aren't necessarily in time order
-    # counts_avg_sorted = [y for (x,y) in sorted(zip(time_avg, counts_avg))]
-    # time_avg_sorted = sorted(time_avg)
+    decimate : bool, default=True
+        Whether to min-max decimate the light curve to the pixel width first.
 
-    time_avg_sorted = time
-    counts_avg_sorted = counts
+    Returns
+    -------
+    nothing
 
+    """
     ## Putting time into days
-    time_avg_sorted = (time_avg_sorted - time_avg_sorted[0]) / 86400.0
+    time_days = (time - time[0]) / 86400.0
     ## 432000 elapsed seconds is 5 days
     ## 86400 seconds is one day
 
-    print "Standard-2 lightcurve: %s" % plot_file
-    fig, ax = plt.subplots(1, 1, figsize=(10,7.5), dpi=200)
-    ax.plot(time_avg_sorted, counts_avg_sorted, lw=3)
+    if decimate:
+        n_pixels = int(ax.get_window_extent().width)
+        (time_days, counts) = minmax_decimate(time_days, counts, n_pixels)
+
+    ax.cla()
+    ax.plot(time_days, counts, lw=3)
     ax.set_xlabel('Time elapsed (days)', fontsize=18)
     ax.set_ylabel('Average photon count', fontsize=18)
-    ax.set_xlim(0, np.max(time_avg_sorted))
-    ax.set_ylim(np.min(counts_avg_sorted)-10, np.max(counts_avg_sorted)+10)
+    ax.set_xlim(0, np.max(time_days))
+    ax.set_ylim(np.min(counts)-10, np.max(counts)+10)
     ax.tick_params(axis='x', labelsize=18)
     ax.tick_params(axis='y', labelsize=18)
     title = "%s Lightcurve" % (prefix)
     ax.set_title(title, fontsize=18)
 
-    plt.savefig(plot_file)
-    plt.show()
-    plt.close()
+
+################################################################################
+def plot_many(prefix, lc_plot_files, decimate=True):
+    """
+    Plots several light curves, each to its own plot file, re-using one figure.
+
+    Parameters
+    ----------
+    prefix : str
+        The identifying prefix of the data (object nickname or data ID).
+
+    lc_plot_files : list of (str, str)
+        The light curve file and the plot file, for each light curve.
+
+    decimate : bool, default=True
+        Whether to min-max decimate the light curves to the pixel width first.
+
+    Returns
+    -------
+    Nothing, but saves to the plot files.
+
+    """
+    fig, ax = plt.subplots(1, 1, figsize=FIG_SIZE, dpi=DPI)
+
+    for (lc_file, plot_file) in lc_plot_files:
+        assert os.path.exists(lc_file)
+        (time, counts) = read_lc(lc_file)
+
+        if np.amax(counts) == 63:
+            print "\n\t WARNING: Are you sure you're not plotting time vs "\
+                    "energy channel?"
+
+        print "Standard-2 lightcurve: %s" % plot_file
+        plot_lc(ax, prefix, time, counts, decimate=decimate)
+        fig.savefig(plot_file, dpi=DPI)
+
+    plt.close(fig)
+
+
+################################################################################
+# def main(prefix, obsID_list_file, plot_file="./std2_lc.png"):
+def main(prefix, all_std2_lc_file, plot_file="./std2_lc.png", decimate=True):
+
+    """
+    Main of plot_std2_lightcurve.py.
+
+    Parameters
+    ----------
+    prefix : str
+        The identifying prefix of the data (object nickname or data ID).
+
+    all_std2_lc_file : str
+        A light curve file extracted from all the Standard2 data together.
+
+    plot_file : str, default='std2_lc.png'
+        The name of the plot file to save the std2 lightcurve to.
+
+    decimate : bool, default=True
+        Whether to min-max decimate the light curve to the pixel width first.
+
+    Returns
+    -------
+    Nothing, but saves to plot_file.
+
+    """
+    plot_many(prefix, [(all_std2_lc_file, plot_file)], decimate=decimate)
 
 
 ################################################################################
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(usage="plot_std2_lightcurve.py prefix "\
-            "obsID_list_file plot_file", description="Plots the time-domain "\
-            "light curve of a whole data set.")
+            "all_std2_lc_file plot_file [--also LC_FILE PLOT_FILE] [--full]",
+            description="Plots the time-domain light curve of a whole data "\
+            "set.")
 
     parser.add_argument('prefix', help="The identifying prefix of the data "\
             "(object nickname or data ID).")
 
-    # parser.add_argument('obsID_list_file', help="Name of input text file with "\
-    #         "list of obsIDs for data to plot lightcurve of. One obsID per "\
-    #         "line.")
-
     parser.add_argument('all_std2_lc_file')
 
     parser.add_argument('plot_file', default="./std2_lc.png",
             help="The output file name for the lightcurve plot.")
 
+    parser.add_argument('--also', nargs=2, action='append', default=[],
+            metavar=('LC_FILE', 'PLOT_FILE'), help="Another light curve to "\
+            "plot, and its plot file. Give once per light curve.")
+
+    parser.add_argument('--full', action='store_false', default=True,
+            dest='decimate', help="Plot every point instead of min-max "\
+            "decimating to the plot's pixel width.")
+
     args = parser.parse_args()
 
-    # main(args.prefix, args.obsID_list_file, plot_file=args.plot_file)
-    main(args.prefix, args.all_std2_lc_file, plot_file=args.plot_file)
+    lc_plot_files = [(args.all_std2_lc_file, args.plot_file)] + \
+            [tuple(pair) for pair in args.also]
+    plot_many(args.prefix, lc_plot_files, decimate=args.decimate)
 
 ################################################################################
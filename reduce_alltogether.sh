@@ -54,7 +54,10 @@ gti_file="$out_dir/all.gti"
 all_evt="$out_dir/all_evt.pha"
 all_std2="$out_dir/all_std2.pha"
 sa_cols="$out_dir/std2_cols.lst"
-evtpha_list="$out_dir/${prefix}_evtpha.lst"  ## Only used if num_evt >= 100
+evtpha_list="$out_dir/${prefix}_evtpha.lst"  ## List of event-mode spectra for
+                                             ## addpha.py, of the obsIDs that
+                                             ## have one
+addpha_state="${all_evt%.*}_addpha_state.npz"  ## Running sum for addpha.py
 
 ################################################################################
 ################################################################################
@@ -74,27 +77,15 @@ python -c "from tools import no_duplicates; no_duplicates('$obsID_list')"
 
 echo "Merging filter files"
 
-## Sort filter files from above chronologically
+## Sort filter files from above chronologically, remove duplicates (can happen
+## if there are multiple orbits per obsID), and merge them into one big one
 echo "$filter_list"
-## Removing duplicates from the filter list -- can happen if there are multiple
-## orbits per obsID
-python -c "from tools import no_duplicates; no_duplicates('$filter_list')"
-python -c "from tools import time_ordered_list; time_ordered_list('$filter_list')" > ./dump.txt
-echo ./dump.txt
-
-cp ./dump.txt "$filter_list"
-
-## Merge the filter files into one big one
-fmerge infiles=@"$filter_list" \
-	outfile="$filter_file" \
-	columns=- \
-	copyprime=yes \
-	lastkey='TSTOP' \
-	clobber=yes
+if [ -e "$filter_file" ]; then rm "$filter_file"; fi
+python "$script_dir"/merge_filters.py "$filter_list" "$filter_file"
 
 if [ ! -e "$filter_file" ] ; then
-	echo -e "\tERROR: fmerge did not work, total filter file not made. Exiting."
-	echo -e "\tERROR: fmerge did not work, total filter file not made. Exiting." >> $progress_log
+	echo -e "\tERROR: merge_filters.py did not work, total filter file not made. Exiting."
+	echo -e "\tERROR: merge_filters.py did not work, total filter file not made. Exiting." >> $progress_log
 	exit
 fi
 
@@ -137,57 +128,37 @@ if (( $( wc -l < $se_list ) == 0 )); then
 	echo -e "\tERROR: No event-mode data files for any obsID. Cannot run seextrct. Exiting." >> $progress_log
 	exit
 	
-## If there are 100 or more event files, need to add spectra in addpha.py
-elif (( $( wc -l < $se_list ) >= 100 )); then
+## Otherwise, add the event-mode spectra of each obsID in addpha.py (any number
+## of them; it reads them in parallel), if indiv_extract.sh made them all
+else
 
-	echo "100 or more event spectra. Adding */event.pha with addpha."
-	echo "100 or more event spectra. Adding */event.pha with addpha." >> $progress_log
-	
+	num_obsIDs=0
 	for obsid in $( cat $obsID_list ); do
-		echo "$out_dir/$obsid/event.pha" >> $evtpha_list
-	done	
-	
-	if (( $( wc -l < $evtpha_list ) > 0 )); then
-		echo python ./addpha.py "$evtpha_list" "$all_evt" "$gti_file"
-		python "$script_dir"/addpha.py "$evtpha_list" "$all_evt" "$gti_file"
+		(( num_obsIDs++ ))
+		if [ -e "$out_dir/$obsid/event.pha" ]; then
+			echo "$out_dir/$obsid/event.pha" >> $evtpha_list
+		fi
+	done
+
+	if (( $( wc -l < $evtpha_list ) > 0 )) && \
+			(( $( wc -l < $evtpha_list ) == num_obsIDs )); then
+
+		echo "Adding */event.pha with addpha."
+		echo "Adding */event.pha with addpha." >> $progress_log
+
+		## The state file keeps the running sum, so re-runs with more obsIDs
+		## only read the new or changed spectra
+		echo python ./addpha.py "$evtpha_list" "$all_evt" "$gti_file" \
+			--state "$addpha_state"
+		python "$script_dir"/addpha.py "$evtpha_list" "$all_evt" "$gti_file" \
+			--state "$addpha_state"
+
+	## Not every obsID has an event.pha (indiv_extract.sh is only run with
+	## 'reduce_scheduler.py --extract'), so combine the event-mode files in
+	## seextrct
 	else
-		echo -e "\tERROR: addpha.py did not run. No event spectra in list."
-		echo -e "\tERROR: addpha.py did not run. No event spectra in list." >> $progress_log
-	fi
-	
-## If there are 0 < n < 100 event files, combine them in seextrct	
-else
-#	if ! fgrep -q -e "(" $bitfile ; then
-#
-#        seextrct lcbinarray=1600000 \
-#            maxmiss=INDEF \
-#            infile=@"$se_list" \
-#            gtiorfile=- \
-#            gtiandfile="$gti_file" \
-#            outroot="${all_evt%.*}" \
-#            bitfile="$bitfile" \
-#            timecol="TIME" \
-#            columns="Event" \
-#            multiple=yes \
-#            binsz=1 \
-#            printmode=SPECTRUM \
-#            lcmode=RATE \
-#            spmode=SUM \
-#            timemin=INDEF \
-#            timemax=INDEF \
-#            timeint=INDEF \
-#            chmin=INDEF \
-#            chmax=INDEF \
-#            chint=INDEF \
-#            chbin=INDEF \
-#            mode=ql
-#		if [ ! -e "$all_evt" ] ; then
-#		    echo -e "\tERROR: Total event-mode spectrum not made!"
-#		    echo -e "\tERROR: Total event-mode spectrum not made!" >> $progress_log
-#		fi
-#	else
-        echo "( or | in bitmask. Using FSELECT."
-        echo "( or | in bitmask. Using FSELECT." >> $progress_log
+        echo "Not all obsIDs have an event.pha. Using FSELECT and SEEXTRCT."
+        echo "Not all obsIDs have an event.pha. Using FSELECT and SEEXTRCT." >> $progress_log
 
         ## Fselect won't read in a list of files.
         if [ -e "$out_dir/se_fsel.lst" ] ; then rm "$out_dir/se_fsel.lst" ; fi
@@ -225,11 +196,11 @@ else
 		    chint=INDEF \
 		    chbin=INDEF \
 		    mode=ql
-		if [ ! -e "$all_evt" ] ; then
-		    echo -e "\tERROR: Total event-mode spectrum not made!"
-		    echo -e "\tERROR: Total event-mode spectrum not made!" >> $progress_log
-		fi
-#	fi
+	fi
+	if [ ! -e "$all_evt" ] ; then
+	    echo -e "\tERROR: Total event-mode spectrum not made!"
+	    echo -e "\tERROR: Total event-mode spectrum not made!" >> $progress_log
+	fi
 fi  ## End of 'if there are evt files in $se_list
 
 ##################################################
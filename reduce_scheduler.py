@@ -0,0 +1,873 @@
+#!/usr/bin/env python
+
+"""
+Runs the per-obsID reduction of rxte_reduce_data.sh on many obsIDs at once, and
+then reduce_alltogether.sh on all of them.
+
+The reduction of each obsID is a set of stages that depend on each other:
+
+    filter (xtefilt) ----\\
+                          +--> gti_bkgd (gti_and_bkgd.sh) --> extract
+    herd (copy FS4a* and  /                                (indiv_extract.sh,
+    event-mode files) ---/                                  with --extract)
+
+and different obsIDs don't depend on each other until reduce_alltogether.sh.
+Stages whose stages before them are done are run on a pool of worker processes.
+Each worker has its own PFILES and working directory, so the parameter files
+and temporary files of the HEASoft tools don't collide. When a stage fails, the
+stages after it for that obsID are skipped, like the 'continue's in
+rxte_reduce_data.sh. How long each stage took goes in the progress log.
+
+Each stage that worked leaves a record (stage_<stage>.npz in the obsID's output
+directory) of a hash of its inputs -- the contents of its input files (raw
+data, filter file, Standard-2 and event-mode files, background model, SAA
+history, std2_cols, bitfile, the stage's script) and its parameters (filtex,
+HEASoft version) -- and of the files it made. When the hash and the files made
+are the same the next time, the stage isn't run again. Files whose size and
+modification time haven't changed aren't re-hashed. reduce_alltogether.sh is
+cached the same way, as stage 'alltogether' (record in the prefix directory):
+its inputs are the obsID list, the lists of filter files, background spectra
+and Standard-2 and event-mode files and the files in them, each obsID's
+event.pha, std2_cols, bitfile and the scripts it runs. The GTI'd event lists
+are made later, by good_events.sh (run from pipeline.sh), and are cached the
+same way by 'apply_gti.py batch'. The record functions are in hash_tools.py.
+
+"""
+
+import argparse
+import os
+import sys
+import glob
+import gzip
+import shutil
+import subprocess
+import tempfile
+import time
+import Queue
+import multiprocessing
+from collections import OrderedDict
+from multiprocessing.queues import SimpleQueue
+
+from download_obsIDs import MANIFEST
+from hash_tools import hash_inputs, stage_key, load_record, save_record, \
+        outputs_unchanged
+
+__author__ = "Abigail Stevens <A.L.Stevens at uva.nl>"
+__version__ = "0.1 2026-10-18"
+__year__ = "2014-2017"
+
+## Names of the files in each obsID's output directory
+FILTER_FILE = "filter.xfl"
+GTI_FILE = "gti_file.gti"
+OBS_PROGRESS_LOG = "progress.log"
+OBS_RUN_LOG = "run.log"
+OBS_EVT_BKGD_LIST = "evt_bkgd.lst"
+OBS_STD2_BKGD_LIST = "std2_bkgd.lst"
+STAGE_RECORD = "stage_%s.npz"
+
+## Seconds to wait for a stage to finish before checking that the worker
+## processes running stages are still alive
+POLL_TIME = 5.0
+
+## Set in each worker process by init_worker
+started_queue = None
+
+## What indiv_extract.sh makes
+EXTRACT_PRODUCTS = ("std2.pha", "std2.lc", "event.pha", "event.lc")
+
+## What reduce_alltogether.sh makes in the prefix directory (%s is the prefix),
+## and the scripts it runs
+ALLTOGETHER_PRODUCTS = ("all.xfl", "all.gti", "all_evt.pha", "all_std2.pha",
+        "all_std2.lc", "evt_bkgd_notbinned.pha", "evt_PCUs234.rsp",
+        "evt_bkgd_rebinned.pha", "%s_filter_info.txt", "%s_pcus_on.png")
+ALLTOGETHER_SCRIPTS = ("reduce_alltogether.sh", "merge_filters.py",
+        "addpha.py", "event_mode_bkgd.sh", "analyze_filters.sh",
+        "pcu_filter.py")
+
+
+################################################################################
+def run_command(cmd, log_file):
+    """
+    Runs a command with its output appended to a log file.
+
+    Parameters
+    ----------
+    cmd : list of str
+        The command and its arguments.
+
+    log_file : str
+        The log file.
+
+    Returns
+    -------
+    int
+        The exit status of the command.
+
+    """
+    with open(log_file, 'a') as log:
+        log.write("%s\n" % " ".join(cmd))
+        log.flush()
+        return subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT)
+
+
+################################################################################
+def read_list(list_file):
+    """
+    Reads a list file, one entry per line. Returns an empty list if the file
+    isn't there.
+    """
+    if not os.path.isfile(list_file):
+        return []
+
+    return [line.strip() for line in open(list_file) if line.strip()]
+
+
+################################################################################
+def copy_pca(in_file, out_file):
+    """
+    Copies a PCA data file, gunzipping it if it's gzipped.
+    """
+    if in_file.endswith(".gz"):
+        with gzip.open(in_file, 'rb') as in_f, open(out_file, 'wb') as out:
+            shutil.copyfileobj(in_f, out)
+    else:
+        shutil.copyfile(in_file, out_file)
+
+
+################################################################################
+def make_filter(conf, obsID, obs_dir, out_dir):
+    """
+    Stage 'filter': makes the filter file of an obsID with xtefilt, unless it's
+    already there.
+
+    Returns
+    -------
+    list of str
+        The filter file, in a tuple.
+
+    Raises
+    ------
+    IOError if the filter file wasn't made.
+
+    """
+    filter_file = os.path.join(out_dir, FILTER_FILE)
+    if os.path.isfile(filter_file):
+        return ([filter_file],)
+
+    run_command(["xtefilt", "-a", os.path.join(conf['list_dir'],
+            "appid.lst"), "-o", obsID, "-p", obs_dir, "-t", "16", "-f",
+            os.path.splitext(filter_file)[0], "-c"],
+            os.path.join(out_dir, OBS_RUN_LOG))
+    if not os.path.isfile(filter_file):
+        raise IOError("ERROR: Filter file not made!")
+
+    return ([filter_file],)
+
+
+################################################################################
+def herd_files(conf, obsID, obs_dir, out_dir, event_files):
+    """
+    Stage 'herd': copies the Standard-2 files and the event-mode files of an
+    obsID into its output directory, as std2_<n>.pca and evt_<n>.pca.
+
+    Parameters
+    ----------
+    event_files : list of str
+        The event-mode files of this obsID from the new file list.
+
+    Returns
+    -------
+    list of str, list of str
+        The Standard-2 and event-mode files in the output directory.
+
+    Raises
+    ------
+    IOError if the obsID has no Standard-2 files.
+
+    """
+    for old_file in glob.glob(os.path.join(out_dir, "evt_*.pca")) + \
+            glob.glob(os.path.join(out_dir, "std2_*.pca")):
+        os.remove(old_file)
+
+    std2_files = sorted(glob.glob(os.path.join(obs_dir, "pca", "FS4a*")))
+    if len(std2_files) == 0:
+        raise IOError("ERROR: No Standard-2 files for this obsID.")
+
+    new_std2 = []
+    for (m, std2_file) in enumerate(std2_files):
+        new_std2.append(os.path.join(out_dir, "std2_%d.pca" % (m + 1)))
+        copy_pca(std2_file, new_std2[-1])
+
+    new_evt = []
+    for (m, event_file) in enumerate(event_files):
+        new_evt.append(os.path.join(out_dir, "evt_%d.pca" % (m + 1)))
+        copy_pca(os.path.join(obs_dir, "pca", os.path.basename(event_file)),
+                new_evt[-1])
+
+    return new_std2, new_evt
+
+
+################################################################################
+def gti_and_bkgd(conf, obsID, obs_dir, out_dir):
+    """
+    Stage 'gti_bkgd': runs gti_and_bkgd.sh for an obsID, with the background
+    spectra listed in the obsID's own lists.
+
+    Returns
+    -------
+    list of str, list of str, list of str
+        The event-mode background spectra, the Standard-2 background spectra,
+        and the GTI file and the obsID's background lists.
+
+    Raises
+    ------
+    IOError if the GTI file wasn't made.
+
+    """
+    evt_bkgd_list = os.path.join(out_dir, OBS_EVT_BKGD_LIST)
+    std2_bkgd_list = os.path.join(out_dir, OBS_STD2_BKGD_LIST)
+    for list_file in (evt_bkgd_list, std2_bkgd_list):
+        open(list_file, 'w').close()
+
+    gti_file = os.path.join(out_dir, GTI_FILE)
+    run_command([os.path.join(conf['script_dir'], "gti_and_bkgd.sh"),
+            conf['list_dir'], conf['script_dir'], out_dir,
+            os.path.join(out_dir, OBS_PROGRESS_LOG), gti_file,
+            os.path.join(out_dir, FILTER_FILE), conf['filtex'],
+            conf['bkgd_model'], conf['saa_history'], conf['std2_cols'],
+            evt_bkgd_list, std2_bkgd_list], os.path.join(out_dir, OBS_RUN_LOG))
+    if not os.path.isfile(gti_file):
+        raise IOError("ERROR: GTI file was not made.")
+
+    return read_list(evt_bkgd_list), read_list(std2_bkgd_list), [gti_file,
+            evt_bkgd_list, std2_bkgd_list]
+
+
+################################################################################
+def indiv_extract(conf, obsID, obs_dir, out_dir):
+    """
+    Stage 'extract': runs indiv_extract.sh for an obsID.
+
+    Returns
+    -------
+    list of str
+        The spectra and light curves it made, in a tuple.
+
+    """
+    products = [os.path.join(out_dir, product) for product in \
+            EXTRACT_PRODUCTS]
+    for product in products:
+        if os.path.isfile(product):
+            os.remove(product)
+
+    run_command([os.path.join(conf['script_dir'], "indiv_extract.sh"),
+            conf['list_dir'], out_dir, os.path.join(out_dir,
+            OBS_PROGRESS_LOG), os.path.join(out_dir, GTI_FILE),
+            conf['std2_cols'], conf['bitfile']], os.path.join(out_dir,
+            OBS_RUN_LOG))
+
+    return ([product for product in products if os.path.isfile(product)],)
+
+
+################################################################################
+def reduce_alltogether(conf, prefix, obs_dir, out_dir, obsID_list,
+        list_files):
+    """
+    Stage 'alltogether': runs reduce_alltogether.sh on all the obsIDs. Unlike
+    the other stages, it's for the whole prefix directory (out_dir), not one
+    obsID; obs_dir isn't used.
+
+    Parameters
+    ----------
+    obsID_list : str
+        The obsID list.
+
+    list_files : dict of str
+        The lists of filter files ('filter'), event-mode and Standard-2
+        background spectra ('evt_bkgd', 'std2_bkgd'), and event-mode and
+        Standard-2 files ('se', 'sa').
+
+    Returns
+    -------
+    list of str
+        The merged filter file, GTI, mean spectra and light curve, background
+        spectra and response it made, in a tuple.
+
+    Raises
+    ------
+    IOError if the merged filter file or GTI wasn't made.
+
+    """
+    products = [os.path.join(out_dir, product.replace("%s", prefix)) for \
+            product in ALLTOGETHER_PRODUCTS]
+    for product in products:
+        if os.path.isfile(product):
+            os.remove(product)
+
+    alltogether_args = [conf['list_dir'], conf['script_dir'], prefix,
+            conf['progress_log'], obsID_list, conf['out_dir_prefix'],
+            list_files['filter'], conf['filtex'], list_files['evt_bkgd'],
+            list_files['se'], list_files['sa'], conf['std2_cols'],
+            conf['bitfile']]
+    log_progress(conf['progress_log'], "./reduce_alltogether.sh %s" % \
+            " ".join(alltogether_args))
+    sys.stdout.flush()
+    subprocess.call([os.path.join(conf['script_dir'],
+            "reduce_alltogether.sh")] + alltogether_args)
+
+    for product in products[:2]:
+        if not os.path.isfile(product):
+            raise IOError("ERROR: %s was not made." % product)
+
+    return ([product for product in products if os.path.isfile(product)],)
+
+
+################################################################################
+def copied_pca(out_dir, name):
+    """
+    Gets the PCA files copied into an obsID's output directory by herd_files
+    (name is 'std2' or 'evt'), in number order.
+    """
+    files = glob.glob(os.path.join(out_dir, "%s_*.pca" % name))
+
+    return sorted(files, key=lambda pca_file: int(os.path.splitext(
+            os.path.basename(pca_file))[0].split("_")[-1]))
+
+
+################################################################################
+def filter_inputs(conf, obsID, obs_dir, out_dir):
+    """
+    Gets the input files and parameters of stage 'filter': all the raw data
+    files of the obsID and the appid list.
+    """
+    inputs = [os.path.join(conf['list_dir'], "appid.lst")]
+    for (dir_path, dir_names, file_names) in os.walk(obs_dir):
+        inputs += [os.path.join(dir_path, file_name) for file_name in \
+                file_names if file_name != MANIFEST]
+
+    return inputs, {'time_step': 16, 'tool_version': conf['tool_version']}
+
+
+################################################################################
+def herd_inputs(conf, obsID, obs_dir, out_dir, event_files):
+    """
+    Gets the input files and parameters of stage 'herd': the Standard-2 and
+    event-mode files.
+    """
+    inputs = sorted(glob.glob(os.path.join(obs_dir, "pca", "FS4a*")))
+    inputs += [os.path.join(obs_dir, "pca", os.path.basename(event_file)) \
+            for event_file in event_files]
+
+    return inputs, {}
+
+
+################################################################################
+def gti_bkgd_inputs(conf, obsID, obs_dir, out_dir):
+    """
+    Gets the input files and parameters of stage 'gti_bkgd'.
+    """
+    inputs = [os.path.join(out_dir, FILTER_FILE)] + copied_pca(out_dir,
+            "std2") + copied_pca(out_dir, "evt") + [conf['bkgd_model'],
+            conf['saa_history'], conf['std2_cols'],
+            os.path.join(conf['script_dir'], "gti_and_bkgd.sh")]
+
+    return inputs, {'filtex': conf['filtex'],
+            'tool_version': conf['tool_version']}
+
+
+################################################################################
+def extract_inputs(conf, obsID, obs_dir, out_dir):
+    """
+    Gets the input files and parameters of stage 'extract'.
+    """
+    inputs = [os.path.join(out_dir, GTI_FILE)] + copied_pca(out_dir, "std2") \
+            + copied_pca(out_dir, "evt") + [conf['std2_cols'], conf['bitfile'],
+            os.path.join(conf['script_dir'], "indiv_extract.sh")]
+
+    return inputs, {'tool_version': conf['tool_version']}
+
+
+################################################################################
+def alltogether_inputs(conf, prefix, obs_dir, out_dir, obsID_list,
+        list_files):
+    """
+    Gets the input files and parameters of stage 'alltogether': the obsID
+    list, the lists and every file in them, each obsID's event-mode spectrum,
+    and the scripts it runs.
+    """
+    inputs = [obsID_list]
+    for name in sorted(list_files):
+        inputs += [list_files[name]] + read_list(list_files[name])
+    inputs += [os.path.join(out_dir, obsID, "event.pha") for obsID in \
+            read_list(obsID_list)]
+    inputs += [conf['std2_cols'], conf['bitfile']] + [os.path.join(
+            conf['script_dir'], script) for script in ALLTOGETHER_SCRIPTS]
+
+    return inputs, {'filtex': conf['filtex'], 'prefix': prefix,
+            'tool_version': conf['tool_version']}
+
+
+## Stage name -> (stage function, function getting its inputs and parameters)
+STAGES = {"filter": (make_filter, filter_inputs),
+        "herd": (herd_files, herd_inputs),
+        "gti_bkgd": (gti_and_bkgd, gti_bkgd_inputs),
+        "extract": (indiv_extract, extract_inputs),
+        "alltogether": (reduce_alltogether, alltogether_inputs)}
+
+
+################################################################################
+def run_cached(stage, conf, obsID, obs_dir, out_dir, *extra_args):
+    """
+    Runs a stage of an obsID, unless its inputs, parameters and outputs are
+    the same as the last time it worked.
+
+    Parameters
+    ----------
+    stage : str
+        The stage name, a key of STAGES.
+
+    conf : dict
+        As for main, with 'tool_version' and 'use_cache' too.
+
+    obsID, obs_dir, out_dir : str
+        The obsID, its raw data directory and its output directory.
+
+    extra_args
+        More arguments for the stage function.
+
+    Returns
+    -------
+    bool, tuple of lists of str
+        True if the stage wasn't run again, and what it returned.
+
+    """
+    (func, inputs_func) = STAGES[stage]
+    args = (conf, obsID, obs_dir, out_dir) + extra_args
+    record_file = os.path.join(out_dir, STAGE_RECORD % stage)
+    record = load_record(record_file)
+
+    (inputs, params) = inputs_func(*args)
+    hashes = hash_inputs(inputs, record['inputs'] if record else {})
+    key = stage_key(stage, hashes, params)
+
+    if record is not None:
+        if conf['use_cache'] and record['key'] == key and \
+                outputs_unchanged(record):
+            return True, record['result']
+        ## The old products are out of date
+        os.remove(record_file)
+        for out_file in record['outputs']:
+            if os.path.isfile(out_file):
+                os.remove(out_file)
+
+    result = func(*args)
+    save_record(record_file, key, hashes, result)
+
+    return False, result
+
+
+################################################################################
+def init_worker(pfiles_root, started=None):
+    """
+    Gives a worker process its own PFILES directory (before the system one)
+    and working directory.
+
+    Parameters
+    ----------
+    pfiles_root : str
+        Directory to make the worker's directory in.
+
+    started : multiprocessing.queues.SimpleQueue, optional
+        Queue that run_stage puts (stage key, process ID) on when it starts a
+        stage, so run_dag can tell which stage a worker that died was running.
+
+    Returns
+    -------
+    nothing
+
+    """
+    global started_queue
+    started_queue = started
+    worker_dir = tempfile.mkdtemp(prefix="worker_", dir=pfiles_root)
+    pfiles = os.environ.get("PFILES", "")
+    if ";" in pfiles:
+        sys_pfiles = pfiles.split(";", 1)[1]
+    elif "HEADAS" in os.environ:
+        sys_pfiles = os.path.join(os.environ["HEADAS"], "syspfiles")
+    else:
+        sys_pfiles = pfiles
+    os.environ["PFILES"] = "%s;%s" % (worker_dir, sys_pfiles)
+    os.chdir(worker_dir)
+
+
+################################################################################
+def run_stage(job):
+    """
+    Runs one stage and times it, for use in a process pool.
+
+    Parameters
+    ----------
+    job : tuple
+        (stage key, stage function, arguments of the function).
+
+    Returns
+    -------
+    tuple
+        (stage key, True if it worked, run time in seconds, what the function
+        returned or the error message).
+
+    """
+    (key, func, args) = job
+    if started_queue is not None:
+        started_queue.put((key, os.getpid()))
+    start_time = time.time()
+    try:
+        result = func(*args)
+        worked = True
+    except Exception as err:
+        ## Anything that gets out of a worker would never be reported back
+        result = ' '.join(str(err).split())
+        worked = False
+
+    return key, worked, time.time() - start_time, result
+
+
+################################################################################
+def log_progress(progress_log, message):
+    """
+    Prints a message and appends it to the progress log.
+    """
+    print message
+    with open(progress_log, 'a') as log:
+        log.write(message + "\n")
+
+
+################################################################################
+def log_stage(progress_log, key, worked, run_time, result):
+    """
+    Writes how a stage went to the progress log.
+    """
+    (stage, obsID) = key
+    if worked and result[0]:
+        log_progress(progress_log, "Reused %s for obsID=%s: inputs unchanged"\
+                % (stage, obsID))
+    elif worked:
+        log_progress(progress_log, "Finished %s for obsID=%s in %.1f s" % \
+                (stage, obsID, run_time))
+    else:
+        log_progress(progress_log, "\t%s (%s for obsID=%s, after %.1f s)" % \
+                (result, stage, obsID, run_time))
+
+
+################################################################################
+def run_dag(tasks, progress_log, processes=None):
+    """
+    Runs tasks in an order that respects their dependencies, with independent
+    tasks run at the same time on a pool of worker processes. Tasks that
+    depend on a task that failed are skipped. A task whose worker process died
+    (e.g. killed for running out of memory) failed.
+
+    Parameters
+    ----------
+    tasks : OrderedDict
+        Task key -> (function, arguments, keys of the tasks it depends on).
+        Every task comes after the tasks it depends on.
+
+    progress_log : str
+        The progress log.
+
+    processes : int, optional
+        Number of worker processes. Default is the number of CPUs. With 1,
+        the tasks are run one after the other in this process.
+
+    Returns
+    -------
+    dict
+        Task key -> (True if it worked, what the function returned or the
+        error message).
+
+    """
+    done = dict()
+
+    def skip(key):
+        done[key] = (False, "skipped")
+        log_progress(progress_log, "\tSkipped %s for obsID=%s: an earlier "\
+                "stage failed." % key)
+
+    if processes == 1:
+        for (key, (func, args, deps)) in tasks.items():
+            if all([done[dep][0] for dep in deps]):
+                (key, worked, run_time, result) = run_stage((key, func, args))
+                done[key] = (worked, result)
+                log_stage(progress_log, key, worked, run_time, result)
+            else:
+                skip(key)
+        return done
+
+    pfiles_root = tempfile.mkdtemp(prefix="rxte_pfiles_")
+    finished = Queue.Queue()
+    started = SimpleQueue()
+    waiting = list(tasks.keys())
+    running = dict()  ## Task key -> (start time, worker process ID or None)
+    lost = False  ## True if a worker died, and its task with it
+    pool = multiprocessing.Pool(processes=processes, initializer=init_worker,
+            initargs=(pfiles_root, started))
+    try:
+        while waiting or running:
+            for key in list(waiting):
+                (func, args, deps) = tasks[key]
+                if not all([dep in done for dep in deps]):
+                    continue
+                waiting.remove(key)
+                if all([done[dep][0] for dep in deps]):
+                    pool.apply_async(run_stage, ((key, func, args),),
+                            callback=finished.put)
+                    running[key] = (time.time(), None)
+                else:
+                    skip(key)
+            if not running:
+                continue
+
+            ## Waiting with a timeout, so a worker that died can't hang this
+            ## forever (and so Ctrl-C gets through)
+            try:
+                (key, worked, run_time, result) = finished.get(
+                        timeout=POLL_TIME)
+            except Queue.Empty:
+                while not started.empty():
+                    (key, pid) = started.get()
+                    if key in running:
+                        running[key] = (running[key][0], pid)
+                alive = set([worker.pid for worker in pool._pool if \
+                        worker.is_alive()])
+                for (key, (start_time, pid)) in running.items():
+                    if pid is not None and pid not in alive:
+                        lost = True
+                        del running[key]
+                        done[key] = (False, "ERROR: The worker process died.")
+                        log_stage(progress_log, key, False, time.time() - \
+                                start_time, done[key][1])
+                continue
+
+            del running[key]
+            done[key] = (worked, result)
+            log_stage(progress_log, key, worked, run_time, result)
+    except KeyboardInterrupt:
+        lost = True
+        raise
+    finally:
+        ## The pool would wait forever for the tasks of workers that died
+        if lost:
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+        shutil.rmtree(pfiles_root, ignore_errors=True)
+
+    return done
+
+
+################################################################################
+def write_list(list_file, entries):
+    """
+    Writes a list file, one entry per line.
+    """
+    with open(list_file, 'w') as out:
+        for entry in entries:
+            out.write(entry + "\n")
+
+
+################################################################################
+def heasoft_version():
+    """
+    Gets the HEASoft version from fversion, or the HEASoft directory if
+    fversion can't be run.
+    """
+    try:
+        return subprocess.check_output(["fversion"]).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return os.environ.get("HEADAS", "unknown")
+
+
+################################################################################
+def main(newfile_list, obsID_list, prefix, conf, processes=None,
+        extract=False, use_cache=True):
+    """
+    Reduces each obsID of the new files, and then all of them together.
+
+    Parameters
+    ----------
+    newfile_list : str
+        List of the new event-mode files (.xdf, from xtescan or interactive
+        xdf), as <data dir>/P<propID>/<obsID>/pca/<file>.
+
+    obsID_list : str
+        List of obsIDs, written to.
+
+    prefix : str
+        Prefix of directories and files (either proposal ID or object
+        nickname).
+
+    conf : dict of str
+        'list_dir', 'script_dir', 'out_dir_prefix', 'progress_log', 'filtex',
+        'bkgd_model', 'saa_history', 'std2_cols', 'bitfile', as set in
+        rxte_reduce_data.sh.
+
+    processes : int, optional
+        Number of worker processes. Default is the number of CPUs.
+
+    extract : bool, default=False
+        If True, also run indiv_extract.sh per obsID.
+
+    use_cache : bool, default=True
+        If True, stages whose inputs haven't changed since they last worked
+        aren't run again. If False, all stages are run.
+
+    Returns
+    -------
+    dict
+        Stage key (stage, obsID) -> (True if it worked, (True if it wasn't run
+        again, what it returned) or the error message). The key of
+        reduce_alltogether.sh is ('alltogether', 'all').
+
+    """
+    ## The workers run in their own directories
+    conf = dict(conf)
+    for key in conf:
+        if key != 'filtex':
+            conf[key] = os.path.abspath(conf[key])
+    conf['tool_version'] = "%s, reduce_scheduler %s" % (heasoft_version(),
+            __version__)
+    conf['use_cache'] = use_cache
+    progress_log = conf['progress_log']
+    prefix_dir = os.path.join(conf['out_dir_prefix'], prefix)
+
+    ## The event-mode files of each obsID, with the obsIDs in the order of the
+    ## new file list
+    event_files = OrderedDict()
+    for newfile in read_list(newfile_list):
+        obs_dir = os.path.dirname(os.path.dirname(os.path.abspath(newfile)))
+        obsID = os.path.basename(obs_dir)
+        event_files.setdefault((obsID, obs_dir), []).append(newfile)
+    log_progress(progress_log, "Number of new files: %d, in %d obsIDs" % \
+            (sum([len(files) for files in event_files.values()]),
+            len(event_files)))
+
+    tasks = OrderedDict()
+    for ((obsID, obs_dir), files) in event_files.items():
+        out_dir = os.path.join(prefix_dir, obsID)
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+        open(os.path.join(out_dir, OBS_PROGRESS_LOG), 'w').close()
+        obs_args = (conf, obsID, obs_dir, out_dir)
+        tasks[("filter", obsID)] = (run_cached, ("filter",) + obs_args, [])
+        tasks[("herd", obsID)] = (run_cached, ("herd",) + obs_args + (files,),
+                [])
+        tasks[("gti_bkgd", obsID)] = (run_cached, ("gti_bkgd",) + obs_args,
+                [("filter", obsID), ("herd", obsID)])
+        if extract:
+            tasks[("extract", obsID)] = (run_cached, ("extract",) + obs_args,
+                    [("gti_bkgd", obsID)])
+
+    start_time = time.time()
+    done = run_dag(tasks, progress_log, processes=processes)
+    log_progress(progress_log, "Finished individual obsIDs in %.1f s.\n" % \
+            (time.time() - start_time))
+
+    ## The obsIDs' own progress logs, in order
+    with open(progress_log, 'a') as log:
+        for (obsID, obs_dir) in event_files:
+            obs_log = os.path.join(prefix_dir, obsID, OBS_PROGRESS_LOG)
+            if os.path.getsize(obs_log) > 0:
+                log.write("obsID=%s:\n" % obsID)
+                log.write(open(obs_log).read())
+
+    ## Fan-in: the lists for reduce_alltogether.sh
+    lists = dict((name, []) for name in ('filter', 'sa', 'se', 'evt_bkgd',
+            'std2_bkgd'))
+    for (obsID, obs_dir) in event_files:
+        results = dict((stage, done[(stage, obsID)][1][1]) for stage in \
+                ("filter", "herd", "gti_bkgd") if done[(stage, obsID)][0])
+        if "filter" in results:
+            lists['filter'] += results["filter"][0]
+        if "herd" in results:
+            lists['sa'] += results["herd"][0]
+            lists['se'] += results["herd"][1]
+        if "gti_bkgd" in results:
+            lists['evt_bkgd'] += results["gti_bkgd"][0]
+            lists['std2_bkgd'] += results["gti_bkgd"][1]
+
+    write_list(obsID_list, [obsID for (obsID, obs_dir) in event_files])
+    list_files = dict()
+    for (name, file_name) in (('filter', "all_filters.lst"), ('evt_bkgd',
+            "all_event_bkgd.lst"), ('std2_bkgd', "all_std2_bkgd.lst"), ('se',
+            "all_evt.lst"), ('sa', "all_std2.lst")):
+        list_files[name] = os.path.join(prefix_dir, file_name)
+        write_list(list_files[name], lists[name])
+
+    ## Fan-in stage, cached like the others, on the lists just written
+    (key, worked, run_time, result) = run_stage((("alltogether", "all"),
+            run_cached, ("alltogether", conf, prefix, None, prefix_dir,
+            os.path.abspath(obsID_list), list_files)))
+    done[key] = (worked, result)
+    log_stage(progress_log, key, worked, run_time, result)
+
+    return done
+
+
+################################################################################
+if __name__ == "__main__":
+
+    ##############################################
+    ## Parsing input arguments and calling 'main'
+    ##############################################
+
+    parser = argparse.ArgumentParser(usage="python reduce_scheduler.py "\
+            "newfile_list obsID_list prefix --list_dir DIR --script_dir DIR "\
+            "--out_dir_prefix DIR --progress_log LOG --filtex EXPR "\
+            "--bkgd_model MDL --saa_history SAA --std2_cols COLS --bitfile "\
+            "BITFILE [--workers N --extract --no_cache]", description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter,
+            epilog="For optional arguments, default values are given in "\
+            "brackets at end of description.")
+
+    parser.add_argument('newfile_list', help="List of new event-mode files "\
+            "(.xdf), from xtescan or interactive xdf.")
+    parser.add_argument('obsID_list', help="List of obsIDs, to be written to.")
+    parser.add_argument('prefix', help="Prefix of directories and files "\
+            "(either proposal ID or object nickname).")
+
+    for (option, help_text) in (('list_dir', "Directory of lists (with "\
+            "appid.lst)."), ('script_dir', "Directory of the data reduction "\
+            "scripts."), ('out_dir_prefix', "Output directory prefix; obsIDs "\
+            "go in <out_dir_prefix>/<prefix>/<obsID>."), ('progress_log',
+            "Progress log."), ('filtex', "Filter expression for maketime."),
+            ('bkgd_model', "Background model file."), ('saa_history', "SAA "\
+            "history file."), ('std2_cols', "List of Standard-2 columns."),
+            ('bitfile', "Bitmask file for event-mode extraction.")):
+        parser.add_argument('--' + option, required=True, help=help_text)
+
+    parser.add_argument('--workers', type=int, default=None,
+            dest='processes', help="Number of worker processes. [number of "\
+            "CPUs]")
+    parser.add_argument('--extract', action='store_true', default=False,
+            help="Also run indiv_extract.sh for each obsID. [False]")
+    parser.add_argument('--no_cache', action='store_false', default=True,
+            dest='use_cache', help="Run all stages, even those whose inputs "\
+            "haven't changed since they last worked. [use the cache]")
+
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.newfile_list):
+        print "\tERROR: %s does not exist. Exiting." % args.newfile_list
+        exit()
+
+    conf = dict((key, getattr(args, key)) for key in ('list_dir',
+            'script_dir', 'out_dir_prefix', 'progress_log', 'filtex',
+            'bkgd_model', 'saa_history', 'std2_cols', 'bitfile'))
+
+    main(args.newfile_list, args.obsID_list, args.prefix, conf,
+            processes=args.processes, extract=args.extract,
+            use_cache=args.use_cache)
+
+################################################################################
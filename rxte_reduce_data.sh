@@ -13,9 +13,9 @@
 ## run.log has the full print outs. The file progress.log is a more concise way
 ## to keep track of progress.
 ##
-## WARNING: This script deletes files using a wildcard '*' just after the double 
-## '#' row. Check to be sure it's ok they're erased! Uncomment the 'ls' 
-## statements and comment the 'rm' statements to check what will be deleted.
+## Products of earlier runs are re-used when their inputs haven't changed (see
+## reduce_scheduler.py); stage_<stage>.npz in each obsID's directory records
+## them.
 ## 
 ## Notes: HEASOFT 6.21.*, bash 3.*, and conda 4.0.7+ with python 2.7.*
 ## 		  must be installed in order to run this script. Internet access is
@@ -92,6 +92,7 @@ bkgd_model="$list_dir/pca_bkgd_cmbrightvle_eMv20051128.mdl"
 ## The faint bkgd model is good for < 40 counts/sec/pcu
 #bkgd_model="$list_dir/pca_bkgd_cmfaintl7_eMv20051128.mdl"
 saa_history="$list_dir/pca_saa_history"
+num_workers=4  ## Number of obsIDs to reduce at the same time
 
 ## For saxj1808, to filter out the thermonuclear bursts
 # filtex="(PCU2_ON==1)&&(PCU0_ON==1)&&(elv>10)&&(offset<0.02)&&(VpX1LCntPcu2<=150)&&(VpX1RCntPcu2<=150)"
@@ -122,221 +123,35 @@ echo "Data directory: $data_dir"
 echo "List of new files in desired data mode: $newfilelist"
 echo "ObsID list: $obsID_list"
 
-if [ -d "${out_dir_prefix}/${prefix}" ]; then
-# 	ls "${out_dir_prefix}/${prefix}"/*/evt_*.pca
-# 	ls "${out_dir_prefix}/${prefix}"/*/std2_*.pca
-	rm "${out_dir_prefix}/${prefix}"/*/evt_*.pca
-	rm "${out_dir_prefix}/${prefix}"/*/std2_*.pca
-fi
+## The evt_*.pca and std2_*.pca copies, filter files, GTIs and background
+## spectra of each obsID, and the products of reduce_alltogether.sh, are kept:
+## reduce_scheduler.py only re-makes the ones whose inputs (raw data, filtex,
+## bkgd_model, std2_cols, bitfile, HEASoft version) changed since they were
+## made. Use --no_cache to re-make them all. The GTI'd event lists
+## (good_events.sh, in pipeline.sh) are kept the same way by apply_gti.py.
 
 if [ ! -d "${out_dir_prefix}/${prefix}" ]; then mkdir -p "${out_dir_prefix}/${prefix}"; fi
-if [ -e "$filter_list" ]; then rm "$filter_list"; fi; touch "$filter_list"
-if [ -e "$evt_bkgd_list" ]; then rm "$evt_bkgd_list"; fi; touch "$evt_bkgd_list"
-if [ -e "$se_list" ]; then rm "$se_list"; fi; touch "$se_list"
-if [ -e "$sa_list" ]; then rm "$sa_list"; fi; touch "$sa_list"
-## Re-writing over the obsID list in case not every obsID downloaded has the 
-## data mode we're interested in.
-if [ -e "$obsID_list" ]; then rm "$obsID_list"; fi; touch "$obsID_list"
 
 echo "Prefix = ${prefix}"
 
 num_newfiles=$( wc -l < $newfilelist )
-current_file_num=1
 echo "Number of new files: $num_newfiles" | xargs
 
 ################################################################################
-## Looping through each 'newfile' in 'newfilelist'
+## Reducing each obsID in 'newfilelist' (filter file, Std2 and event-mode files,
+## GTI and background) on $num_workers worker processes, and then all of them
+## together with reduce_alltogether.sh. The lists and the obsID list are
+## (re-)written by reduce_scheduler.py; each obsID's own output goes in its
+## out_dir/run.log and out_dir/progress.log.
 ################################################################################
 
-for newfile in $( cat $newfilelist ); do
-	
-	echo "New file $current_file_num /$num_newfiles" | xargs >> $progress_log  
-	## xargs trims the leading whitespace from $num_newfiles
-	
-	obs_dir=$( dirname `dirname ${newfile}` )  ## Where the downloaded 
-											   ## observation is stored
-	echo "Observation data directory: $obs_dir"
-	
-	IFS='/' read -a directories <<< "$newfile"
-	obsID="${directories[6]}"
-	echo "obsID: $obsID"
-	echo "$obsID" >> $obsID_list
-	echo "Starting run for obsID=$obsID" >> $progress_log
-
-	out_dir="${out_dir_prefix}/${prefix}/$obsID"  ## Where you want your output 
-											  	  ## to go for each observation 
-											  	  ## (filter files, reduced data 
-											  	  ## products)
-	echo "Output directory: $out_dir"
-	
-	## If the output directory doesn't already exist, make it
-	if [ ! -d "$out_dir" ]; then mkdir -p "$out_dir"; fi
-	
-	filter_file="$out_dir/filter.xfl"
-	gti_file="$out_dir/gti_file.gti"
-#	filter_file="$home_dir/Reduced_data/4U1608/10072-05-01-00/filter.xfl"
-#	gti_file="$home_dir/Reduced_data/4U1608/10072-05-01-00/gti_file.gti"
-
-	########################
-	## Making a filter file
-	########################
-	
-	if [ ! -e "$filter_file" ] ; then  ## If the filter file doesn't exist
-
-		echo "Making a filter file."
-
-		## Running xtefilt to make the filter file
-		xtefilt -a "$list_dir"/appid.lst \
-			-o $obsID \
-			-p "$obs_dir" \
-			-t 16 \
-			-f "${filter_file%.*}" \
-			-c
-
-		if [ ! -e "$filter_file" ]; then  ## Filter file wasn't made; Give error
-			echo -e "\tERROR: Filter file not made!"
-			echo -e "\tERROR: Filter file not made!" >> $progress_log
-			continue
-		fi
-
-		echo "Filter file made." >> $progress_log
-		echo "filter_file = $filter_file"
-
-	fi  ## End of 'if filter file wasn't made'
-	echo "$filter_file" >> $filter_list
-	
-	###################################################
-	## Herding the std2 files into the right directory
-	###################################################
-	
-	num_std2=$( ls "$obs_dir"/pca/ | grep -c FS4a )
-	
-	if (( $num_std2 == 0 )); then  ## num_std2 = 0; Give error
-		echo -e "\tNo Standard2 files for this obsID."
-		echo -e "\tNo Standard2 files for this obsID." >> $progress_log
-		continue
-	fi
-			
-	m=1
-	## For each FS4a (Standard-2) file
-	for std2file in $( ls "$obs_dir"/pca/FS4a* ); do 
-	
-		echo "std2file = $std2file"
-		new_std2="$out_dir/std2_${m}".pca
-		
-		if [ ${std2file##*.} == gz ]; then  ## If it's gzipped
-			cp $std2file "$new_std2".gz
-			gunzip -f "$new_std2".gz
-		else  ## if it doesn't end in gz
-			cp $std2file "$new_std2"
-		fi
-			
-		if [ -e "$new_std2" ]; then
-			echo "$new_std2" >> $sa_list
-		fi
-		
-		(( m++ ))
-		
-	done  ## End for-loop through each Std2 file
-	
-	#########################################################
-	## Herding the event mode files into the right directory
-	## Get the data mode from newfile in newfilelist 
-	## (made in xtescan or interactive xdf)
-	#########################################################
-
-	mode_file=$( echo `basename $newfile` ) 
-	eventfile="$obs_dir"/pca/"${mode_file}"
-	echo "eventfile = $eventfile"
-	
-	m=1
-	while [ -e "$out_dir/evt_${m}".pca ]; do
-		(( m++ ))
-	done
-	new_evt="$out_dir/evt_${m}".pca
-	echo "New evt file = $new_evt"
-
-	if [ ${eventfile##*.} == gz ]; then  ## If it's gzipped
-		cp $eventfile "$new_evt".gz
-		gunzip -f "$new_evt".gz
-	else  ## if it doesn't end in gz
-		cp $eventfile "$new_evt"
-	fi
-		
-	if [ -e "$new_evt" ]; then
-		echo "$new_evt" >> $se_list
-	fi
-	
-	
-	#############################################
-	## Now making the GTI and background files.
-	#############################################
-		
-	gtibkgd_args=()
-	gtibkgd_args[0]="$list_dir"
-	gtibkgd_args[1]="$script_dir"
-	gtibkgd_args[2]="$out_dir"
-	gtibkgd_args[3]="$progress_log"
-	gtibkgd_args[4]="$gti_file"
-	gtibkgd_args[5]="$filter_file"
-	gtibkgd_args[6]="'$filtex'"
-	gtibkgd_args[7]="$bkgd_model"
-	gtibkgd_args[8]="$saa_history"
-	gtibkgd_args[9]="$std2_cols"
-	gtibkgd_args[10]="$evt_bkgd_list"
-	gtibkgd_args[11]="$std2_bkgd_list"
-
-	echo ./gti_and_bkgd.sh "${gtibkgd_args[@]}"
-	gtibkgd_args[6]="$filtex"
-	"$script_dir"/gti_and_bkgd.sh "${gtibkgd_args[@]}"
-	
-	##########################################################
-	## Built-in extraction of Standard-2f and event-mode data
-	##########################################################
-	
-#	indivextract_args=()
-#	indivextract_args[0]="$list_dir"
-#	indivextract_args[1]="$out_dir"
-#	indivextract_args[2]="$progress_log"
-#	indivextract_args[3]="$gti_file"
-#	indivextract_args[4]="$std2_cols"
-#	indivextract_args[5]="$bitfile"
-#
-#  	echo ./indiv_extract.sh "${indivextract_args[@]}"
-# 	"$script_dir"/indiv_extract.sh "${indivextract_args[@]}"
-
-	echo -e "Finished run for obsID=$obsID \n"				
-	echo -e "Finished run for obsID=$obsID \n" >> $progress_log
-	(( current_file_num++ ))
-	
-done  ## End for-loop of each newfile in newfilelist
-
-################################################################################
-
-echo -e "Finished individual obsIDs.\n"
-echo -e "Finished individual obsIDs.\n" >> $progress_log
-
-alltogether_args=()
-alltogether_args[0]="$list_dir"
-alltogether_args[1]="$script_dir"
-alltogether_args[2]="$prefix"
-alltogether_args[3]="$progress_log"
-alltogether_args[4]="$obsID_list"
-alltogether_args[5]="$out_dir_prefix"
-alltogether_args[6]="$filter_list"
-alltogether_args[7]="'$filtex'"  ## needs quotes for echo, but no quotes for the actual thing.
-alltogether_args[8]="$evt_bkgd_list"
-alltogether_args[9]="$se_list"
-alltogether_args[10]="$sa_list"
-alltogether_args[11]="$std2_cols"
-alltogether_args[12]="$bitfile"
-
-echo ./reduce_alltogether.sh "${alltogether_args[@]}"
-echo ./reduce_alltogether.sh "${alltogether_args[@]}" >> $progress_log
-alltogether_args[7]="$filtex"
-
-"$script_dir"/reduce_alltogether.sh "${alltogether_args[@]}"
-
+python "$script_dir"/reduce_scheduler.py "$newfilelist" "$obsID_list" \
+	"$prefix" --list_dir "$list_dir" --script_dir "$script_dir" \
+	--out_dir_prefix "$out_dir_prefix" --progress_log "$progress_log" \
+	--filtex "$filtex" --bkgd_model "$bkgd_model" \
+	--saa_history "$saa_history" --std2_cols "$std2_cols" \
+	--bitfile "$bitfile" --workers "$num_workers"
+## Add --extract to also run indiv_extract.sh for each obsID
 
 ################################################################################
 ## 					All done!
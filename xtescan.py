@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+
+"""
+Determines the data mode and time resolution of every PCA science file (FS*) of
+a list of obsIDs, like xtescan.sh did with one python interpreter per keyword:
+reads only the extension 1 headers of the files, in a thread pool, and writes
+in one go
+    <reduced dir>/<prefix>_allinfo.lst     - details of every file
+    <reduced dir>/<prefix>_config.lst      - list of unique data modes
+    <reduced dir>/<prefix>_<datamode>.lst  - one per unique data mode
+    <list dir>/<prefix>_<datamode>.xdf     - the file names, per data mode
+
+"""
+
+import argparse
+import numpy as np
+from astropy.io import fits
+import os
+import glob
+from multiprocessing.pool import ThreadPool
+
+__author__ = "Abigail Stevens <A.L.Stevens at uva.nl>"
+__version__ = "0.1 2026-10-18"
+__year__ = "2015-2017"
+
+HOME_DIR = os.path.expanduser("~")
+DATA_DIR = os.path.join(HOME_DIR, "Data", "RXTE")
+REDUCED_DIR = os.path.join(HOME_DIR, "Reduced_data")
+LIST_DIR = os.path.join(HOME_DIR, "Dropbox", "Lists")
+
+## Binned modes keep their time resolution in 1CDLT2 instead of TIMEDEL
+BINNED_PREFIXES = ("B", "CB", "SB")
+
+
+################################################################################
+def obsID_data_dir(obsID, data_dir=DATA_DIR):
+    """
+    Gets the raw data directory of an obsID: data_dir/P<propID>/<obsID>.
+    """
+    return os.path.join(data_dir, "P" + obsID.split("-")[0], obsID)
+
+
+################################################################################
+def log2_exponent(delta_t):
+    """
+    Gets the power of 2 of a time resolution, e.g. -7 for 0.0078125 s. Not
+    quite powers of 2 are truncated towards zero, as 'bc' did in xtescan.sh.
+
+    Parameters
+    ----------
+    delta_t : float
+        Time resolution, in seconds.
+
+    Returns
+    -------
+    int
+        The exponent.
+
+    """
+    exponent = np.log2(float(delta_t))
+    if abs(exponent - np.round(exponent)) < 1e-6:
+        return int(np.round(exponent))
+
+    return int(exponent)
+
+
+################################################################################
+def scan_file(pca_file):
+    """
+    Reads the data mode, time resolution, start time and date of a PCA science
+    file from its extension 1 header.
+
+    Parameters
+    ----------
+    pca_file : str
+        The PCA science file.
+
+    Returns
+    -------
+    tuple or None
+        (file, DATAMODE, time resolution in s, TSTART, DATE-OBS), or None if
+        the header couldn't be read or has no usable DATAMODE or time
+        resolution (a positive number).
+
+    """
+    try:
+        header = fits.getheader(pca_file, 1)
+    except (IOError, IndexError):
+        print "\tERROR: Couldn't read header of %s" % pca_file
+        return None
+
+    datamode = str(header.get('DATAMODE', ''))
+    if datamode.split("_")[0] in BINNED_PREFIXES:
+        time_res = header.get('1CDLT2', None)
+    else:
+        time_res = header.get('TIMEDEL', None)
+    if not datamode or time_res is None:
+        print "\tERROR: No DATAMODE or time resolution in %s" % pca_file
+        return None
+
+    ## A resolution that isn't a positive number would take down the whole
+    ## scan in log2_exponent
+    try:
+        delta_t = float(time_res)
+    except (TypeError, ValueError):
+        delta_t = 0.0
+    if not np.isfinite(delta_t) or delta_t <= 0:
+        print "\tERROR: Bad time resolution in %s: %s" % (pca_file, time_res)
+        return None
+
+    return pca_file, datamode, delta_t, header.get('TSTART', None), \
+            str(header.get('DATE-OBS', ''))
+
+
+################################################################################
+def scan_obsIDs(obsIDs, data_dir=DATA_DIR, n_threads=8):
+    """
+    Scans the PCA science files of obsIDs.
+
+    Parameters
+    ----------
+    obsIDs : list of str
+        The obsIDs.
+
+    data_dir : str
+        Directory with the raw data, as data_dir/P<propID>/<obsID>/pca/FS*.
+
+    n_threads : int, default=8
+        Number of threads reading headers.
+
+    Returns
+    -------
+    list of tuples
+        (file, DATAMODE, time resolution in s, TSTART, DATE-OBS) per file that
+        could be read, in obsID order and in file name order within an obsID.
+
+    """
+    pca_files = []
+    for obsID in obsIDs:
+        obs_dir = obsID_data_dir(obsID, data_dir)
+        if not os.path.isdir(obs_dir):
+            print "\tERROR: Data directory for %s does not exist." % obsID
+            continue
+        files = sorted(glob.glob(os.path.join(obs_dir, "pca", "FS*")))
+        if len(files) == 0:
+            print "\tERROR: No PCA science files for %s." % obsID
+            continue
+        print "Searching %s, found %d files." % (obsID, len(files))
+        pca_files += files
+
+    pool = ThreadPool(processes=max(1, n_threads))
+    try:
+        results = pool.map(scan_file, pca_files, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    return [result for result in results if result is not None]
+
+
+################################################################################
+def write_lists(prefix, file_info, reduced_dir, list_dir):
+    """
+    Writes the xtescan lists.
+
+    Parameters
+    ----------
+    prefix : str
+        Prefix for the files (either propID or object nickname).
+
+    file_info : list of tuples
+        (file, DATAMODE, time resolution in s, TSTART, DATE-OBS), from
+        scan_obsIDs.
+
+    reduced_dir : str
+        Directory for the _allinfo.lst, _config.lst and per-datamode .lst.
+
+    list_dir : str
+        Directory for the per-datamode .xdf.
+
+    Returns
+    -------
+    list of str
+        The unique data modes, in the order they were found.
+
+    """
+    for out_dir in (reduced_dir, list_dir):
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+
+    lines = dict()
+    datamodes = []
+    with open(os.path.join(reduced_dir, prefix + "_allinfo.lst"), 'w') as out:
+        for (pca_file, datamode, delta_t, tstart, obsdate) in file_info:
+            line = "%s %s %s 2^%d" % (pca_file, datamode, obsdate,
+                    log2_exponent(delta_t))
+            out.write(line + "\n")
+            if datamode not in lines:
+                lines[datamode] = []
+                datamodes.append(datamode)
+            lines[datamode].append((pca_file, line))
+
+    with open(os.path.join(reduced_dir, prefix + "_config.lst"), 'w') as out:
+        for datamode in datamodes:
+            out.write(datamode + "\n")
+
+    print "\nNumber of files per unique PCA data mode:\n"
+    for datamode in datamodes:
+        with open(os.path.join(reduced_dir, "%s_%s.lst" % (prefix,
+                datamode)), 'w') as out:
+            for (pca_file, line) in lines[datamode]:
+                out.write(line + "\n")
+        with open(os.path.join(list_dir, "%s_%s.xdf" % (prefix, datamode)),
+                'w') as out:
+            for (pca_file, line) in lines[datamode]:
+                out.write(pca_file + "\n")
+        print "%d %s" % (len(lines[datamode]), datamode)
+
+    return datamodes
+
+
+################################################################################
+def main(prefix, obsID_list, data_dir=DATA_DIR, reduced_dir=None,
+        list_dir=LIST_DIR, n_threads=8):
+    """
+    Scans the PCA science files of the obsIDs in obsID_list and writes the
+    xtescan lists.
+
+    Parameters
+    ----------
+    prefix : str
+        Prefix for the files (either propID or object nickname).
+
+    obsID_list : str
+        List of obsIDs, one per line.
+
+    data_dir : str
+        Directory with the raw data, as data_dir/P<propID>/<obsID>/pca/FS*.
+
+    reduced_dir : str, optional
+        Directory for the .lst files. Default is ~/Reduced_data/<prefix>.
+
+    list_dir : str
+        Directory for the .xdf files.
+
+    n_threads : int, default=8
+        Number of threads reading headers.
+
+    Returns
+    -------
+    list of str
+        The unique data modes.
+
+    """
+    if reduced_dir is None:
+        reduced_dir = os.path.join(REDUCED_DIR, prefix)
+
+    obsIDs = [line.strip() for line in open(obsID_list) if line.strip()]
+    file_info = scan_obsIDs(obsIDs, data_dir=data_dir, n_threads=n_threads)
+    datamodes = write_lists(prefix, file_info, reduced_dir, list_dir)
+
+    print "\nAll data in file %s" % os.path.join(reduced_dir, prefix + \
+            "_allinfo.lst")
+    print "Information on each data mode in files %s_<datamode>.lst" % prefix
+    print "                                       %s_<datamode>.xdf\n" % \
+            prefix
+
+    return datamodes
+
+
+################################################################################
+if __name__ == "__main__":
+
+    ##############################################
+    ## Parsing input arguments and calling 'main'
+    ##############################################
+
+    parser = argparse.ArgumentParser(usage="python xtescan.py prefix "\
+            "obsID_list [--data_dir DIR --reduced_dir DIR --list_dir DIR "\
+            "--threads N]", description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('prefix', help="Prefix for files (either propID or "\
+            "object nickname).")
+
+    parser.add_argument('obsID_list', help="List of obsIDs for the files we "\
+            "want to use.")
+
+    parser.add_argument('--data_dir', default=DATA_DIR, help="Directory with"\
+            " the raw data, as <dir>/P<propID>/<obsID>. [%s]" % DATA_DIR)
+
+    parser.add_argument('--reduced_dir', default=None, help="Directory for "\
+            "the .lst files. [%s/<prefix>]" % REDUCED_DIR)
+
+    parser.add_argument('--list_dir', default=LIST_DIR, help="Directory for "\
+            "the .xdf files. [%s]" % LIST_DIR)
+
+    parser.add_argument('--threads', type=int, default=8, dest='n_threads',
+            help="Number of threads reading headers. [8]")
+
+    args = parser.parse_args()
+
+    main(args.prefix, args.obsID_list, data_dir=args.data_dir,
+            reduced_dir=args.reduced_dir, list_dir=args.list_dir,
+            n_threads=args.n_threads)
+
+################################################################################